@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from config import config
+
+logger = logging.getLogger(__name__)
+
+def _connect():
+    conn = sqlite3.connect(config.AI_CACHE_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_ai_cache():
+    """Creates the SQLite response table (WAL, so web, job and batch processes can share it)."""
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_responses (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                content TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                size INTEGER NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_responses_last_used ON ai_responses (last_used)")
+
+def response_key(request):
+    """
+    Cache key for a chat request: model, every request parameter and the prompt text, with each
+    image reduced to the SHA-256 of its encoded data URL (renders are deterministic per file/page/DPI).
+    """
+    parts = []
+    for msg in request['messages']:
+        content = msg['content']
+        if isinstance(content, str):
+            parts.append({'role': msg['role'], 'text': content})
+            continue
+        for part in content:
+            if part['type'] == 'image_url':
+                url = part['image_url']['url']
+                parts.append({'image': hashlib.sha256(url.encode()).hexdigest(), 'detail': part['image_url'].get('detail')})
+            else:
+                parts.append({'text': part.get('text', '')})
+    params = {k: v for k, v in request.items() if k != 'messages'}
+    blob = json.dumps({'params': params, 'parts': parts}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def get_response(cache_key):
+    """Returns the cached row as a dict (and counts the hit), or None if missing or older than the TTL."""
+    try:
+        now = time.time()
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM ai_responses WHERE cache_key = ? AND created_at >= ?",
+                (cache_key, now - config.AI_CACHE_TTL_HOURS * 3600)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute("UPDATE ai_responses SET hits = hits + 1, last_used = ? WHERE cache_key = ?", (now, cache_key))
+        return dict(row)
+    except sqlite3.Error as e:
+        logger.warning(f"AI cache lookup failed: {e}")
+        return None
+
+def save_response(cache_key, model, content, usage=None):
+    """Stores a parsed-OK response, then applies TTL and size eviction."""
+    now = time.time()
+    prompt = getattr(usage, 'prompt_tokens', 0) or 0
+    completion = getattr(usage, 'completion_tokens', 0) or 0
+    total = getattr(usage, 'total_tokens', 0) or prompt + completion
+    try:
+        with _connect() as conn:
+            # A refresh (bypassed lookup) keeps the entry's hit count so saved-token totals survive it
+            conn.execute("""
+                INSERT INTO ai_responses
+                    (cache_key, model, content, prompt_tokens, completion_tokens, total_tokens, size, hits, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    content = excluded.content, prompt_tokens = excluded.prompt_tokens,
+                    completion_tokens = excluded.completion_tokens, total_tokens = excluded.total_tokens,
+                    size = excluded.size, created_at = excluded.created_at, last_used = excluded.last_used
+            """, (cache_key, model, content, prompt, completion, total, len(content.encode()), now, now))
+        evict()
+    except sqlite3.Error as e:
+        logger.warning(f"AI cache write failed: {e}")
+
+def evict(max_bytes=None):
+    """Drops expired entries, then least recently used ones until the cache fits in `max_bytes`."""
+    max_bytes = max_bytes if max_bytes is not None else config.AI_CACHE_MAX_MB * 1024 * 1024
+    with _connect() as conn:
+        expired = conn.execute(
+            "DELETE FROM ai_responses WHERE created_at < ?", (time.time() - config.AI_CACHE_TTL_HOURS * 3600,)
+        ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_responses").fetchone()[0]
+        victims = []
+        if total > max_bytes:
+            for row in conn.execute("SELECT cache_key, size FROM ai_responses ORDER BY last_used"):
+                if total <= max_bytes: break
+                victims.append((row['cache_key'],))
+                total -= row['size']
+            conn.executemany("DELETE FROM ai_responses WHERE cache_key = ?", victims)
+    if expired or victims:
+        logger.info(f"🧹 AI cache evicted {expired} expired and {len(victims)} least recently used responses")
+    return expired + len(victims)
+
+def cache_stats():
+    """Entries, bytes, total hits and tokens saved by hits (sum of hits x tokens per response)."""
+    with _connect() as conn:
+        row = conn.execute("""
+            SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS bytes, COALESCE(SUM(hits), 0) AS hits,
+                   COALESCE(SUM(hits * total_tokens), 0) AS tokens_saved
+            FROM ai_responses
+        """).fetchone()
+    return dict(row)
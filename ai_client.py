@@ -0,0 +1,208 @@
+import asyncio
+import atexit
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying; anything else (bad key, bad request, no credits) fails immediately
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# Rough token cost of one high-detail page image, used to reserve tokens/min before the call
+IMAGE_TOKENS = 1105
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `per_minute`, holding at most `burst_seconds` worth.
+    A small burst keeps any 60s window close to the per-minute budget (a full-minute bucket allows double).
+    The level may go negative when actual usage turns out higher than reserved; callers then wait it off.
+    """
+    def __init__(self, per_minute, burst_seconds=10):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # A request larger than the whole bucket goes once the bucket is full and leaves it in debt
+        need = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.level >= need:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((need - self.level) / self.rate)
+
+    def adjust(self, delta):
+        """Charges (positive) or refunds (negative) tokens after the real usage is known."""
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+class RateLimiter:
+    """Requests/min and tokens/min buckets shared by every call made with one API key."""
+    def __init__(self, rpm, tpm, burst_seconds=10):
+        self.requests = TokenBucket(rpm, burst_seconds)
+        self.tokens = TokenBucket(tpm, burst_seconds)
+
+    async def acquire(self, tokens):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+def estimate_tokens(messages, max_tokens):
+    """Upper-bound token estimate for a chat request: ~4 chars per text token, fixed cost per image, plus the reply."""
+    total = max_tokens
+    for msg in messages:
+        content = msg['content']
+        if isinstance(content, str):
+            total += len(content) // 4
+            continue
+        for part in content:
+            total += len(part.get('text', '')) // 4 if part['type'] == 'text' else IMAGE_TOKENS
+    return total
+
+def backoff_delay(attempt, error=None):
+    """Full-jitter exponential backoff; honours a server Retry-After header when one is sent."""
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after) + random.uniform(0, config.OPENAI_BACKOFF_BASE)
+        except ValueError:
+            pass
+    cap = min(config.OPENAI_BACKOFF_MAX, config.OPENAI_BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(0, cap)
+
+class AIExecutor:
+    """
+    Runs OpenAI chat calls on one asyncio loop in a background thread, so any number of filings
+    (threads, stream requests, batch items) can have requests in flight at once from sync code.
+    Calls are gated by a per-key RateLimiter and a concurrency cap, and retried with jittered
+    backoff on 429s, timeouts and 5xx responses.
+    """
+    def __init__(self, rpm, tpm, max_concurrency, base_url=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.base_url = base_url
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failed': 0}
+        self._clients = {}
+        self._limiters = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ai-executor", daemon=True)
+        self._thread.start()
+        self._slots = asyncio.run_coroutine_threadsafe(self._make_semaphore(max_concurrency), self._loop).result()
+        logger.info(f"🤖 AI executor started ({rpm} req/min, {tpm} tokens/min, {max_concurrency} in flight)")
+
+    @staticmethod
+    async def _make_semaphore(n):
+        return asyncio.Semaphore(n)
+
+    def _for_key(self, api_key):
+        # Limits are enforced per key (that is how OpenAI meters them); the key itself is never logged
+        key_id = hashlib.sha256((api_key or '').encode()).hexdigest()
+        if key_id not in self._clients:
+            self._clients[key_id] = AsyncOpenAI(api_key=api_key, base_url=self.base_url, max_retries=0,
+                                                timeout=config.OPENAI_TIMEOUT)
+            self._limiters[key_id] = RateLimiter(self.rpm, self.tpm, config.OPENAI_BURST_SECONDS)
+        return self._clients[key_id], self._limiters[key_id]
+
+    async def _chat(self, api_key, log=None, **request):
+        client, limiter = self._for_key(api_key)
+        estimate = estimate_tokens(request['messages'], request.get('max_tokens', 0))
+        attempt = 0
+        while True:
+            await limiter.acquire(estimate)
+            try:
+                async with self._slots:
+                    self.stats['requests'] += 1
+                    response = await client.chat.completions.create(**request)
+                if response.usage:
+                    limiter.tokens.adjust(response.usage.total_tokens - estimate)
+                return response
+            except RETRYABLE_ERRORS as e:
+                if isinstance(e, RateLimitError):
+                    self.stats['rate_limited'] += 1
+                    # insufficient_quota is a 429 too, but waiting will not fix it
+                    if 'insufficient_quota' in str(e):
+                        self.stats['failed'] += 1
+                        raise
+                if attempt >= config.OPENAI_MAX_RETRIES:
+                    self.stats['failed'] += 1
+                    raise
+                delay = backoff_delay(attempt, e)
+                attempt += 1
+                self.stats['retries'] += 1
+                if log: log(f"⏳ OpenAI {type(e).__name__}; retry {attempt}/{config.OPENAI_MAX_RETRIES} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def submit(self, api_key, log=None, **request):
+        """Schedules a chat.completions.create(**request) call; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self._chat(api_key, log=log, **request), self._loop)
+
+    def chat(self, api_key, log=None, **request):
+        """Blocking form of submit() for sync callers."""
+        return self.submit(api_key, log=log, **request).result()
+
+    def shutdown(self):
+        async def close_clients():
+            for client in self._clients.values():
+                await client.close()
+        try:
+            asyncio.run_coroutine_threadsafe(close_clients(), self._loop).result(timeout=5)
+        except Exception as e:
+            logger.debug(f"Ignoring error while closing AI clients: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_rate_share = 1.0
+
+def rate_share():
+    """This process's fraction of the configured OpenAI limits (1.0 unless set_rate_share was called)."""
+    return _rate_share
+
+def set_rate_share(share):
+    """
+    Gives this process `share` of the configured OpenAI limits, before its executor starts. Pool workers
+    each run their own executor, so a pool of N processes started from a process holding rate_share()
+    gives each worker rate_share() / N: shares multiply down nested pools instead of resetting.
+    """
+    global _rate_share
+    _rate_share = share
+
+def get_ai_executor():
+    """Returns the process-wide AI executor, starting it on first use (and again after a fork)."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = AIExecutor(
+                rpm=max(1, int(config.OPENAI_RPM * _rate_share)),
+                tpm=max(1, int(config.OPENAI_TPM * _rate_share)),
+                max_concurrency=config.OPENAI_MAX_CONCURRENCY,
+                base_url=config.OPENAI_BASE_URL
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+def shutdown_ai_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None and _executor_pid == os.getpid():
+            _executor.shutdown()
+        _executor = None
+
+atexit.register(shutdown_ai_executor)
@@ -1,20 +1,114 @@
-import pdfplumber
 import pandas as pd
 import re
 import math
+import bisect
 import logging
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from page_cache import PageTextCache
+from config import config
+from timings import span, timed
+from pools import SpawnPool
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]')
+_FIRST_NUMBER_RE = re.compile(r'-?\d')
+
 def normalize(s):
-    return re.sub(r'[^a-z0-9]', '', s.lower())
+    return _NON_ALNUM_RE.sub('', s.lower())
+
+# Row label keywords per metric: (normalized keyword, rank). Dict order is the match precedence.
+METRIC_KEYWORDS = {
+    "revenue": [("revenuefromoperations", 1), ("incomefromoperations", 2), ("netsales", 3)],
+    "TotalInc": [("totalincome", 1), ("totalrevenue", 1)],
+    "total_expenses": [("totalexpenses", 1), ("totalexpenditure", 2)],
+    "pbt": [("profitbeforetax", 1), ("profitlossbeforetax", 2), ("pbt", 3), ("profitbeforeexceptional", 4)],
+    "net_profit": [("netprofit", 1), ("profitfortheperiod", 1), ("profitaftertax", 3), ("profitfortheyear", 1), ("profi", 5)],
+    "eps": [("basicearningspershare", 1), ("basiceps", 1), ("earningpershare", 2), ("basic", 3)],
+    "Dep": [("depreciation", 1)], 
+    "Int": [("financecost", 1), ("interestcost", 1)], 
+    "other_income": [("otherincome", 1)]
+}
+
+# A metric is skipped when its label also contains any of these
+LABEL_EXCLUSIONS = {
+    "Int": ("income",),
+    "net_profit": ("comprehensive", "minority", "equity"),
+}
+
+class LabelMatcher:
+    """
+    Keyword table compiled once into a single overlapping-lookahead regex.
+    match() scans a normalized label in one pass and returns the same (metric, rank) the
+    ordered metric/keyword loop would pick: the earliest entry in METRIC_KEYWORDS order that
+    occurs anywhere in the label and is not excluded.
+    """
+    def __init__(self, keywords, exclusions):
+        self.entries = [(metric, normalize(kw), rank) for metric, kws in keywords.items() for kw, rank in kws]
+        self.exclusions = exclusions
+        self.index = {kw: i for i, (_, kw, _) in enumerate(self.entries)}
+        # Alternation is tried in entry order, so at each position the earliest entry wins
+        alternation = "|".join(re.escape(kw) for _, kw, _ in self.entries)
+        self.pattern = re.compile(f"(?=({alternation}))")
+
+    def _excluded(self, metric, lbl):
+        return any(x in lbl for x in self.exclusions.get(metric, ()))
+
+    def match(self, lbl):
+        """Returns (metric, rank) for a normalized label, or (None, None)."""
+        best = len(self.entries)
+        for m in self.pattern.finditer(lbl):
+            i = self.index[m.group(1)]
+            if i >= best: continue
+            pos = m.start()
+            # Later entries starting at the same position only matter if this metric is excluded
+            for j in range(i, best):
+                metric, kw = self.entries[j][0], self.entries[j][1]
+                if j != i and not lbl.startswith(kw, pos): continue
+                if self._excluded(metric, lbl): continue
+                best = j
+                break
+            if best == 0: break
+        if best == len(self.entries):
+            return None, None
+        metric, _, rank = self.entries[best]
+        return metric, rank
+
+LABEL_MATCHER = LabelMatcher(METRIC_KEYWORDS, LABEL_EXCLUSIONS)
+
+# Page scanning stops once these are filled for every period at the best available priority
+REQUIRED_METRICS = ("revenue", "pbt", "net_profit", "eps")
+
+# extract_identifiers_and_period searches this many leading characters for the period
+IDENTIFIER_SCAN_CHARS = 3000
+
+# Lines that carry the scrip code or trading symbol
+IDENTIFIER_LINE_RE = re.compile(r"scrip code|security code|symbol\s*:|nse code", re.I)
+
+def leading_text(pages, min_chars, sep="\n"):
+    """Joins pages (each followed by `sep`) from the start until at least `min_chars` characters are read."""
+    parts, n = [], 0
+    for i in range(len(pages)):
+        parts.append(pages.text(i) + sep)
+        n += len(parts[-1])
+        if n >= min_chars: break
+    return "".join(parts)
 
 class LocalAnalyzer:
-    def __init__(self, pdf_path, include_corp_actions=False, include_observations=False, include_recommendations=False):
+    def __init__(self, pdf_path, include_corp_actions=False, include_observations=False, include_recommendations=False, pages=None, text_backend=None, page_workers=None, progress=None, log_callback=None):
         self.path = pdf_path
+        # Optional live listeners: progress(stage, message) and log_callback(message)
+        self.progress = progress
+        self.log_callback = log_callback
+        # Shared page text/word cache; only closed here if we opened it ourselves
+        self.pages = pages
+        self._owns_pages = pages is None
+        self.text_backend = text_backend
+        # Processes used to read candidate pages of large filings (1 = in-process)
+        self.page_workers = page_workers or config.PAGE_WORKERS
         self.include_corp_actions = include_corp_actions
         self.include_observations = include_observations
         self.include_recommendations = include_recommendations
@@ -32,27 +126,42 @@ class LocalAnalyzer:
     def log(self, msg):
         logger.info(msg)
         self.debug_logs.append(msg)
+        if self.log_callback: self.log_callback(msg)
 
-    def get_rows(self, page):
-        words = page.extract_words(x_tolerance=2, y_tolerance=2)
+    def report(self, stage, message):
+        if self.progress: self.progress(stage, message)
+
+    def get_rows(self, words, sep=""):
+        """Clusters positioned words into rows of (cell text, x0); words < 4pt apart join a cell with `sep`."""
         if not words: return []
-        rows = {}
+        # Each row is anchored at the rounded top of its first word; a word joins the earliest-created
+        # row whose anchor is within 5pt. Anchors are therefore >= 5pt apart, so a bisect over the
+        # sorted anchors finds at most two candidates - O(n log n) instead of scanning every row.
+        anchors = []   # sorted anchor y values
+        rows = {}      # anchor y -> (creation order, words)
         for w in words:
             y = round(w['top'], 0)
-            found = False
-            for ry in rows.keys():
-                if abs(y - ry) < 5: rows[ry].append(w); found = True; break
-            if not found: rows[y] = [w]
+            i = bisect.bisect_right(anchors, y - 5)
+            best = None
+            while i < len(anchors) and anchors[i] < y + 5:
+                cand = rows[anchors[i]]
+                if best is None or cand[0] < best[0]: best = cand
+                i += 1
+            if best is not None:
+                best[1].append(w)
+            else:
+                bisect.insort(anchors, y)
+                rows[y] = (len(rows), [w])
         
         res = []
-        for y in sorted(rows.keys()):
-            r_words = sorted(rows[y], key=lambda x: x['x0'])
+        for y in anchors:
+            r_words = sorted(rows[y][1], key=lambda x: x['x0'])
             parts = []
             if r_words:
                 c_txt, c_x0, c_x1 = r_words[0]['text'], r_words[0]['x0'], r_words[0]['x1']
                 for i in range(1, len(r_words)):
                     w = r_words[i]
-                    if (w['x0'] - c_x1) < 4: c_txt += w['text']; c_x1 = w['x1']
+                    if (w['x0'] - c_x1) < 4: c_txt += sep + w['text']; c_x1 = w['x1']
                     else: parts.append((c_txt, c_x0)); c_txt, c_x0, c_x1 = w['text'], w['x0'], w['x1']
                 parts.append((c_txt, c_x0))
             res.append(parts)
@@ -70,141 +179,237 @@ class LocalAnalyzer:
             return float(m.group()) if m else None
         except: return None
 
-    def analyze(self):
-        self.log(f"🔍 Analyzing: {Path(self.path).name}")
-        with pdfplumber.open(self.path) as pdf:
-            first_page_text = pdf.pages[0].extract_text() or ""
-            txt_all = "".join([p.extract_text() or "" for p in pdf.pages[:min(12, len(pdf.pages))]]).lower()
-            self.target = "Consolidated" if "consolidated" in txt_all else "Standalone"
-            self.log(f"🎯 Target Result Type: {self.target}")
-            
-            # Global Scale Filter
-            global_scale = 1.0
-            if "crore" in txt_all: 
-                global_scale = 1.0
-                self.log("📏 Global Scale: Crores (No conversion)")
-            elif any(x in txt_all for x in ["lakh", "lac", "lacs"]): 
-                global_scale = 100.0
-                self.log("📏 Global Scale: Lakhs (Will divide by 100)")
+    def score_page(self, text):
+        """Heuristic relevance score of a page's text; 100+ marks a results-table candidate."""
+        if not text: return 0
+        txt = text.lower()
+        score = 0
+        if "ended" in txt: score += 50
+        if "particulars" in txt: score += 50
+        if self.target.lower() in txt: score += 100
+        return score
+
+    def is_complete(self, best_prio):
+        """True once every required metric is filled for every period at `best_prio` or better."""
+        return all(
+            self.results[p][k] != 0 and self.found_priority[p][k] <= best_prio
+            for p in self.periods for k in REQUIRED_METRICS
+        )
+
+    def parse_page(self, pages, page_idx, global_scale):
+        self.report('parse', f"Parsing page {page_idx + 1}")
+        self.log(f"📄 Processing Page {page_idx + 1}...")
+        self.apply_matches(*self.page_matches(pages.text(page_idx), pages.words(page_idx), global_scale))
+
+    def page_matches(self, text, words, global_scale):
+        """
+        Reads one candidate page without touching the results.
+        Returns (prio, page_scale, row_count, matches) where matches are (metric, label, values) in row order.
+        """
+        txt = text.lower()
+        is_con = "consolidated" in txt
+        prio = 1 if is_con else (2 if "standalone" in txt else 3)
+        
+        # Page-specific scale override
+        page_scale = global_scale
+        scale_area = re.search(r'in\s*(lakh|lac|crore|million|rs|rupee)', txt)
+        if scale_area:
+            skw = scale_area.group(1)
+            if "crore" in skw: page_scale = 1.0
+            elif "lakh" in skw or "lac" in skw: page_scale = 100.0
+        
+        rows = self.get_rows(words)
+        matches = []
+        for r in rows:
+            nums = []
+            for t, x in r:
+                v = self.parse_val(t)
+                if v is not None: nums.append(v)
             
-            mapping = {
-                "revenue": [("revenuefromoperations", 1), ("incomefromoperations", 2), ("netsales", 3)],
-                "TotalInc": [("totalincome", 1), ("totalrevenue", 1)],
-                "total_expenses": [("totalexpenses", 1), ("totalexpenditure", 2)],
-                "pbt": [("profitbeforetax", 1), ("profitlossbeforetax", 2), ("pbt", 3), ("profitbeforeexceptional", 4)],
-                "net_profit": [("netprofit", 1), ("profitfortheperiod", 1), ("profitaftertax", 3), ("profitfortheyear", 1), ("profi", 5)],
-                "eps": [("basicearningspershare", 1), ("basiceps", 1), ("earningpershare", 2), ("basic", 3)],
-                "Dep": [("depreciation", 1)], 
-                "Int": [("financecost", 1), ("interestcost", 1)], 
-                "other_income": [("otherincome", 1)]
-            }
-
-            best_pages = []
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text()
-                if not text: continue
-                txt = text.lower()
-                score = 0
-                if "ended" in txt: score += 50
-                if "particulars" in txt: score += 50
-                if self.target.lower() in txt: score += 100
-                if score >= 100:
-                    best_pages.append((i, page))
-
-            if not best_pages:
-                self.log("⚠️ No high-confidence result pages found.")
+            if not nums: continue
             
-            for page_idx, page in best_pages:
-                self.log(f"📄 Processing Page {page_idx + 1}...")
-                txt = page.extract_text().lower()
-                is_con = "consolidated" in txt
-                prio = 1 if is_con else (2 if "standalone" in txt else 3)
-                
-                # Page-specific scale override
-                page_scale = global_scale
-                scale_area = re.search(r'in\s*(lakh|lac|crore|million|rs|rupee)', txt)
-                if scale_area:
-                    skw = scale_area.group(1)
-                    if "crore" in skw: page_scale = 1.0
-                    elif "lakh" in skw or "lac" in skw: page_scale = 100.0
-                
-                rows = self.get_rows(page)
-                self.log(f"📊 Found {len(rows)} text rows on page.")
-                
-                for r in rows:
-                    nums = []
-                    for t, x in r:
-                        v = self.parse_val(t)
-                        if v is not None: nums.append((v, x))
-                    
-                    if not nums: continue
-                    
-                    r_str = " ".join([p[0] for p in r])
-                    match = re.search(r'-?\d', r_str)
-                    lbl_text = r_str[:match.start()] if match else r_str
-                    lbl = normalize(lbl_text)
-                    
-                    target_key = None
-                    for k, kws in mapping.items():
-                        for kw, rk in kws:
-                            if normalize(kw) in lbl:
-                                if k == "Int" and "income" in lbl: continue
-                                if k == "net_profit" and any(x in lbl for x in ["comprehensive", "minority", "equity"]): continue
-                                target_key = k; break
-                        if target_key: break
-                    
-                    if target_key:
-                        self.log(f"✅ Found Metric: {target_key} (Labels: '{lbl_text.strip()}')")
-                        for i, (val, x) in enumerate(nums[:4]):
-                            p_name = self.periods[i]
-                            # Normalization: If Lakhs -> Crores (div 100). If EPS -> No conversion.
-                            divisor = 1.0 if (target_key == "eps" or page_scale == 1.0) else 100.0
-                            s_val = round(val / divisor, 2)
-                            
-                            if target_key in ["Dep", "Int", "TotalInc"]:
-                                if self.helpers[p_name][target_key] == 0: 
-                                    self.helpers[p_name][target_key] = s_val
-                            else:
-                                curr_prio = self.found_priority[p_name].get(target_key, 99)
-                                if prio < curr_prio or (prio == curr_prio and self.results[p_name][target_key] == 0):
-                                    self.results[p_name][target_key] = s_val
-                                    self.found_priority[p_name][target_key] = prio
-                                    self.log(f"   ∟ {p_name}: {s_val} Cr")
-
-            # Post-processing
-            self.log("🔧 Finalizing calculations...")
-            for p in self.periods:
-                if self.results[p]["revenue"] == 0 and self.helpers[p]["TotalInc"] != 0:
-                    self.results[p]["revenue"] = round(self.helpers[p]["TotalInc"] - self.results[p]["other_income"], 2)
-                
-                if self.results[p]["operating_profit"] == 0 and self.results[p]["revenue"] != 0:
-                    self.results[p]["operating_profit"] = round(
-                        self.results[p]["pbt"] + self.helpers[p]["Dep"] + self.helpers[p]["Int"] - self.results[p]["other_income"], 2
-                    )
+            r_str = " ".join([p[0] for p in r])
+            match = _FIRST_NUMBER_RE.search(r_str)
+            lbl_text = r_str[:match.start()] if match else r_str
+            target_key, _ = LABEL_MATCHER.match(normalize(lbl_text))
+            if target_key:
+                matches.append((target_key, lbl_text.strip(), nums[:4]))
+        return prio, page_scale, len(rows), matches
+
+    def apply_matches(self, prio, page_scale, row_count, matches):
+        """Merges one page's matches into the results under the found_priority rules."""
+        self.log(f"📊 Found {row_count} text rows on page.")
+        for target_key, lbl_text, values in matches:
+            self.log(f"✅ Found Metric: {target_key} (Labels: '{lbl_text}')")
+            for i, val in enumerate(values):
+                p_name = self.periods[i]
+                # Normalization: If Lakhs -> Crores (div 100). If EPS -> No conversion.
+                divisor = 1.0 if (target_key == "eps" or page_scale == 1.0) else 100.0
+                s_val = round(val / divisor, 2)
                 
-                if self.results[p]["revenue"] != 0:
-                    self.results[p]["opm"] = round((self.results[p]["operating_profit"] / self.results[p]["revenue"]) * 100, 2)
+                if target_key in ["Dep", "Int", "TotalInc"]:
+                    if self.helpers[p_name][target_key] == 0: 
+                        self.helpers[p_name][target_key] = s_val
+                else:
+                    curr_prio = self.found_priority[p_name].get(target_key, 99)
+                    if prio < curr_prio or (prio == curr_prio and self.results[p_name][target_key] == 0):
+                        self.results[p_name][target_key] = s_val
+                        self.found_priority[p_name][target_key] = prio
+                        self.log(f"   ∟ {p_name}: {s_val} Cr")
 
-            table_data = []
-            for p in self.periods:
-                row = self.results[p]
-                row['period'] = p
-                table_data.append(row)
+    def scan_serial(self, pages, global_scale, best_prio):
+        """Reads candidate pages one after another. Returns True if any page qualified."""
+        found_any = False
+        for page_idx in range(len(pages)):
+            if self.score_page(pages.text(page_idx)) < 100: continue
+            found_any = True
+            self.parse_page(pages, page_idx, global_scale)
+            if self.is_complete(best_prio):
+                self.log(f"⏹️ All required metrics found at priority {best_prio}; skipping {len(pages) - page_idx - 1} remaining pages")
+                break
+        return found_any
 
-            full_text = ""
-            for p in pdf.pages: full_text += (p.extract_text() or "") + "\n"
-            
-            ids = extract_identifiers_and_period(full_text, first_page_text)
-            self.log(f"🆔 Company ID: {ids['company_id']} | Code: {ids['company_code']}")
+    def scan_chunk(self, pages, page_indices, global_scale):
+        """Scores and reads a run of pages without touching the results: [(idx, text, page_matches or None)]."""
+        out = []
+        for idx in page_indices:
+            text = pages.text(idx)
+            parsed = self.page_matches(text, pages.words(idx), global_scale) if self.score_page(text) >= 100 else None
+            out.append((idx, text, parsed))
+        return out
+
+    def scan_parallel(self, pages, global_scale, best_prio):
+        """
+        Reads page chunks in worker processes (each opens the PDF itself), then merges them in page
+        order under the same priority rules and early exit as scan_serial, so the output does not
+        depend on the worker count. Returns True if any page qualified.
+        """
+        n = len(pages)
+        size = max(1, math.ceil(n / (self.page_workers * PAGE_CHUNKS_PER_WORKER)))
+        chunks = [range(i, min(i + size, n)) for i in range(0, n, size)]
+        self.log(f"⚡ Reading {n} pages in {len(chunks)} chunks on {self.page_workers} processes")
+        pool = get_page_pool(self.page_workers)
+        futures = [pool.submit(_scan_page_chunk, self.path, pages.backend, self.target, chunk, global_scale) for chunk in chunks]
+        found_any = False
+        try:
+            for chunk, fut in zip(chunks, futures):
+                try:
+                    scanned = fut.result()
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        # A page process died: replace the pool for later runs, this one finishes in-process
+                        get_page_pool(self.page_workers, broken=pool)
+                    self.log(f"⚠️ Page worker failed ({e}); reading pages {chunk.start + 1}-{chunk.stop} in-process")
+                    scanned = self.scan_chunk(pages, chunk, global_scale)
+                for idx, text, parsed in scanned:
+                    pages.prime(idx, text=text)
+                    if parsed is None: continue
+                    found_any = True
+                    self.report('parse', f"Parsing page {idx + 1}")
+                    self.log(f"📄 Processing Page {idx + 1}...")
+                    self.apply_matches(*parsed)
+                    if self.is_complete(best_prio):
+                        self.log(f"⏹️ All required metrics found at priority {best_prio}; skipping {n - idx - 1} remaining pages")
+                        return found_any
+        finally:
+            for fut in futures: fut.cancel()
+        return found_any
+
+    @timed('local')
+    def analyze(self):
+        self.log(f"🔍 Analyzing: {Path(self.path).name}")
+        if self.pages is None:
+            self.pages = PageTextCache(self.path, backend=self.text_backend)
+        try:
+            return self._analyze(self.pages)
+        finally:
+            if self._owns_pages:
+                self.pages.close()
+
+    def _analyze(self, pages):
+        first_page_text = pages.text(0)
+        txt_all = pages.joined_text(0, 12).lower()
+        self.target = "Consolidated" if "consolidated" in txt_all else "Standalone"
+        self.log(f"🎯 Target Result Type: {self.target}")
+        
+        # Global Scale Filter
+        global_scale = 1.0
+        if "crore" in txt_all: 
+            global_scale = 1.0
+            self.log("📏 Global Scale: Crores (No conversion)")
+        elif any(x in txt_all for x in ["lakh", "lac", "lacs"]): 
+            global_scale = 100.0
+            self.log("📏 Global Scale: Lakhs (Will divide by 100)")
+        
+        # Candidate pages are scored lazily in document order; once every REQUIRED_METRICS cell holds a
+        # value at the best priority this filing can offer, no later page can replace it, so scanning stops.
+        best_prio = 1 if self.target == "Consolidated" else 2
+        self.report('scoring', f"Scoring {len(pages)} pages")
+        with span('local.scan'):
+            if self.page_workers > 1 and len(pages) >= config.PAGE_PARALLEL_MIN_PAGES:
+                found_any = self.scan_parallel(pages, global_scale, best_prio)
+            else:
+                found_any = self.scan_serial(pages, global_scale, best_prio)
+
+        if not found_any:
+            self.log("⚠️ No high-confidence result pages found.")
+
+        # Post-processing
+        self.log("🔧 Finalizing calculations...")
+        for p in self.periods:
+            if self.results[p]["revenue"] == 0 and self.helpers[p]["TotalInc"] != 0:
+                self.results[p]["revenue"] = round(self.helpers[p]["TotalInc"] - self.results[p]["other_income"], 2)
             
-            actions = extract_corporate_actions(full_text) if self.include_corp_actions else {}
-            output = analyze_results(table_data, self.include_observations, self.include_recommendations)
-            output.update(ids)
-            output['corporate_actions'] = actions
-            output['debug_logs'] = self.debug_logs
-            output['result_type'] = self.target
+            if self.results[p]["operating_profit"] == 0 and self.results[p]["revenue"] != 0:
+                self.results[p]["operating_profit"] = round(
+                    self.results[p]["pbt"] + self.helpers[p]["Dep"] + self.helpers[p]["Int"] - self.results[p]["other_income"], 2
+                )
             
-            return output
+            if self.results[p]["revenue"] != 0:
+                self.results[p]["opm"] = round((self.results[p]["operating_profit"] / self.results[p]["revenue"]) * 100, 2)
+
+        table_data = []
+        for p in self.periods:
+            row = self.results[p]
+            row['period'] = p
+            table_data.append(row)
+
+        # Identifiers only look at the head of the document; the whole text is read for corporate actions only
+        if self.include_corp_actions:
+            full_text = pages.joined_text(sep="\n") + "\n"
+        else:
+            full_text = leading_text(pages, IDENTIFIER_SCAN_CHARS)
+        
+        ids = extract_identifiers_and_period(full_text, first_page_text)
+        self.log(f"🆔 Company ID: {ids['company_id']} | Code: {ids['company_code']}")
+        
+        actions = extract_corporate_actions(full_text) if self.include_corp_actions else {}
+        output = analyze_results(table_data, self.include_observations, self.include_recommendations)
+        output.update(ids)
+        output['corporate_actions'] = actions
+        output['debug_logs'] = self.debug_logs
+        output['result_type'] = self.target
+        
+        return output
+
+# Each worker gets a few chunks so an early exit can cancel the pages nobody needs yet
+PAGE_CHUNKS_PER_WORKER = 4
+
+_page_pool = SpawnPool('page extraction')
+
+def get_page_pool(workers, broken=None):
+    """Returns the process pool used by scan_parallel with `workers` processes (see pools.SpawnPool)."""
+    return _page_pool.get(workers, broken=broken)
+
+def shutdown_page_pool():
+    _page_pool.shutdown()
+
+def _scan_page_chunk(pdf_path, text_backend, target, page_indices, global_scale):
+    """Pool task: opens the PDF in this process and scans a run of pages (see LocalAnalyzer.scan_chunk)."""
+    analyzer = LocalAnalyzer(pdf_path, text_backend=text_backend, page_workers=1)
+    analyzer.target = target
+    with PageTextCache(pdf_path, backend=text_backend) as pages:
+        return analyzer.scan_chunk(pages, page_indices, global_scale)
 
 def extract_financial_data(pdf_path, **kwargs):
     analyzer = LocalAnalyzer(pdf_path, **kwargs)
@@ -225,7 +430,11 @@ def extract_corporate_actions(text):
             actions['management_change'] = "Yes"
     return actions
 
-def extract_identifiers_and_period(text, first_page_text):
+def extract_identifiers_and_period(text=None, first_page_text=None, pages=None):
+    # When a PageTextCache is supplied, pull the header pages from it instead of re-extracting
+    if pages is not None:
+        if first_page_text is None: first_page_text = pages.text(0)
+        if text is None: text = pages.joined_text(0, 3)
     res = {"company_id": None, "company_code": None, "quarter": "Q1", "year": 2025}
     m = re.search(r"(?:Scrip code no:|Security Code:|Scrip code:)\s*(\d{6})", first_page_text, re.I)
     if m: res["company_id"] = m.group(1)
@@ -233,30 +442,54 @@ def extract_identifiers_and_period(text, first_page_text):
     if m: res["company_code"] = m.group(1)
     
     # Improved Quarter Detection: Handle "September, 2025" or "September 2025"
-    m = re.search(r"(june|september|december|march|jun|sep|dec|mar)[^a-z0-9]*(20\d{2})", text.lower()[:3000])
+    m = re.search(r"(june|september|december|march|jun|sep|dec|mar)[^a-z0-9]*(20\d{2})", text.lower()[:IDENTIFIER_SCAN_CHARS])
     if m:
         mo = m.group(1)
         res["quarter"] = {"jun":"Q1","sep":"Q2","dec":"Q3","mar":"Q4"}.get(mo[:3], "Q1")
         res["year"] = int(m.group(2))
     return res
 
+# Metrics that get QoQ/YoY growth figures
+GROWTH_METRICS = ['revenue', 'other_income', 'total_expenses', 'operating_profit', 'opm', 'pbt', 'net_profit', 'eps']
+
+# Observation rules in output order: (message, test). test(curr, growth) gets the current period and the
+# growth figures - dicts of floats here, DataFrames of whole columns in recompute.py - so keep it to
+# comparisons and arithmetic that work on both.
+OBSERVATION_RULES = [
+    ("🚨 CRITICAL RED FLAG: Operating Loss.", lambda c, g: c['operating_profit'] < 0),
+    ("⚠️ Margin Collapse.", lambda c, g: c['opm'] < 0),
+    ("📉 Significant Revenue decline QoQ.", lambda c, g: g['revenue_qoq'] < -10),
+    ("🚀 Strong Profit growth YoY.", lambda c, g: g['net_profit_yoy'] > 20),
+]
+
+# Recommendation score bands, best first: (minimum score, verdict, color)
+VERDICT_BANDS = [
+    (2, "BUY / ACCUMULATE", "green"),
+    (-2, "HOLD / NEUTRAL", "orange"),
+    (None, "STRONG AVOID / SELL", "red"),
+]
+
+def observation_score(obs):
+    """Recommendation score contribution of one observation message."""
+    if "CRITICAL" in obs: return -5
+    if "⚠️" in obs: return -2
+    if "📉" in obs: return -1
+    if "🚀" in obs: return 2
+    return 0
+
 def analyze_results(results, include_obs=False, include_rec=False):
     if not results: return {}
     curr, prev, yoy = results[0], results[1], results[2]
     
     # Calculate growth for all metrics
-    metrics = ['revenue', 'other_income', 'total_expenses', 'operating_profit', 'opm', 'pbt', 'net_profit', 'eps']
     growth = {}
-    for m in metrics:
+    for m in GROWTH_METRICS:
         growth[f"{m}_qoq"] = round(((curr[m] - prev[m])/prev[m]*100), 2) if prev[m] else 0
         growth[f"{m}_yoy"] = round(((curr[m] - yoy[m])/yoy[m]*100), 2) if yoy[m] else 0
     
     observations = []
     if include_obs:
-        if curr['operating_profit'] < 0: observations.append("🚨 CRITICAL RED FLAG: Operating Loss.")
-        if curr['opm'] < 0: observations.append("⚠️ Margin Collapse.")
-        if growth['revenue_qoq'] < -10: observations.append("📉 Significant Revenue decline QoQ.")
-        if growth['net_profit_yoy'] > 20: observations.append("🚀 Strong Profit growth YoY.")
+        observations = [msg for msg, test in OBSERVATION_RULES if test(curr, growth)]
     
     recommendation = {}
     if include_rec:
@@ -270,14 +503,9 @@ def analyze_results(results, include_obs=False, include_rec=False):
     }
 
 def generate_recommendation(data, obs):
-    score = 0
-    for o in obs:
-        if "CRITICAL" in o: score -= 5
-        elif "⚠️" in o: score -= 2
-        elif "📉" in o: score -= 1
-        elif "🚀" in o: score += 2
+    score = sum(observation_score(o) for o in obs)
     if data['net_profit'] > 0: score += 2
     
-    if score >= 2: return {"verdict": "BUY / ACCUMULATE", "color": "green", "reasons": obs}
-    if score > -3: return {"verdict": "HOLD / NEUTRAL", "color": "orange", "reasons": obs}
-    return {"verdict": "STRONG AVOID / SELL", "color": "red", "reasons": obs}
+    for min_score, verdict, color in VERDICT_BANDS:
+        if min_score is None or score >= min_score:
+            return {"verdict": verdict, "color": color, "reasons": obs}
@@ -1,9 +1,23 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory
 import os
+import hmac
+import json
+import queue
+import threading
+import uuid
 from werkzeug.utils import secure_filename
-from analyzer import extract_financial_data
-from browser_utils import download_pdf_from_url
-from database_utils import upsert_analysis_data, get_all_analysis_data
+from database_utils import query_analysis_page
+from pipeline import run_analysis
+from page_cache import TEXT_BACKENDS
+from openai_analyzer import AI_INPUTS
+from job_queue import submit_analysis, submit_batch, submit_snapshot, get_job, init_job_db
+from ai_cache import init_ai_cache, cache_stats
+from ai_client import set_rate_share
+from timings import request_timings, span, render_metrics
+from profiling import PROFILE_FILE_RE, list_profiles
+from pdf_store import PdfTooLarge, store_stream
+from snapshot import SNAPSHOT_FILE_RE, list_snapshot_files, load_state
+from config import config
 
 import logging
 
@@ -12,13 +26,17 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['DOWNLOAD_FOLDER'] = 'downloads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max limit
+app.config['UPLOAD_FOLDER'] = 'uploads'  # zip files for /batch; PDFs go to the PDF store
+# Request body cap; each PDF is also held to MAX_PDF_MB while it streams into the store
+app.config['MAX_CONTENT_LENGTH'] = config.MAX_UPLOAD_MB * 1024 * 1024
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['DOWNLOAD_FOLDER'], exist_ok=True)
+os.makedirs(config.PDF_STORE_DIR, exist_ok=True)
+init_job_db()
+init_ai_cache()
+# Analyses run in this process get OPENAI_WEB_SHARE of the OpenAI limits; the /jobs pool splits the rest
+set_rate_share(config.OPENAI_WEB_SHARE)
 
 @app.route('/')
 def index():
@@ -26,55 +44,81 @@ def index():
 
 @app.route('/database')
 def database_view():
-    data = get_all_analysis_data()
-    return render_template('database.html', data=data)
+    # Rows are fetched page by page from /api/analysis
+    return render_template('database.html')
+
+@app.route('/api/analysis')
+def analysis_api():
+    """
+    Paginated analysis rows. Query params: company, quarter, year, verdict (filters),
+    sort (column id), dir (asc/desc), limit, cursor (next_cursor from the previous page).
+    """
+    args = request.args
+    page = query_analysis_page(
+        company=args.get('company', '').strip() or None,
+        quarter=args.get('quarter') or None,
+        year=args.get('year', type=int),
+        verdict=args.get('verdict') or None,
+        sort=args.get('sort', 'year'),
+        direction=args.get('dir', 'desc'),
+        limit=args.get('limit', 50, type=int),
+        cursor=args.get('cursor') or None
+    )
+    status = 503 if page.get('error') else 200
+    return jsonify(page), status
+
+@app.route('/api/snapshot')
+def snapshot_api():
+    """
+    Columnar snapshot of the analysis table (see snapshot.py): format, watermark, row count and the
+    partition files, each downloadable from /api/snapshot/<name>. Admin only: the files hold the whole table.
+    """
+    if not is_admin():
+        return admin_error()
+    state = load_state()
+    if state is None:
+        return jsonify({'error': 'No snapshot exported yet'}), 404
+    return jsonify({**state, 'files': list_snapshot_files()})
+
+@app.route('/api/snapshot/<path:name>')
+def snapshot_file(name):
+    if not is_admin():
+        return admin_error()
+    if not SNAPSHOT_FILE_RE.match(name):
+        return jsonify({'error': 'Unknown snapshot file'}), 404
+    return send_from_directory(os.path.abspath(config.SNAPSHOT_DIR), name, as_attachment=True)
+
+@app.route('/admin/snapshot', methods=['POST'])
+def snapshot_export():
+    """
+    Queues an export of rows created since the last snapshot run (form field full=true rebuilds it).
+    Poll /jobs/<job_id>; the finished job's result is the run summary.
+    """
+    if not is_admin():
+        return admin_error()
+    job_id = submit_snapshot(full=request.form.get('full') == 'true')
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}), 202
 
 @app.route('/favicon.ico')
 def favicon():
     return '', 204
 
-def is_high_confidence(data):
+def is_admin():
+    """True when the request carries the configured ADMIN_TOKEN in X-Admin-Token; never when no token is set."""
+    if config.ADMIN_TOKEN is None: return False
+    return hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), config.ADMIN_TOKEN.encode())
+
+def admin_error():
+    """The 403 response for admin-only requests that fail is_admin()."""
+    if config.ADMIN_TOKEN is None:
+        return jsonify({'error': 'Admin endpoints are disabled; set ADMIN_TOKEN to enable them.'}), 403
+    return jsonify({'error': 'Invalid or missing X-Admin-Token header.'}), 403
+
+def parse_analysis_options():
     """
-    Evaluates if local extraction results are reliable enough.
-    Returns True if confident, False if AI fallback is recommended.
+    Reads and validates the processing options shared by /analyze, /jobs and /batch.
+    Returns (run_analysis kwargs, None) or (None, error response).
     """
-    if not data or 'error' in data:
-        logger.info("❌ Confidence Check: Data has errors")
-        return False
-    
-    table_data = data.get('table_data', [])
-    if not table_data:
-        logger.info("❌ Confidence Check: No table data found")
-        return False
-    
-    current = table_data[0]
-    
-    # Check 1: Revenue must be positive
-    if current.get('revenue', 0) <= 0:
-        logger.info("❌ Confidence Check: Revenue is zero or negative")
-        return False
-    
-    # Check 2: At least one profit metric should exist
-    if current.get('net_profit') == 0 and current.get('pbt') == 0:
-        logger.info("❌ Confidence Check: No profit data found")
-        return False
-    
-    # Check 3: Should have multi-period data for comparison
-    if len(table_data) < 2:
-        logger.info("⚠️ Confidence Check: Only single period found (acceptable but not ideal)")
-        # Don't fail on this - single period is still useful
-    
-    # Check 4: Operating profit should be calculated
-    if current.get('operating_profit') == 0 and current.get('revenue', 0) > 0:
-        logger.info("⚠️ Confidence Check: Operating profit calculation seems off")
-        # Don't fail - might be legitimate zero
-    
-    logger.info("✅ Confidence Check: All critical metrics present - HIGH CONFIDENCE")
-    return True
-
-@app.route('/analyze', methods=['POST'])
-def analyze():
-    file_path = None
     api_key = None
     
     # Get Processing Mode
@@ -88,127 +132,222 @@ def analyze():
         api_key = request.form.get('api_key', '').strip() if request.form.get('api_key') else None
         
         if not api_key:
-            return jsonify({'error': 'OpenAI API key is required for AI and Smart modes.'}), 400
+            return None, (jsonify({'error': 'OpenAI API key is required for AI and Smart modes.'}), 400)
         
         if not api_key.startswith('sk-'):
-            return jsonify({'error': 'Invalid API key format. OpenAI keys start with "sk-"'}), 400
+            return None, (jsonify({'error': 'Invalid API key format. OpenAI keys start with "sk-"'}), 400)
+    
+    # Optional per-request text backend override ('pdfplumber' or 'fitz')
+    text_backend = request.form.get('text_backend', '').strip().lower() or None
+    if text_backend and text_backend not in TEXT_BACKENDS:
+        return None, (jsonify({'error': f"Unknown text backend '{text_backend}'. Use one of: {', '.join(TEXT_BACKENDS)}"}), 400)
+    
+    # Optional per-request AI input override ('auto' or 'vision')
+    ai_input = request.form.get('ai_input', '').strip().lower() or None
+    if ai_input and ai_input not in AI_INPUTS:
+        return None, (jsonify({'error': f"Unknown AI input '{ai_input}'. Use one of: {', '.join(AI_INPUTS)}"}), 400)
     
-    # Get Optional Analysis Flags
-    include_corp_actions = request.form.get('include_corp_actions') == 'true'
-    include_observations = request.form.get('include_observations') == 'true'
-    include_recommendations = request.form.get('include_recommendations') == 'true'
+    # Full cProfile + tracemalloc capture of this run (X-Profile header or `profile` form field)
+    profile = request.headers.get('X-Profile', '').lower() in ('1', 'true') or request.form.get('profile') == 'true'
+    if profile and config.ADMIN_TOKEN is None:
+        # Profiling is admin-only: without a configured token the flag is ignored
+        profile = False
+    elif profile and not is_admin():
+        return None, (jsonify({'error': 'Profiling requires a valid X-Admin-Token header.'}), 403)
+    
+    kwargs = {
+        'processing_mode': processing_mode,
+        'api_key': api_key,
+        'ai_page_limit': ai_page_limit,
+        # Optional Analysis Flags
+        'include_corp_actions': request.form.get('include_corp_actions') == 'true',
+        'include_observations': request.form.get('include_observations') == 'true',
+        'include_recommendations': request.form.get('include_recommendations') == 'true',
+        # Re-ask the model instead of reusing a cached AI response
+        'bypass_ai_cache': request.form.get('bypass_ai_cache') == 'true',
+        'text_backend': text_backend,
+        'ai_input': ai_input,
+        'profile': profile
+    }
+    return kwargs, None
+
+def parse_analysis_request():
+    """Reads the options plus the single file/URL input. Returns (kwargs, None) or (None, error response)."""
+    kwargs, error = parse_analysis_options()
+    if error:
+        return None, error
     
     # Handle File Upload
     if 'file' in request.files and request.files['file'].filename != '':
         file = request.files['file']
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        logger.info(f"File uploaded: {filename}")
+        # Streamed in chunks into the PDF store under its content hash, so same-named uploads never collide
+        try:
+            with span('upload'):
+                file_path, _ = store_stream(file.stream)
+        except PdfTooLarge as e:
+            return None, (jsonify({'error': str(e)}), 413)
+        logger.info(f"File uploaded: {secure_filename(file.filename)}")
+        kwargs['file_path'] = file_path
         
-    # Handle URL Input
+    # Handle URL Input (downloaded inside the pipeline)
     elif 'url' in request.form and request.form['url'] != '':
-        url = request.form['url']
-        file_path = download_pdf_from_url(url, app.config['DOWNLOAD_FOLDER'])
-        if not file_path:
-            return jsonify({'error': 'Failed to download PDF from URL'}), 400
+        kwargs['url'] = request.form['url']
             
     else:
-        return jsonify({'error': 'No file or URL provided'}), 400
-    
-    # Process the PDF
-    try:
-        # 1. Pre-extraction to get identifiers (Fast)
-        from analyzer import extract_identifiers_and_period
-        import pdfplumber
-        with pdfplumber.open(file_path) as pdf:
-            first_page_text = pdf.pages[0].extract_text() or ""
-            full_text_start = "".join([p.extract_text() or "" for p in pdf.pages[:3]])
-            ids = extract_identifiers_and_period(full_text_start, first_page_text)
-        
-        # 2. Check Database Cache
-        if ids.get('company_id') and ids.get('quarter') and ids.get('year'):
-            from database_utils import get_analysis_data
-            cached_data = get_analysis_data(ids['company_id'], ids['quarter'], ids['year'])
-            if cached_data:
-                logger.info(f"♻️ Found cached results for {ids['company_id']} ({ids['quarter']} {ids['year']})")
-                cached_data['processing_method'] = 'Database (Cached)'
-                cached_data['cost_saved'] = True
-                return jsonify(cached_data)
-
-        # 3. Proceed with Analysis if not cached
-        analyzer_options = {
-            'include_corp_actions': include_corp_actions,
-            'include_observations': include_observations,
-            'include_recommendations': include_recommendations
-        }
-
-        if processing_mode == 'smart':
-            logger.info("🧠 Starting SMART mode - trying local extraction first...")
-            data = extract_financial_data(file_path, **analyzer_options)
-            
-            if is_high_confidence(data):
-                logger.info("✅ Local extraction successful")
-                data['processing_method'] = 'Local'
-                data['cost_saved'] = True
-            else:
-                logger.warning("⚠️ Low confidence - falling back to AI...")
-                from openai_analyzer import analyze_with_openai
-                ai_data = analyze_with_openai(file_path, api_key, max_pages=ai_page_limit, **analyzer_options)
-                ai_data['processing_method'] = 'AI (Fallback)'
-                ai_data['cost_saved'] = False
-                if 'debug_logs' in data:
-                    ai_data['debug_logs'] = data['debug_logs'] + ai_data.get('debug_logs', [])
-                data = ai_data
-                
-        elif processing_mode == 'ai':
-            from openai_analyzer import analyze_with_openai
-            data = analyze_with_openai(file_path, api_key, max_pages=ai_page_limit, **analyzer_options)
-            data['processing_method'] = 'AI'
-            data['cost_saved'] = False
-            
-        else:  # local mode
-            data = extract_financial_data(file_path, **analyzer_options)
-            data['processing_method'] = 'Local'
-            data['cost_saved'] = True
-        
-        # Check for errors in the response
-        if not data or 'error' in data:
-            error_msg = data.get('error', 'Unknown error during extraction')
-            logger.error(f"Analysis error: {error_msg}")
-            return jsonify({'error': error_msg}), 400
-            
-        # --- Save to Database ---
+        return None, (jsonify({'error': 'No file or URL provided'}), 400)
+    
+    return kwargs, None
+
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    with request_timings() as timings:
+        with span('request'):
+            kwargs, error = parse_analysis_request()
+            if error:
+                return error
+            data, status = run_analysis(**kwargs)
+    if timings is not None:
+        data['timings'] = timings.as_dict()
+    return jsonify(data), status
+
+# Seconds between SSE comment lines that keep idle proxies from closing the stream
+SSE_HEARTBEAT_SECONDS = 15
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """
+    Same inputs as /analyze, answered as Server-Sent Events while the analysis runs:
+    `stage` (stage transitions), `log` (analyzer log lines), `partial` (local table data before any
+    AI fallback) and a final `result` event carrying {status, data}.
+    """
+    kwargs, error = parse_analysis_request()
+    if error:
+        return error
+    
+    events = queue.Queue()
+    
+    def run():
         try:
-            db_success = upsert_analysis_data(data)
-            data['saved_to_db'] = db_success
-            if db_success:
-                logger.info("Data successfully stored in database")
-            else:
-                logger.warning("Data extraction worked, but database storage failed")
-        except Exception as db_err:
-            logger.error(f"Database trigger error: {db_err}")
-            data['saved_to_db'] = False
-
-        if data.get('debug_logs'):
-            logger.info(f"Captured {len(data['debug_logs'])} debug logs from analyzer")
-
-        logger.info("Analysis completed successfully")
-        return jsonify(data)
-        
-    except Exception as e:
-        logger.error(f"Error during analysis: {e}", exc_info=True)
-        error_msg = str(e)
-        
-        # Provide user-friendly error messages
-        if 'invalid_api_key' in error_msg.lower() or 'incorrect api key' in error_msg.lower():
-            return jsonify({'error': 'Invalid OpenAI API key. Please check your key and try again.'}), 401
-        elif 'rate_limit' in error_msg.lower():
-            return jsonify({'error': 'OpenAI rate limit exceeded. Please wait a moment and try again.'}), 429
-        elif 'insufficient_quota' in error_msg.lower():
-            return jsonify({'error': 'Insufficient OpenAI credits. Please add credits to your account.'}), 402
+            data, status = run_analysis(
+                progress=lambda stage, message: events.put(('stage', {'stage': stage, 'message': message})),
+                log_callback=lambda message: events.put(('log', {'message': message})),
+                partial=lambda data: events.put(('partial', data)),
+                **kwargs
+            )
+        except Exception as e:
+            logger.error(f"Streamed analysis crashed: {e}", exc_info=True)
+            data, status = {'error': f'Analysis failed: {e}'}, 500
+        events.put(('result', {'status': status, 'data': data}))
+    
+    # The analysis keeps running (and saves its result) even if the client disconnects mid-stream
+    threading.Thread(target=run, name='analyze-stream', daemon=True).start()
+    
+    def stream():
+        while True:
+            try:
+                event, payload = events.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event(event, payload)
+            if event == 'result':
+                break
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queues an analysis on the worker pool and returns immediately with a job id to poll."""
+    kwargs, error = parse_analysis_request()
+    if error:
+        return error
+    job_id = submit_analysis(**kwargs)
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}), 202
+
+@app.route('/batch', methods=['POST'])
+def submit_batch_job():
+    """
+    Queues a batch run over uploaded PDFs/zip files and/or a newline-separated `urls` field.
+    Poll /jobs/<job_id>; the finished job's result is the per-file manifest.
+    """
+    options, error = parse_analysis_options()
+    if error:
+        return error
+    
+    # Only remote URLs from the form: server paths (directories, zips, PDFs) are for the `python -m batch` CLI
+    urls = [u.strip() for u in request.form.get('urls', '').splitlines() if u.strip()]
+    rejected = [u for u in urls if not u.lower().startswith(('http://', 'https://'))]
+    if rejected:
+        return jsonify({'error': f"Only http(s) URLs are accepted, got: {rejected[0][:200]}"}), 400
+    
+    # Batch worker processes, at most one per CPU (default: CPU count)
+    workers = request.form.get('workers', type=int)
+    if workers is not None:
+        workers = max(1, min(workers, os.cpu_count() or 1))
+    
+    sources = []
+    batch_dir = None
+    for f in request.files.getlist('file'):
+        if not f.filename: continue
+        if f.filename.lower().endswith('.pdf'):
+            try:
+                path, _ = store_stream(f.stream)
+            except PdfTooLarge as e:
+                return jsonify({'error': f"{secure_filename(f.filename)}: {e}"}), 413
         else:
-            return jsonify({'error': f'Analysis failed: {error_msg}'}), 500
+            # Zip files are unpacked by the batch; their folder is removed when the job ends
+            if batch_dir is None:
+                batch_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"batch_{uuid.uuid4().hex}")
+                os.makedirs(batch_dir, exist_ok=True)
+            path = os.path.join(batch_dir, secure_filename(f.filename))
+            f.save(path)
+        sources.append(path)
+    sources += urls
+    if not sources:
+        return jsonify({'error': 'No files or URLs provided'}), 400
+    
+    job_id = submit_batch(sources, options, workers=workers, cleanup_dir=batch_dir)
+    return jsonify({'job_id': job_id, 'status': 'queued', 'inputs': len(sources), 'status_url': f'/jobs/{job_id}'}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(job)
+
+@app.route('/api/ai_cache')
+def ai_cache_api():
+    """AI response cache usage: entries, bytes, hits and tokens saved by hits."""
+    return jsonify(cache_stats())
+
+@app.route('/metrics')
+def metrics():
+    """Span latency histograms and peak RSS of this process, in the Prometheus text format."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profiles')
+def profiles_api():
+    """Saved profiles, newest first: id, label, mode, seconds, created and files (download from /admin/profiles/<file>)."""
+    if not is_admin():
+        return admin_error()
+    return jsonify({'profiles': list_profiles()})
+
+@app.route('/admin/profiles/<name>')
+def profile_file(name):
+    if not is_admin():
+        return admin_error()
+    if not PROFILE_FILE_RE.match(name):
+        return jsonify({'error': 'Unknown profile file'}), 404
+    return send_from_directory(os.path.abspath(config.PROFILE_DIR), name, as_attachment=True)
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f"Upload exceeds the {config.MAX_UPLOAD_MB} MB request limit"}), 413
 
 @app.errorhandler(Exception)
 def handle_exception(e):
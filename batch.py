@@ -0,0 +1,223 @@
+"""
+Batch analysis for results days: runs hundreds of filings through the pipeline on a process pool.
+
+Usage:
+    python -m batch <dir | file.zip | file.pdf | url> ... [--urls urls.txt] [--mode local]
+                    [--workers N] [--api-key sk-...] [--manifest manifest.json]
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def collect_inputs(sources, work_dir):
+    """
+    Expands directories, zip files, PDFs and URLs into a flat list of batch items.
+    Zip members are extracted into `work_dir`, checked against their declared sizes first: members over
+    MAX_PDF_MB become failed items (413), and each zip is capped at BATCH_ZIP_MAX_FILES PDFs and
+    BATCH_ZIP_MAX_MB extracted.
+    """
+    from config import config
+    from pdf_store import max_pdf_bytes
+    max_member, max_total = max_pdf_bytes(), config.BATCH_ZIP_MAX_MB * 1024 * 1024
+    items = []
+    for src in sources:
+        src = src.strip()
+        if not src: continue
+        if src.startswith(('http://', 'https://')):
+            items.append({'source': src, 'url': src})
+        elif os.path.isdir(src):
+            for p in sorted(Path(src).rglob('*')):
+                if p.suffix.lower() == '.pdf':
+                    items.append({'source': str(p), 'file_path': str(p)})
+        elif zipfile.is_zipfile(src):
+            dest = os.path.join(work_dir, Path(src).stem)
+            count, total = 0, 0
+            with zipfile.ZipFile(src) as zf:
+                for info in zf.infolist():
+                    name = info.filename
+                    if not name.lower().endswith('.pdf') or info.is_dir(): continue
+                    path = os.path.realpath(os.path.join(dest, name))
+                    # Guard against zip-slip paths
+                    if not path.startswith(os.path.realpath(dest) + os.sep): continue
+                    if count >= config.BATCH_ZIP_MAX_FILES:
+                        logger.warning(f"Skipping the rest of {src}: more than {config.BATCH_ZIP_MAX_FILES} PDFs")
+                        break
+                    count += 1
+                    if info.file_size > max_member:
+                        items.append({'source': f"{src}:{name}", 'too_large': max_member})
+                        continue
+                    if total + info.file_size > max_total:
+                        logger.warning(f"Skipping the rest of {src}: more than {config.BATCH_ZIP_MAX_MB} MB extracted")
+                        break
+                    total += info.file_size
+                    zf.extract(info, dest)
+                    items.append({'source': f"{src}:{name}", 'file_path': path})
+        elif src.lower().endswith('.pdf') and os.path.isfile(src):
+            items.append({'source': src, 'file_path': src})
+        else:
+            logger.warning(f"Skipping unrecognised batch input: {src}")
+    return items
+
+def _init_worker(share=1.0):
+    # Import the extraction stack once per process rather than per filing
+    import analyzer, pipeline  # noqa: F401
+    from ai_client import set_rate_share
+    # Every worker has its own AI executor, so each gets an equal slice of the caller's OpenAI share
+    set_rate_share(share)
+    logging.getLogger().setLevel(logging.WARNING)
+
+def _analyze_item(item, options):
+    """Pool task: analyzes one filing without saving it, returns its manifest entry and result."""
+    from pipeline import run_analysis, analysis_cache_key
+    from pdf_store import PdfTooLarge
+    start = time.time()
+    entry = {'source': item['source']}
+    path = item.get('file_path')
+    try:
+        if item.get('too_large'):
+            raise PdfTooLarge(item['too_large'])
+        if not path:
+            from browser_utils import fetch_pdf
+            path, entry['download_tier'] = fetch_pdf(item['url'])
+        if path:
+            data, status = run_analysis(file_path=path, save=False, **options)
+        else:
+            data, status = {'error': 'Failed to download PDF from URL'}, 400
+    except PdfTooLarge as e:
+        data, status = {'error': str(e)}, 413
+    except Exception as e:
+        data, status = {'error': f'Analysis failed: {e}'}, 500
+
+    entry['seconds'] = round(time.time() - start, 2)
+    entry['http_status'] = status
+    if status != 200:
+        entry['status'] = 'failed'
+        entry['error'] = data.get('error')
+        return entry, None, None
+
+    entry['status'] = 'ok'
+    # Per-filing timings go in the manifest, not into the stored raw_json
+    if data.get('timings'): entry['timings'] = data.pop('timings')
+    entry.update({k: data.get(k) for k in ('company_id', 'company_code', 'quarter', 'year', 'processing_method')})
+    if data.get('ai_cache_hit'):
+        entry['ai_cache_hit'] = True
+        entry['ai_tokens_saved'] = data.get('ai_tokens_saved', 0)
+    cache = None
+    if data.get('processing_method') != 'Database (Cached)':
+        content_hash, cache_key = analysis_cache_key(
+            path, options.get('processing_mode', 'smart'), options.get('ai_page_limit', 10),
+            options.get('include_corp_actions', False), options.get('include_observations', False),
+            options.get('include_recommendations', False), options.get('text_backend'), options.get('ai_input')
+        )
+        cache = (cache_key, content_hash)
+    return entry, data, cache
+
+def run_batch(sources, options=None, workers=None, manifest_path=None, progress=None):
+    """
+    Analyzes every filing in `sources` across a process pool and bulk-upserts the results.
+    `options` are run_analysis keyword arguments (processing_mode, api_key, include_* ...).
+    Returns the manifest dict; it is also written to `manifest_path` when given.
+    """
+    from database_utils import bulk_upsert_analysis_data, bulk_save_analysis_hashes
+    from ai_cache import init_ai_cache
+    from ai_client import rate_share
+    options = dict(options or {})
+    workers = workers or os.cpu_count() or 1
+    started = time.time()
+    init_ai_cache()
+
+    with tempfile.TemporaryDirectory(prefix='batch_') as work_dir:
+        items = collect_inputs(sources, work_dir)
+        logger.info(f"📦 Batch of {len(items)} filings on {workers} worker processes")
+
+        entries, records, hashes = [], [], []
+        # Inside a /jobs worker the caller holds only part of the limits; split that, not the full limits
+        share = rate_share() / workers
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(share,)) as pool:
+            futures = {pool.submit(_analyze_item, item, options): i for i, item in enumerate(items)}
+            for done, fut in enumerate(as_completed(futures), 1):
+                try:
+                    entry, data, cache = fut.result()
+                except Exception as e:
+                    entry, data, cache = {'source': items[futures[fut]]['source'], 'status': 'failed', 'error': str(e)}, None, None
+                entries.append((futures[fut], entry))
+                if data is not None and data.get('processing_method') != 'Database (Cached)':
+                    records.append(data)
+                    if cache: hashes.append((cache[0], cache[1], data))
+                if progress: progress(done, len(items), entry)
+
+    saved = bulk_upsert_analysis_data(records)
+    bulk_save_analysis_hashes(hashes)
+
+    entries = [e for _, e in sorted(entries, key=lambda x: x[0])]
+    manifest = {
+        'total': len(entries),
+        'succeeded': sum(1 for e in entries if e['status'] == 'ok'),
+        'failed': sum(1 for e in entries if e['status'] != 'ok'),
+        'saved_to_db': saved,
+        'ai_cache_hits': sum(1 for e in entries if e.get('ai_cache_hit')),
+        'ai_tokens_saved': sum(e.get('ai_tokens_saved', 0) for e in entries),
+        'workers': workers,
+        'seconds': round(time.time() - started, 2),
+        'files': entries
+    }
+    if manifest_path:
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        logger.info(f"📝 Manifest written to {manifest_path}")
+    logger.info(f"✅ Batch finished: {manifest['succeeded']} ok, {manifest['failed']} failed in {manifest['seconds']}s")
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze many quarterly result filings in parallel.")
+    parser.add_argument('sources', nargs='*', help="Directories, zip files, PDFs or URLs")
+    parser.add_argument('--urls', help="Text file with one PDF URL per line")
+    parser.add_argument('--mode', default='local', choices=['local', 'smart', 'ai'], help="Processing mode (default: local)")
+    parser.add_argument('--api-key', default=os.getenv('OPENAI_API_KEY'), help="OpenAI key for smart/ai modes")
+    parser.add_argument('--ai-page-limit', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--corp-actions', action='store_true')
+    parser.add_argument('--observations', action='store_true')
+    parser.add_argument('--recommendations', action='store_true')
+    parser.add_argument('--text-backend', choices=['pdfplumber', 'fitz'], default=None,
+                        help="Page text library for local extraction (default: TEXT_BACKEND from config)")
+    parser.add_argument('--ai-input', choices=['auto', 'vision'], default=None,
+                        help="AI input: table text when the text layer has it, else images (auto) or always images (vision)")
+    parser.add_argument('--no-ai-cache', action='store_true', help="Always call OpenAI, ignoring cached AI responses")
+    parser.add_argument('--manifest', default=f"batch_manifest_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    args = parser.parse_args(argv)
+
+    sources = list(args.sources)
+    if args.urls:
+        with open(args.urls) as f:
+            sources += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if not sources:
+        parser.error("No inputs given")
+    if args.mode != 'local' and not args.api_key:
+        parser.error("--api-key (or OPENAI_API_KEY) is required for smart and ai modes")
+
+    manifest = run_batch(sources, {
+        'processing_mode': args.mode,
+        'api_key': args.api_key,
+        'ai_page_limit': args.ai_page_limit,
+        'include_corp_actions': args.corp_actions,
+        'include_observations': args.observations,
+        'include_recommendations': args.recommendations,
+        'text_backend': args.text_backend,
+        'bypass_ai_cache': args.no_ai_cache,
+        'ai_input': args.ai_input
+    }, workers=args.workers, manifest_path=args.manifest)
+    return 0 if manifest['failed'] == 0 else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
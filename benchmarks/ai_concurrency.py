@@ -0,0 +1,75 @@
+"""
+AI layer under load: many filings through analyze_with_openai at once against the local mock server.
+
+Checks that every filing succeeds despite injected 429/500 errors, that the client never exceeds
+its requests/min budget as seen by the server, and how many requests were in flight together.
+The AI response cache is bypassed so every filing really reaches the server.
+
+Usage:
+    python -m benchmarks.ai_concurrency [--filings 40] [--threads 20] [--client-rpm 60] [--server-rpm 60]
+                                        [--latency 0.3] [--error-rate 0.1]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from benchmarks.mock_openai import MockOpenAIServer  # noqa: E402
+from benchmarks.filings import MIN_PAGES, generate_filing  # noqa: E402
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filings', type=int, default=40)
+    parser.add_argument('--threads', type=int, default=20, help="Filings submitted at once")
+    parser.add_argument('--client-rpm', type=int, default=60)
+    parser.add_argument('--client-tpm', type=int, default=1_000_000)
+    parser.add_argument('--concurrency', type=int, default=8, help="OPENAI_MAX_CONCURRENCY")
+    parser.add_argument('--server-rpm', type=int, default=60)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--error-rate', type=float, default=0.1)
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    server = MockOpenAIServer(rpm=args.server_rpm, latency=args.latency, error_rate=args.error_rate, seed=7)
+    # The executor reads these when it starts, so set them before the first call
+    config.OPENAI_BASE_URL = server.start()
+    config.OPENAI_RPM = args.client_rpm
+    config.OPENAI_TPM = args.client_tpm
+    config.OPENAI_MAX_CONCURRENCY = args.concurrency
+    config.OPENAI_BACKOFF_BASE = 0.2
+    config.OPENAI_BACKOFF_MAX = 5
+
+    from openai_analyzer import analyze_with_openai
+    from ai_client import get_ai_executor, shutdown_ai_executor
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'filing.pdf')
+        generate_filing(path, MIN_PAGES)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            results = list(pool.map(lambda _: analyze_with_openai(path, 'sk-mock', use_cache=False), range(args.filings)))
+        elapsed = time.perf_counter() - start
+
+    client_stats = dict(get_ai_executor().stats)
+    shutdown_ai_executor()
+    server.stop()
+
+    ok = sum(1 for r in results if 'error' not in r)
+    errors = sorted({r['error'] for r in results if 'error' in r})
+    print(f"Filings      : {ok}/{args.filings} succeeded in {elapsed:.2f}s ({args.filings / elapsed:.1f}/s)")
+    print(f"Client       : {json.dumps(client_stats)}")
+    print(f"Server       : {json.dumps(server.stats)}")
+    print(f"Peak req/min : {server.max_per_minute()} accepted (client budget {args.client_rpm}, server limit {args.server_rpm})")
+    for e in errors[:5]:
+        print(f"  error: {e}")
+    return 0 if ok == args.filings else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+"""
+AI input comparison: table text from the text layer against page images, per filing.
+
+Each filing goes through analyze_with_openai with ai_input='auto' and 'vision' against the local
+mock server (render and response caches disabled). Reported per mode: which input was sent, request
+payload size, prompt tokens as billed by the mock (images by their pixel size) and wall time.
+Without a PDF argument three synthetic filings from benchmarks.filings are used: a standalone one
+(one results table), a consolidated one (two statements and segment information) and a scanned copy
+of the first (image-only pages), which must still go to vision under 'auto'.
+
+Usage:
+    python -m benchmarks.ai_input [filing.pdf | dir] ... [--latency 0.0] [--repeat 3]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from benchmarks.mock_openai import MockOpenAIServer  # noqa: E402
+from benchmarks.filings import MIN_PAGES, corpus, generate_filing  # noqa: E402
+
+# gpt-4o list prices, USD per million tokens
+INPUT_PRICE = 2.50
+OUTPUT_PRICE = 10.00
+
+def scanned_copy(src, dest, dpi=150):
+    """Writes an image-only copy of `src`: every page replaced by its own raster, no text layer."""
+    import fitz  # PyMuPDF
+    with fitz.open(src) as doc, fitz.open() as out:
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi)
+            out.new_page(width=page.rect.width, height=page.rect.height).insert_image(page.rect, pixmap=pix)
+        out.save(dest)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='*', help="Filings or directories (default: generate one)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Mock model latency in seconds")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    server = MockOpenAIServer(rpm=100_000, latency=args.latency)
+    config.OPENAI_BASE_URL = server.start()
+    config.OPENAI_RPM = config.OPENAI_TPM = 10_000_000
+    config.RENDER_CACHE_DIR = ''
+    from openai_analyzer import analyze_with_openai
+    from ai_client import shutdown_ai_executor
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = corpus(args.pdfs)
+        if not files:
+            files = [os.path.join(tmp, name) for name in ('filing.pdf', 'filing_consolidated.pdf', 'filing_scanned.pdf')]
+            generate_filing(files[0], MIN_PAGES, layout='standalone')
+            generate_filing(files[1], MIN_PAGES)
+            scanned_copy(files[0], files[2])
+
+        print(f"{'file':<24} {'mode':<7} {'sent':<7} {'prompt tok':>10} {'cost $':>8} {'ms':>8}")
+        for path in files:
+            vision_tokens = None
+            for mode in ('vision', 'auto'):
+                times, tokens, sent = [], [], None
+                for _ in range(args.repeat):
+                    before = server.stats['prompt_tokens']
+                    start = time.perf_counter()
+                    data = analyze_with_openai(path, 'sk-mock', ai_input=mode, use_cache=False)
+                    times.append((time.perf_counter() - start) * 1000)
+                    tokens.append(server.stats['prompt_tokens'] - before)
+                    sent = data.get('ai_input', data.get('error'))
+                cost = tokens[-1] * INPUT_PRICE / 1e6 + 250 * OUTPUT_PRICE / 1e6
+                vision_tokens = vision_tokens or tokens[-1]
+                saved = f"  ({100 * (1 - tokens[-1] / vision_tokens):.0f}% fewer tokens)" if mode == 'auto' else ""
+                print(f"{os.path.basename(path)[:24]:<24} {mode:<7} {sent:<7} {tokens[-1]:>10} {cost:>8.4f} "
+                      f"{statistics.median(times):>8.1f}{saved}")
+
+    shutdown_ai_executor()
+    server.stop()
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
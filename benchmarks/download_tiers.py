@@ -0,0 +1,106 @@
+"""
+Local HTTP fixture for the tiered downloader in browser_utils.
+
+Serves one route per tier case and reports which tier served each URL:
+    /direct.pdf        application/pdf                  -> http
+    /octet.pdf         octet-stream with %PDF bytes     -> http
+    /forbidden.pdf     403 Forbidden                    -> browser
+    /interstitial.pdf  HTML page instead of the PDF     -> browser
+    /cookie-gate.pdf   sets a cookie, PDF behind it     -> browser (direct PDF response, cookie re-fetch)
+    /attachment-gate.pdf  same, served as an attachment -> browser (download event)
+
+Usage:
+    python -m benchmarks.download_tiers [--with-browser]
+
+Without --with-browser only the HTTP fast path is exercised, and browser cases pass when the
+fast path declines them (no Chromium needed). Every served case also checks the stored bytes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import browser_utils  # noqa: E402
+from config import config  # noqa: E402
+
+PDF_BYTES = b"%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n" + b"0" * 256 * 1024
+
+ROUTES = {
+    '/direct.pdf': (200, 'application/pdf', PDF_BYTES, 'http'),
+    '/octet.pdf': (200, 'application/octet-stream', PDF_BYTES, 'http'),
+    '/forbidden.pdf': (403, 'text/html', b"<html>Forbidden</html>", 'browser'),
+    '/interstitial.pdf': (200, 'text/html', b"<html><script>location='/direct.pdf'</script></html>", 'browser'),
+    '/cookie-gate.pdf': (200, 'text/html', b"<html><script>location='/gated.pdf'</script></html>", 'browser'),
+    '/attachment-gate.pdf': (200, 'text/html', b"<html><script>location='/gated-attachment.pdf'</script></html>", 'browser'),
+}
+# PDFs only served with the cookie set by the *-gate pages (403 without it), with their extra headers
+GATED = {
+    '/gated.pdf': {},
+    '/gated-attachment.pdf': {'Content-Disposition': 'attachment; filename="gated.pdf"'},
+}
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        headers = {}
+        if self.path in GATED:
+            allowed = 'seen=1' in self.headers.get('Cookie', '')
+            status, ctype, body = (200, 'application/pdf', PDF_BYTES) if allowed else (403, 'text/html', b"<html>Forbidden</html>")
+            if allowed: headers = GATED[self.path]
+        else:
+            status, ctype, body, _ = ROUTES.get(self.path, (404, 'text/plain', b"not found", None))
+            if self.path.endswith('-gate.pdf'): headers = {'Set-Cookie': 'seen=1; Path=/'}
+        self.send_response(status)
+        self.send_header('Content-Type', ctype)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_fixture_server():
+    """Starts the fixture on a free localhost port; returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--with-browser', action='store_true', help="Also run the Playwright fallback tier")
+    args = parser.parse_args(argv)
+
+    server, base = start_fixture_server()
+    failures = 0
+    with tempfile.TemporaryDirectory() as out:
+        # Keep fixture downloads out of the real PDF store
+        config.PDF_STORE_DIR = out
+        for route, (_, _, _, expected) in ROUTES.items():
+            url = base + route
+            start = time.perf_counter()
+            if args.with_browser:
+                path, tier = browser_utils.fetch_pdf(url)
+            else:
+                stored = browser_utils._download_with_http(url)
+                path, tier = (stored[0], 'http') if stored else (None, 'browser')
+            ms = (time.perf_counter() - start) * 1000
+            ok = tier == expected
+            if path:
+                with open(path, 'rb') as f:
+                    ok = ok and f.read() == PDF_BYTES
+            failures += not ok
+            print(f"{'PASS' if ok else 'FAIL'}  {route:<20} tier={tier:<8} expected={expected:<8} {ms:7.1f} ms")
+    server.shutdown()
+    print(browser_utils.get_download_stats())
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,272 @@
+"""
+Extraction benchmark suite: LocalAnalyzer stage timings, latency, throughput, peak memory and accuracy
+over a corpus of synthetic filings (see benchmarks.filings), saved as JSON for regression comparison.
+
+Each filing runs in a fresh spawned process so its peak RSS is its own. Pages are read in-process
+(page_workers=1) so every stage is timed:
+    open      PDF open plus page text/word extraction (the text backend)
+    scoring   score_page over candidate pages
+    rows      get_rows
+    matching  parse_val and label matching (page_matches) plus merging into the results (apply_matches)
+    post      everything after the page scan: derived figures, identifiers, analyze_results
+
+Accuracy is the share of table cells equal to the generator's figures; `digest` hashes the whole
+result so any change in extracted output shows up in a comparison even where accuracy does not move.
+
+Usage:
+    python -m benchmarks.extraction [--pages 5,50,200] [--repeat 5] [--backend fitz] [--out run.json]
+    python -m benchmarks.extraction --compare baseline.json [--threshold 0.1] [--out run.json]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.filings import LAYOUTS, UNITS, corpus_specs, generate_filing  # noqa: E402
+
+STAGES = ('open', 'scoring', 'rows', 'matching', 'post')
+IDENTIFIERS = ('result_type', 'company_id', 'company_code', 'quarter', 'year')
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the resource module is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def percentile(values, q):
+    """Nearest-rank percentile of a small sample."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def timed_analyzer(pdf_path, backend):
+    """A LocalAnalyzer whose stage methods add their wall time to analyzer.stage_times."""
+    from analyzer import LocalAnalyzer
+    from page_cache import PageTextCache
+
+    class TimedPages(PageTextCache):
+        def __init__(self, *args, times, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.times = times
+
+        def _timed(self, fn, *args):
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self.times['open'] += time.perf_counter() - start
+
+        def __len__(self): return self._timed(super().__len__)
+        def text(self, idx): return self._timed(super().text, idx)
+        def words(self, idx): return self._timed(super().words, idx)
+
+    class TimedAnalyzer(LocalAnalyzer):
+        def __init__(self, *args, stage_times, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.stage_times = stage_times
+            self.scan_end = None
+
+        def _add(self, stage, start):
+            self.stage_times[stage] += time.perf_counter() - start
+
+        def score_page(self, text):
+            start = time.perf_counter()
+            try: return super().score_page(text)
+            finally: self._add('scoring', start)
+
+        def get_rows(self, words, sep=""):
+            start = time.perf_counter()
+            try: return super().get_rows(words, sep)
+            finally: self._add('rows', start)
+
+        def page_matches(self, text, words, global_scale):
+            start, rows_before = time.perf_counter(), self.stage_times['rows']
+            try: return super().page_matches(text, words, global_scale)
+            finally:
+                # get_rows runs inside page_matches; count it once, as rows
+                self.stage_times['matching'] += time.perf_counter() - start - (self.stage_times['rows'] - rows_before)
+
+        def apply_matches(self, *args):
+            start = time.perf_counter()
+            try: return super().apply_matches(*args)
+            finally: self._add('matching', start)
+
+        def scan_serial(self, *args):
+            try: return super().scan_serial(*args)
+            finally: self.scan_end = (time.perf_counter(), self.stage_times['open'])
+
+    times = dict.fromkeys(STAGES, 0.0)
+    pages = TimedPages(pdf_path, backend=backend, times=times)
+    return TimedAnalyzer(pdf_path, pages=pages, page_workers=1, stage_times=times)
+
+def run_once(pdf_path, backend):
+    """Analyzes the filing once. Returns (result, seconds, stage seconds)."""
+    analyzer = timed_analyzer(pdf_path, backend)
+    start = time.perf_counter()
+    try:
+        result = analyzer.analyze()
+    finally:
+        analyzer.pages.close()
+    end = time.perf_counter()
+    stages = analyzer.stage_times
+    scan_end, open_at_scan_end = analyzer.scan_end
+    # Text read after the scan (identifier header, corporate actions) stays under open
+    stages['post'] = end - scan_end - (stages['open'] - open_at_scan_end)
+    return result, end - start, stages
+
+def accuracy(result, expected):
+    """(matching cells, total cells, [mismatch descriptions]) of the extracted result against the generator's."""
+    misses = [f"{k}: {result.get(k)!r} != {expected[k]!r}" for k in IDENTIFIERS if result.get(k) != expected[k]]
+    cells = 0
+    for got, want in zip(result.get('table_data') or [{}] * 4, expected['table_data']):
+        for k, v in want.items():
+            if k == 'period': continue
+            cells += 1
+            if got.get(k) != v: misses.append(f"{want['period']} {k}: {got.get(k)!r} != {v!r}")
+    total = cells + len(IDENTIFIERS)
+    return total - len(misses), total, misses
+
+def run_case(spec, path, expected, backend, repeat, warmup):
+    """Pool task: benchmarks one generated filing in this (fresh) process."""
+    logging.disable(logging.CRITICAL)
+    import analyzer  # noqa: F401 - library import cost is not part of any run
+    rss_base = peak_rss_mb()
+    for _ in range(warmup):
+        run_once(path, backend)
+    latencies, stage_runs, result = [], [], None
+    for _ in range(repeat):
+        result, elapsed, stages = run_once(path, backend)
+        latencies.append(elapsed)
+        stage_runs.append(stages)
+
+    result.pop('debug_logs', None)
+    correct, total, misses = accuracy(result, expected)
+    p50 = percentile(latencies, 50)
+    return {
+        **spec, 'bytes': os.path.getsize(path), 'runs': repeat,
+        'latency_s': {'p50': round(p50, 4), 'p95': round(percentile(latencies, 95), 4),
+                      'min': round(min(latencies), 4), 'max': round(max(latencies), 4)},
+        'throughput': {'pages_per_s': round(spec['pages'] / p50, 1), 'filings_per_s': round(1 / p50, 2)},
+        'stages_s': {s: round(percentile([r[s] for r in stage_runs], 50), 4) for s in STAGES},
+        'rss_mb': {'base': rss_base, 'peak': peak_rss_mb()},
+        'accuracy': {'correct': correct, 'total': total, 'mismatches': misses[:10]},
+        'digest': hashlib.sha256(json.dumps(result, sort_keys=True, default=str).encode()).hexdigest()[:16],
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_suite(specs, backend=None, repeat=5, warmup=1, log=print):
+    """Benchmarks every spec, each in its own spawned process. Returns the JSON-ready run record."""
+    from config import config
+    backend = backend or config.TEXT_BACKEND
+    cases = []
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        for spec in specs:
+            path = os.path.join(tmp, f"{spec['name']}.pdf")
+            expected = generate_filing(path, spec['pages'], spec['layout'], spec['unit'], spec['seed'])
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                case = pool.submit(run_case, spec, path, expected, backend, repeat, warmup).result()
+            cases.append(case)
+            log(format_case(case))
+    return {
+        'meta': {'created': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'commit': git_commit(),
+                 'backend': backend, 'repeat': repeat, 'warmup': warmup, 'python': platform.python_version(),
+                 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'cases': cases,
+    }
+
+def format_header():
+    stages = " ".join(f"{s:>8}" for s in STAGES)
+    return f"{'case':<28} {'p50 s':>7} {'p95 s':>7} {'pages/s':>8} {stages} {'RSS MB':>7} {'accuracy':>9}"
+
+def format_case(c):
+    stages = " ".join(f"{c['stages_s'][s] * 1000:>6.1f}ms" for s in STAGES)
+    rss = c['rss_mb']['peak']
+    return (f"{c['name']:<28} {c['latency_s']['p50']:>7.3f} {c['latency_s']['p95']:>7.3f} "
+            f"{c['throughput']['pages_per_s']:>8.1f} {stages} {rss if rss is not None else 'n/a':>7} "
+            f"{c['accuracy']['correct']:>4}/{c['accuracy']['total']:<4}")
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Regressions of `current` against `baseline`, matched by case name: p50 latency or peak RSS up by more
+    than `threshold`, lower accuracy, or a changed result digest. Returns a list of messages.
+    """
+    base = {c['name']: c for c in baseline['cases']}
+    problems = []
+    for c in current['cases']:
+        b = base.get(c['name'])
+        if b is None: continue
+        name = c['name']
+        old, new = b['latency_s']['p50'], c['latency_s']['p50']
+        if new > old * (1 + threshold):
+            problems.append(f"{name}: p50 {old:.3f}s -> {new:.3f}s (+{100 * (new / old - 1):.0f}%)")
+        old, new = b['rss_mb']['peak'], c['rss_mb']['peak']
+        if old and new and new > old * (1 + threshold):
+            problems.append(f"{name}: peak RSS {old} -> {new} MB")
+        if c['accuracy']['correct'] < b['accuracy']['correct']:
+            problems.append(f"{name}: accuracy {b['accuracy']['correct']} -> {c['accuracy']['correct']}/{c['accuracy']['total']}")
+        if c['digest'] != b['digest']:
+            problems.append(f"{name}: extracted output changed (digest {b['digest']} -> {c['digest']})")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', default="5,50,200", help="Comma-separated page counts")
+    parser.add_argument('--layouts', default=",".join(LAYOUTS))
+    parser.add_argument('--units', default=",".join(UNITS))
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per filing")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed runs per filing")
+    parser.add_argument('--backend', default=None, help="Text backend (default: config)")
+    parser.add_argument('--out', help="Write the run record to this JSON file")
+    parser.add_argument('--compare', help="Baseline run JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed latency/RSS increase over the baseline")
+    args = parser.parse_args(argv)
+
+    specs = corpus_specs([int(n) for n in args.pages.split(',')], args.layouts.split(','), args.units.split(','))
+    print(format_header())
+    run = run_suite(specs, args.backend, args.repeat, args.warmup)
+    total_pages = sum(c['pages'] for c in run['cases'])
+    total_time = sum(c['latency_s']['p50'] for c in run['cases'])
+    print(f"Backend: {run['meta']['backend']} | {len(run['cases'])} filings, {total_pages} pages | "
+          f"{total_pages / total_time:.1f} pages/s overall (p50)")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Saved run to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(baseline, run, args.threshold)
+        print(f"Compared with {args.compare} (commit {baseline['meta'].get('commit')}, backend {baseline['meta'].get('backend')})")
+        for p in problems:
+            print(f"  REGRESSION {p}")
+        if not problems:
+            print("  No regressions")
+        return 1 if problems else 0
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,266 @@
+"""
+Synthetic SEBI-style quarterly results filings with known figures, for benchmarks and regression runs.
+
+A filing is a text-layer PDF shaped like a Regulation 33 submission for the quarter ended 30.06.2025:
+a cover letter with scrip code and symbol, filler pages (limited review report, notes, annexures),
+the standalone statement and, for the consolidated layout, a consolidated statement with different
+figures followed by segment information. Statements sit in the middle of the document so that page
+count affects the scan (or last, so no early exit can skip pages). Figures are in Lakhs (Indian digit
+grouping) or Crores.
+
+generate_filing() returns the result LocalAnalyzer should extract, in Crores as the analyzer reports it.
+corpus() resolves benchmark command-line sources (files and directories) to PDF paths; every benchmark
+generates its synthetic filings here.
+
+Usage:
+    python -m benchmarks.filings out_dir [--pages 5,50,200] [--layouts consolidated,standalone] [--units lakhs,crores]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+from pathlib import Path
+
+LAYOUTS = ('consolidated', 'standalone')
+UNITS = ('lakhs', 'crores')
+POSITIONS = ('middle', 'end')
+PERIOD_HEADS = ["30.06.2025", "31.03.2025", "30.06.2024", "31.03.2025"]
+PERIOD_KINDS = ["Unaudited", "Audited", "Unaudited", "Audited"]
+PERIODS = ["Current", "Prev Qtr", "YoY Qtr", "Year Ended"]
+MIN_PAGES = 5
+
+LETTER = [
+    "The Board of Directors of the Company at its meeting held today, i.e. August 08, 2025, inter alia,",
+    "considered and approved the Unaudited Financial Results ({title}) for the quarter",
+    "ended June 30, 2025, together with the Limited Review Report issued by the Statutory Auditors.",
+    "The meeting of the Board commenced at 11:00 a.m. and concluded at 1:30 p.m.",
+    "Kindly take the same on record.",
+]
+
+REVIEW = [
+    "We have reviewed the accompanying statement of unaudited financial results of the Company for the",
+    "quarter ended June 30, 2025, being submitted pursuant to the requirement of Regulation 33 of the SEBI",
+    "(Listing Obligations and Disclosure Requirements) Regulations, 2015, as amended.",
+    "This statement, which is the responsibility of the Company's Management and approved by the Board of",
+    "Directors, has been prepared in accordance with the recognition and measurement principles laid down",
+    "in Indian Accounting Standard 34 and other accounting principles generally accepted in India.",
+    "A review of interim financial information consists of making inquiries, primarily of persons",
+    "responsible for financial and accounting matters, and applying analytical and other review procedures.",
+    "Based on our review conducted as above, nothing has come to our attention that causes us to believe",
+    "that the accompanying statement has not been prepared in accordance with applicable standards.",
+]
+
+NOTES = [
+    "Notes:",
+    "1. The above results have been reviewed by the Audit Committee and approved by the Board of Directors.",
+    "2. The statutory auditors have carried out a limited review of the results for the current quarter.",
+    "3. Figures of the previous periods have been regrouped wherever necessary to conform to this presentation.",
+    "4. The Company has adopted Indian Accounting Standards notified under the Companies Act, 2013.",
+]
+
+def indian_format(v):
+    """1234567.5 -> '12,34,567.50' (lakh/crore digit grouping)."""
+    sign = "-" if v < 0 else ""
+    whole, frac = f"{abs(v):.2f}".split(".")
+    head, tail = whole[:-3], whole[-3:]
+    groups = []
+    while len(head) > 2:
+        groups.insert(0, head[-2:])
+        head = head[:-2]
+    if head: groups.insert(0, head)
+    return sign + ",".join(groups + [tail]) + "." + frac
+
+def statement_figures(rng, scale):
+    """Per-period line items of one statement, in the filing's unit."""
+    periods = []
+    base = rng.uniform(50, 5000) * scale
+    for growth in (1.0, rng.uniform(0.85, 1.1), rng.uniform(0.75, 1.05), None):
+        if growth is None:
+            # Year ended: roughly four quarters
+            growth = rng.uniform(3.6, 4.2)
+        revenue = round(base * growth, 2)
+        other_income = round(revenue * rng.uniform(0.005, 0.04), 2)
+        finance = round(revenue * rng.uniform(0.005, 0.03), 2)
+        dep = round(revenue * rng.uniform(0.01, 0.05), 2)
+        materials = round(revenue * rng.uniform(0.4, 0.6), 2)
+        employee = round(revenue * rng.uniform(0.05, 0.15), 2)
+        others = round(revenue * rng.uniform(0.05, 0.15), 2)
+        total_expenses = round(materials + employee + finance + dep + others, 2)
+        pbt = round(revenue + other_income - total_expenses, 2)
+        tax = round(pbt * 0.252, 2)
+        net_profit = round(pbt - tax, 2)
+        periods.append({
+            "revenue": revenue, "other_income": other_income, "materials": materials, "employee": employee,
+            "finance": finance, "dep": dep, "others": others, "total_expenses": total_expenses, "pbt": pbt,
+            "tax": tax, "net_profit": net_profit, "oci": round(rng.uniform(-0.5, 0.5) * scale, 2),
+            "eps": round(net_profit / scale / rng.uniform(5, 50), 2),
+        })
+    return periods
+
+def statement_rows(f):
+    """
+    (label, per-period values) rows of a Schedule III results statement; None values render as '-'.
+    Serial numbers are Roman, as in most filings (a leading digit would be read as the row's first figure).
+    """
+    col = lambda k: [p[k] for p in f]
+    return [
+        ("I Revenue from operations", col("revenue")),
+        ("II Other income", col("other_income")),
+        ("III Total income (I+II)", [p["revenue"] + p["other_income"] for p in f]),
+        ("IV Expenses", None),
+        ("(a) Cost of materials consumed", col("materials")),
+        ("(b) Employee benefits expense", col("employee")),
+        ("(c) Finance costs", col("finance")),
+        ("(d) Depreciation and amortisation expense", col("dep")),
+        ("(e) Other expenses", col("others")),
+        ("Total expenses (IV)", col("total_expenses")),
+        ("V Profit before exceptional items and tax (III-IV)", col("pbt")),
+        ("VI Exceptional items", [None] * 4),
+        ("VII Profit before tax (V-VI)", col("pbt")),
+        ("VIII Tax expense", col("tax")),
+        ("IX Net Profit for the period (VII-VIII)", col("net_profit")),
+        ("X Other comprehensive income (net of tax)", col("oci")),
+        ("XI Total comprehensive income for the period (IX+X)", [p["net_profit"] + p["oci"] for p in f]),
+        ("XII Earnings per share (not annualised)", None),
+        ("(a) Basic", col("eps")),
+        ("(b) Diluted", col("eps")),
+    ]
+
+def expected_result(f, unit):
+    """Table rows as LocalAnalyzer reports them: Crores, with operating profit and OPM derived the same way."""
+    divisor = 100.0 if unit == 'lakhs' else 1.0
+    table = []
+    for period, p in zip(PERIODS, f):
+        row = {k: round(p[k] / divisor, 2) for k in ("revenue", "other_income", "total_expenses", "pbt", "net_profit")}
+        row["eps"] = p["eps"]
+        dep, fin = round(p["dep"] / divisor, 2), round(p["finance"] / divisor, 2)
+        row["operating_profit"] = round(row["pbt"] + dep + fin - row["other_income"], 2)
+        row["opm"] = round(row["operating_profit"] / row["revenue"] * 100, 2)
+        row["period"] = period
+        table.append(row)
+    return table
+
+def _text_page(doc, title, lines, fontsize=9):
+    page = doc.new_page()
+    page.insert_text((50, 50), title, fontsize=11)
+    for i, line in enumerate(lines):
+        page.insert_text((50, 80 + i * 14), line, fontsize=fontsize)
+    return page
+
+def _statement_page(doc, company, kind, unit, figures):
+    page = doc.new_page()
+    page.insert_text((50, 40), company, fontsize=12)
+    page.insert_text((50, 58), f"Statement of {kind} Unaudited Financial Results for the quarter ended 30.06.2025", fontsize=9)
+    page.insert_text((450, 72), f"(Rs. in {unit.title()})", fontsize=8)
+    page.insert_text((50, 90), "Particulars", fontsize=8)
+    for j, (head, audit) in enumerate(zip(PERIOD_HEADS, PERIOD_KINDS)):
+        page.insert_text((290 + j * 72, 84), "Quarter ended" if j < 3 else "Year ended", fontsize=7)
+        page.insert_text((290 + j * 72, 94), head, fontsize=7)
+        page.insert_text((290 + j * 72, 104), f"({audit})", fontsize=7)
+    fmt = indian_format if unit == 'lakhs' else (lambda v: f"{v:,.2f}")
+    for r, (label, values) in enumerate(statement_rows(figures)):
+        y = 124 + r * 16
+        page.insert_text((50, y), label, fontsize=8)
+        for j, v in enumerate(values or []):
+            page.insert_text((290 + j * 72, y), "-" if v is None else fmt(v), fontsize=8)
+    for i, line in enumerate(NOTES):
+        page.insert_text((50, 470 + i * 12), line, fontsize=7)
+    return page
+
+def _filler_page(doc, i):
+    heading = ("Independent Auditor's Review Report", "Notes to Accounts", "Annexure")[i % 3]
+    return _text_page(doc, f"{heading} ({i + 1})", REVIEW + NOTES if i % 2 else REVIEW)
+
+def _segment_page(doc, rng, unit, f):
+    lines = [f"Consolidated Segment wise Revenue, Results, Assets and Liabilities (Rs. in {unit.title()})",
+             "Segment Revenue"]
+    fmt = indian_format if unit == 'lakhs' else (lambda v: f"{v:,.2f}")
+    split = rng.uniform(0.3, 0.7)
+    for name, share in (("(a) Engineering", split), ("(b) Services", 1 - split)):
+        lines.append(f"{name}   " + "   ".join(fmt(p["revenue"] * share) for p in f))
+    lines.append("Segment Results")
+    for name, share in (("(a) Engineering", split), ("(b) Services", 1 - split)):
+        lines.append(f"{name}   " + "   ".join(fmt((p["pbt"] + p["finance"]) * share) for p in f))
+    return _text_page(doc, "Segment Information", lines)
+
+def generate_filing(path, pages=20, layout='consolidated', unit='lakhs', seed=0, position='middle'):
+    """
+    Writes a synthetic results filing of `pages` pages (at least MIN_PAGES) with the statements in the
+    `position` of the document and returns what the analyzer should find:
+    {'result_type', 'company_id', 'company_code', 'quarter', 'year', 'table_data'}.
+    """
+    import fitz  # PyMuPDF
+    if layout not in LAYOUTS: raise ValueError(f"layout must be one of {LAYOUTS}")
+    if unit not in UNITS: raise ValueError(f"unit must be one of {UNITS}")
+    if position not in POSITIONS: raise ValueError(f"position must be one of {POSITIONS}")
+    pages = max(MIN_PAGES, pages)
+    rng = random.Random(seed)
+    scale = 100.0 if unit == 'lakhs' else 1.0
+    scrip = str(500000 + rng.randrange(100000))
+    symbol = "SYN" + "".join(rng.choice("ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(4))
+    company = f"{symbol} INDUSTRIES LIMITED"
+    standalone = statement_figures(rng, scale)
+    consolidated = statement_figures(rng, scale) if layout == 'consolidated' else None
+
+    doc = fitz.open()
+    title = "Standalone and Consolidated" if consolidated else "Standalone"
+    _text_page(doc, company, [
+        "To, The Listing Department, BSE Limited / National Stock Exchange of India Limited",
+        f"Scrip code: {scrip}  NSE Symbol : {symbol}",
+        f"Sub: Outcome of Board Meeting - {title} Financial Results for the quarter ended June 30, 2025",
+        "",
+    ] + [line.format(title=title) for line in LETTER])
+
+    # Statement pages sit in the middle, with filler split around them, or after all of it
+    body = [lambda: _statement_page(doc, company, "Standalone", unit, standalone)]
+    if consolidated:
+        body += [lambda: _statement_page(doc, company, "Consolidated", unit, consolidated),
+                 lambda: _segment_page(doc, rng, unit, consolidated)]
+    filler = [lambda i=i: _filler_page(doc, i) for i in range(pages - 1 - len(body))]
+    middle = len(filler) // 2 if position == 'middle' else len(filler)
+    for add_page in filler[:middle] + body + filler[middle:]:
+        add_page()
+    doc.save(path)
+    doc.close()
+
+    return {
+        "result_type": "Consolidated" if consolidated else "Standalone",
+        "company_id": scrip, "company_code": symbol, "quarter": "Q1", "year": 2025,
+        "table_data": expected_result(consolidated or standalone, unit),
+    }
+
+def corpus_specs(page_counts=(5, 50, 200), layouts=LAYOUTS, units=UNITS):
+    """Filing specs covering every layout x unit x page count: dicts of name, pages, layout, unit, seed."""
+    return [{"name": f"{layout}-{unit}-{n}p", "pages": n, "layout": layout, "unit": unit, "seed": i}
+            for i, (layout, unit, n) in enumerate(itertools.product(layouts, units, page_counts))]
+
+def corpus(sources):
+    """PDF paths from command-line sources: files as given, directories searched recursively for *.pdf."""
+    files = []
+    for src in sources:
+        if os.path.isdir(src):
+            files += [str(p) for p in sorted(Path(src).rglob('*')) if p.suffix.lower() == '.pdf']
+        else:
+            files.append(src)
+    return files
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--pages', default="5,50,200", help="Comma-separated page counts")
+    parser.add_argument('--layouts', default=",".join(LAYOUTS))
+    parser.add_argument('--units', default=",".join(UNITS))
+    args = parser.parse_args(argv)
+    os.makedirs(args.out_dir, exist_ok=True)
+    specs = corpus_specs([int(n) for n in args.pages.split(',')], args.layouts.split(','), args.units.split(','))
+    for spec in specs:
+        path = os.path.join(args.out_dir, f"{spec['name']}.pdf")
+        expected = generate_filing(path, spec['pages'], spec['layout'], spec['unit'], spec['seed'])
+        with open(path[:-4] + ".expected.json", 'w') as f:
+            json.dump(expected, f, indent=2)
+        print(f"Wrote {path}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
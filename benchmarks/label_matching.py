@@ -0,0 +1,82 @@
+"""
+Row label matching: compiled LabelMatcher vs the original per-row metric/keyword loop.
+
+Checks that both pick the same metric for every label, then times them.
+
+Usage:
+    python -m benchmarks.label_matching [--rows 20000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import LABEL_MATCHER, METRIC_KEYWORDS, normalize  # noqa: E402
+
+SAMPLE_LABELS = [
+    "Revenue from operations", "Income from Operations", "Net Sales", "Other Income", "Total Income",
+    "Total Revenue", "Cost of materials consumed", "Purchases of stock-in-trade", "Employee benefits expense",
+    "Finance costs", "Interest cost", "Interest income", "Depreciation and amortisation expense",
+    "Other expenses", "Total expenses", "Total Expenditure", "Profit before exceptional items and tax",
+    "Exceptional items", "Profit before tax", "Profit / (Loss) before tax", "Current tax", "Deferred tax",
+    "Net Profit for the period", "Profit for the period", "Profit for the year", "Profit after tax",
+    "Other comprehensive income", "Total comprehensive income for the period", "Share of profit of equity accounted investees",
+    "Non-controlling interest / minority interest", "Paid-up equity share capital (Face value Rs 10)",
+    "Earnings per share (of Rs 10 each)", "Basic EPS", "Basic earnings per share", "Diluted", "Basic",
+    "Notes:", "The above results were reviewed by the Audit Committee", "Particulars", "Quarter ended",
+]
+
+def legacy_match(lbl):
+    """The original LocalAnalyzer loop, kept here as the parity reference."""
+    for k, kws in METRIC_KEYWORDS.items():
+        for kw, rk in kws:
+            if normalize(kw) in lbl:
+                if k == "Int" and "income" in lbl: continue
+                if k == "net_profit" and any(x in lbl for x in ["comprehensive", "minority", "equity"]): continue
+                return k
+    return None
+
+def build_corpus(n, seed=7):
+    """Realistic labels plus random keyword mash-ups that stress overlapping and excluded matches."""
+    rng = random.Random(seed)
+    fragments = [kw for kws in METRIC_KEYWORDS.values() for kw, _ in kws] + ["income", "comprehensive", "equity", "minority", "xyz", "total"]
+    corpus = []
+    for i in range(n):
+        if i % 3:
+            corpus.append(normalize(rng.choice(SAMPLE_LABELS)))
+        else:
+            corpus.append("".join(rng.choice(fragments)[rng.randint(0, 3):] for _ in range(rng.randint(1, 4))))
+    return corpus
+
+def time_it(fn, corpus, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for lbl in corpus: fn(lbl)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.rows)
+    mismatches = [lbl for lbl in corpus if legacy_match(lbl) != LABEL_MATCHER.match(lbl)[0]]
+    print(f"Parity: {len(corpus) - len(mismatches)}/{len(corpus)} labels identical")
+    for lbl in mismatches[:10]:
+        print(f"  MISMATCH {lbl!r}: legacy={legacy_match(lbl)} matcher={LABEL_MATCHER.match(lbl)[0]}")
+
+    legacy = time_it(legacy_match, corpus, args.repeat)
+    compiled = time_it(LABEL_MATCHER.match, corpus, args.repeat)
+    print(f"Legacy loop : {legacy * 1e6 / len(corpus):7.2f} us/row")
+    print(f"LabelMatcher: {compiled * 1e6 / len(corpus):7.2f} us/row")
+    print(f"Speedup     : {legacy / compiled:.1f}x")
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
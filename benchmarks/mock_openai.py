@@ -0,0 +1,180 @@
+"""
+Local mock of the OpenAI chat completions API for exercising the AI layer without a real key.
+
+Answers POST /v1/chat/completions with a canned results JSON after a configurable latency.
+It enforces its own requests/min window, returning 429 with Retry-After like the real API,
+and can inject random 429/500 errors.
+
+Usage:
+    python -m benchmarks.mock_openai [--port 8099] [--rpm 60] [--latency 0.5] [--error-rate 0.05]
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 python app.py
+"""
+import argparse
+import base64
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANALYSIS = {
+    "company_id": "500123", "company_code": "ACME", "quarter": "Q2", "year": 2025, "result_type": "Consolidated",
+    "table_data": [
+        {"period": p, "revenue": r, "other_income": 0.5, "total_expenses": r * 0.8, "operating_profit": r * 0.2,
+         "opm": 20.0, "pbt": r * 0.25, "net_profit": r * 0.19, "eps": r / 500}
+        for p, r in (("Current", 10.0), ("Prev Qtr", 9.0), ("YoY Qtr", 8.0), ("Year Ended", 36.0))
+    ],
+    "growth": {"revenue_qoq": 11.1, "revenue_yoy": 25.0},
+    "corporate_actions": {"dividend": "0", "capex": "0", "management_change": "No", "special_announcement": "Not mentioned"},
+    "observations": [],
+    "recommendation": {"verdict": "Not requested", "color": "gray", "reasons": []}
+}
+
+def vision_tokens(width, height):
+    """Image tokens for one `detail: high` image: 85 + 170 per 512 px tile after fitting to 2048 px and a 768 px short side."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def image_tokens(url):
+    """vision_tokens for a base64 data URL; 1105 (a full portrait page) when the image cannot be read."""
+    try:
+        from io import BytesIO
+        from PIL import Image
+        return vision_tokens(*Image.open(BytesIO(base64.b64decode(url.split(',', 1)[1]))).size)
+    except Exception:
+        return 1105
+
+class MockOpenAIServer:
+    """Threaded mock server; start() returns its base URL (http://127.0.0.1:<port>/v1)."""
+    def __init__(self, port=0, rpm=60, latency=0.2, error_rate=0.0, seed=None):
+        self.rpm = rpm
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'errors': 0, 'max_in_flight': 0, 'prompt_tokens': 0}
+        self.accepted = []  # monotonic timestamps of accepted requests
+        self._window = deque()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def max_per_minute(self):
+        """Largest number of accepted requests inside any 60s window."""
+        times = sorted(self.accepted)
+        best, lo = 0, 0
+        for hi, t in enumerate(times):
+            while t - times[lo] >= 60: lo += 1
+            best = max(best, hi - lo + 1)
+        return best
+
+    def _admit(self):
+        """Returns None to serve the request, or (status, retry_after) to reject it."""
+        with self._lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0] >= 60:
+                self._window.popleft()
+            if len(self._window) >= self.rpm:
+                self.stats['rate_limited'] += 1
+                return 429, 60 - (now - self._window[0])
+            roll = self.rng.random()
+            if roll < self.error_rate / 2:
+                self.stats['rate_limited'] += 1
+                return 429, 1
+            if roll < self.error_rate:
+                self.stats['errors'] += 1
+                return 500, None
+            self._window.append(now)
+            self.accepted.append(now)
+            self._in_flight += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self._in_flight)
+            return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self.path.endswith('/chat/completions'):
+                    return self._send(404, {'error': {'message': 'Unknown endpoint'}})
+                rejected = server._admit()
+                if rejected:
+                    status, retry_after = rejected
+                    headers = {'retry-after': f"{retry_after:.2f}"} if retry_after else {}
+                    code = 'rate_limit_exceeded' if status == 429 else 'server_error'
+                    return self._send(status, {'error': {'message': f'Mock {code}', 'type': code, 'code': code}}, headers)
+                try:
+                    time.sleep(server.latency)
+                    parts = [p for m in request.get('messages', []) for p in
+                             (m['content'] if isinstance(m['content'], list) else [{'type': 'text', 'text': m['content']}])]
+                    prompt_tokens = (sum(len(p.get('text', '')) for p in parts) // 4
+                                     + sum(image_tokens(p['image_url']['url']) for p in parts if p.get('type') == 'image_url'))
+                    content = json.dumps(CANNED_ANALYSIS)
+                    with server._lock:
+                        server.stats['ok'] += 1
+                        server.stats['prompt_tokens'] += prompt_tokens
+                    self._send(200, {
+                        'id': 'chatcmpl-mock', 'object': 'chat.completion', 'created': int(time.time()),
+                        'model': request.get('model', 'gpt-4o'),
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': content}}],
+                        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(content) // 4,
+                                  'total_tokens': prompt_tokens + len(content) // 4}
+                    })
+                finally:
+                    with server._lock: server._in_flight -= 1
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--rpm', type=int, default=60, help="Requests per minute before answering 429")
+    parser.add_argument('--latency', type=float, default=0.5, help="Seconds per successful response")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of random 429/500 responses")
+    args = parser.parse_args(argv)
+    server = MockOpenAIServer(args.port, args.rpm, args.latency, args.error_rate)
+    print(f"Mock OpenAI listening on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+"""
+Parallel page reading: LocalAnalyzer latency on one large filing as the page worker count grows.
+
+Without a PDF argument a synthetic consolidated filing is generated (benchmarks.filings) with the
+statements on its last pages, so early exit cannot cut the scan short.
+Every worker count must produce the same result as the in-process scan.
+
+Usage:
+    python -m benchmarks.page_parallel [filing.pdf] [--pages 150] [--workers 1,2,4,8] [--repeat 3]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import extract_financial_data, shutdown_page_pool  # noqa: E402
+from benchmarks.filings import generate_filing  # noqa: E402
+
+def run(path, workers, backend):
+    start = time.perf_counter()
+    data = extract_financial_data(path, page_workers=workers, text_backend=backend)
+    elapsed = time.perf_counter() - start
+    data.pop('debug_logs', None)
+    return json.dumps(data, sort_keys=True, default=str), elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdf', nargs='?', help="Filing to benchmark (default: generate one)")
+    parser.add_argument('--pages', type=int, default=150, help="Pages in the generated filing")
+    parser.add_argument('--workers', default=None, help="Comma-separated worker counts (default: 1,2,4,... up to CPU count)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backend', default=None, help="Text backend (default: config)")
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(',')]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= cpus: counts.append(counts[-1] * 2)
+        if counts[-1] != cpus: counts.append(cpus)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.pdf
+        if not path:
+            path = os.path.join(tmp, 'filing.pdf')
+            generate_filing(path, args.pages, position='end')
+        print(f"Filing: {path} | CPUs: {cpus} | repeat: {args.repeat}")
+
+        reference = None
+        rows = []
+        for w in counts:
+            run(path, w, args.backend)  # warm-up: starts the pool and loads the libraries in each worker
+            times = []
+            for _ in range(args.repeat):
+                out, elapsed = run(path, w, args.backend)
+                times.append(elapsed)
+                if reference is None: reference = out
+                if out != reference:
+                    print(f"MISMATCH with {w} workers")
+                    return 1
+            rows.append((w, statistics.median(times)))
+        shutdown_page_pool()
+
+    base = rows[0][1]
+    print(f"{'workers':>8s} {'p50 (s)':>9s} {'speedup':>8s} {'efficiency':>11s}")
+    for w, t in rows:
+        print(f"{w:8d} {t:9.3f} {base / t:7.2f}x {base / t / w:10.0%}")
+    print("All worker counts produced identical results")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+"""
+Recompute engine parity and speed: recompute.recompute_frame against analyze_results row by row.
+
+Generates stored-analysis records (raw_json from analyze_results with observations and verdicts,
+random figures including zero bases, losses and AI-style string values), then checks that the
+vectorized recompute reproduces every stored growth figure, observation and verdict (no row reported
+as changed) and times both. A small multi-quarter history checks the 'db' growth basis, and a few
+hand-made rows check that unidentified filings and non-rule verdicts are left alone.
+
+Usage:
+    python -m benchmarks.recompute [--rows 100000] [--seed 7]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import GROWTH_METRICS, analyze_results  # noqa: E402
+from recompute import frame_from_records, recompute_frame, changed_updates  # noqa: E402
+
+QUARTERS = ['Q1', 'Q2', 'Q3', 'Q4']
+
+def random_period(rng, name):
+    period = {'period': name}
+    for m in GROWTH_METRICS:
+        r = rng.random()
+        if r < 0.05: period[m] = 0.0
+        elif r < 0.15: period[m] = round(rng.uniform(-500, 0), 2)
+        else: period[m] = round(rng.uniform(0, 5000), 2)
+    if rng.random() < 0.02: period['eps'] = str(period['eps'])  # AI output sometimes quotes numbers
+    return period
+
+def generate_records(n, seed):
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        table = [random_period(rng, p) for p in ("Current", "Prev Qtr", "YoY Qtr", "Year Ended")]
+        numeric = [{k: (float(v) if k != 'period' else v) for k, v in p.items()} for p in table]
+        data = analyze_results(numeric, include_obs=True, include_rec=True)
+        data['table_data'] = table
+        data.update({'company_id': str(500000 + i // 8), 'quarter': QUARTERS[i % 4], 'year': 2020 + (i // 4) % 2})
+        records.append({'id': i + 1, 'company_id': data['company_id'], 'quarter': data['quarter'],
+                        'year': data['year'], 'raw_json': json.dumps(data)})
+    return records
+
+def check_db_basis():
+    """Three consecutive quarters plus the year-ago one for one company: growth must use the stored rows."""
+    def record(i, quarter, year, revenue):
+        period = {m: 1.0 for m in GROWTH_METRICS}
+        table = [dict(period, revenue=revenue), dict(period, revenue=1.0), dict(period, revenue=1.0)]
+        return {'id': i, 'company_id': '500001', 'quarter': quarter, 'year': year,
+                'raw_json': json.dumps({'table_data': table})}
+    # Calendar order: Q2 2024 (Sep 24), Q3 2024 (Dec 24), Q4 2025 (Mar 25), Q1 2025 (Jun 25), Q2 2025 (Sep 25)
+    records = [record(1, 'Q2', 2024, 100.0), record(2, 'Q3', 2024, 110.0), record(3, 'Q4', 2025, 120.0),
+               record(4, 'Q1', 2025, 150.0), record(5, 'Q2', 2025, 200.0)]
+    df, _ = frame_from_records(records)
+    out = recompute_frame(df, basis='db').set_index('id')
+    latest = out.loc[5]
+    assert latest['growth_revenue_qoq'] == round((200 - 150) / 150 * 100, 2), latest['growth_revenue_qoq']
+    assert latest['growth_revenue_yoy'] == 100.0, latest['growth_revenue_yoy']
+    # Q1 2025 follows Q4 2025 (March 2025); the oldest row has no stored base and keeps its own columns
+    assert out.loc[4, 'growth_revenue_qoq'] == 25.0, out.loc[4, 'growth_revenue_qoq']
+    assert out.loc[1, 'growth_revenue_qoq'] == round((100 - 1) / 1 * 100, 2)
+    return True
+
+def check_guards():
+    """Unidentified filings never serve as each other's base; AI and verdict-less rows keep their stored fields."""
+    def record(i, company, revenue, **stored):
+        period = {m: 1.0 for m in GROWTH_METRICS}
+        table = [dict(period, revenue=revenue), dict(period, revenue=revenue), dict(period, revenue=revenue)]
+        return {'id': i, 'company_id': company, 'quarter': 'Q1' if i % 2 else 'Q2', 'year': 2025,
+                'raw_json': json.dumps(dict(stored, table_data=table))}
+    records = [record(1, None, 50.0), record(2, None, 100.0),
+               record(3, '500001', 1.0, observations=["Strong order book"], recommendation={'verdict': 'BUY', 'reasons': []}),
+               record(4, '500002', 1.0)]
+    df, _ = frame_from_records(records)
+    out = recompute_frame(df, basis='db').set_index('id')
+    # Row 2 (Q2) follows row 1 (Q1) by period, but neither has a company: own columns give 0% QoQ
+    assert out.loc[2, 'growth_revenue_qoq'] == 0.0, out.loc[2, 'growth_revenue_qoq']
+    assert out.loc[3, 'observations'] is None and out.loc[3, 'recommendation'] is None
+    assert out.loc[4, 'observations'] is None and out.loc[4, 'recommendation'] is None
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    records = generate_records(args.rows, args.seed)
+
+    start = time.perf_counter()
+    df, skipped = frame_from_records(records)
+    parsed = time.perf_counter()
+    out = recompute_frame(df)
+    computed = time.perf_counter()
+    updates = changed_updates(out)
+    done = time.perf_counter()
+
+    # Same derivation one row at a time, on tables that are already parsed
+    tables = [[{k: (float(v) if k != 'period' else v) for k, v in p.items()} for p in json.loads(r['raw_json'])['table_data']]
+              for r in records]
+    start_loop = time.perf_counter()
+    for table in tables:
+        analyze_results(table, include_obs=True, include_rec=True)
+    loop_s = time.perf_counter() - start_loop
+
+    print(f"Rows          : {len(records)} ({skipped} skipped)")
+    print(f"Derive only   : {computed - parsed:8.2f} s vectorized vs {loop_s:.2f} s with analyze_results per row")
+    print(f"End to end    : {done - start:8.2f} s  (parse raw_json {parsed - start:.2f}s, derive {computed - parsed:.2f}s, "
+          f"diff against stored {done - computed:.2f}s) = {len(records) / (done - start):,.0f} rows/s")
+    print(f"Parity        : {len(records) - len(updates)}/{len(records)} rows unchanged")
+    print(f"DB basis      : {'ok' if check_db_basis() else 'failed'}")
+    print(f"Guards        : {'ok' if check_guards() else 'failed'}")
+    return 0 if not updates else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
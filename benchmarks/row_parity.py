@@ -0,0 +1,101 @@
+"""
+Row clustering parity and speed: LocalAnalyzer.get_rows vs the original O(words x rows) scan.
+
+Compares both on every page of the given PDFs and on synthetic dense word sets
+(multi-column pages, jittered baselines, shuffled word order), then times them.
+
+Usage:
+    python -m benchmarks.row_parity [sample.pdf ...] [--words 5000] [--pages 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import LocalAnalyzer  # noqa: E402
+from page_cache import PageTextCache  # noqa: E402
+
+def legacy_get_rows(words):
+    """The original get_rows, kept here as the parity reference."""
+    if not words: return []
+    rows = {}
+    for w in words:
+        y = round(w['top'], 0)
+        found = False
+        for ry in rows.keys():
+            if abs(y - ry) < 5: rows[ry].append(w); found = True; break
+        if not found: rows[y] = [w]
+
+    res = []
+    for y in sorted(rows.keys()):
+        r_words = sorted(rows[y], key=lambda x: x['x0'])
+        parts = []
+        if r_words:
+            c_txt, c_x0, c_x1 = r_words[0]['text'], r_words[0]['x0'], r_words[0]['x1']
+            for i in range(1, len(r_words)):
+                w = r_words[i]
+                if (w['x0'] - c_x1) < 4: c_txt += w['text']; c_x1 = w['x1']
+                else: parts.append((c_txt, c_x0)); c_txt, c_x0, c_x1 = w['text'], w['x0'], w['x1']
+            parts.append((c_txt, c_x0))
+        res.append(parts)
+    return res
+
+def synthetic_words(n, seed, shuffle=False):
+    """A dense multi-column page: ~n words on jittered baselines, optionally in random order."""
+    rng = random.Random(seed)
+    words = []
+    y = 30.0
+    while len(words) < n:
+        y += rng.choice([3.0, 6.0, 9.5, 12.0, 14.0])
+        x = 20.0
+        for _ in range(rng.randint(4, 14)):
+            w = rng.uniform(8, 40)
+            top = y + rng.uniform(-2.5, 2.5)
+            words.append({'text': f"{rng.randint(0, 99999):,}", 'x0': x, 'x1': x + w, 'top': top})
+            x += w + rng.choice([1.0, 2.5, 6.0, 20.0])
+    if shuffle: rng.shuffle(words)
+    return words[:n]
+
+def time_it(fn, word_sets, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for words in word_sets: fn(words)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='*', help="Sample PDFs to check page by page")
+    parser.add_argument('--words', type=int, default=5000, help="Words per synthetic page")
+    parser.add_argument('--pages', type=int, default=20, help="Synthetic pages")
+    args = parser.parse_args(argv)
+
+    analyzer = LocalAnalyzer(None)
+    cases = []
+    for path in args.pdfs:
+        with PageTextCache(path) as pages:
+            cases += [(f"{os.path.basename(path)} p{i + 1}", pages.words(i)) for i in range(len(pages))]
+    cases += [(f"synthetic #{i}{' (shuffled)' if i % 2 else ''}", synthetic_words(args.words, i, shuffle=bool(i % 2)))
+              for i in range(args.pages)]
+
+    failures = [name for name, words in cases if analyzer.get_rows(words) != legacy_get_rows(words)]
+    print(f"Parity: {len(cases) - len(failures)}/{len(cases)} pages produce identical rows")
+    for name in failures[:10]:
+        print(f"  MISMATCH {name}")
+
+    word_sets = [w for _, w in cases]
+    total_words = sum(len(w) for w in word_sets)
+    legacy = time_it(legacy_get_rows, word_sets)
+    current = time_it(analyzer.get_rows, word_sets)
+    print(f"Words       : {total_words} over {len(word_sets)} pages")
+    print(f"Legacy scan : {legacy * 1000:8.1f} ms")
+    print(f"get_rows    : {current * 1000:8.1f} ms")
+    print(f"Speedup     : {legacy / current:.1f}x")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+"""
+Table cropping for the AI path: page image bytes and vision tokens with and without the table clip.
+
+Every page of each filing is rendered full-page and clipped to its detected results table.
+Pages without a detected table are sent whole either way. Tokens follow OpenAI's `detail: high`
+tiling: 85 + 170 per 512 px tile after fitting to 2048 px and scaling the short side to 768 px.
+
+Without a PDF argument a synthetic standalone filing is generated (benchmarks.filings): a cover
+letter and filler pages around a results page with the company name above the table and notes below it.
+
+Usage:
+    python -m benchmarks.table_crop [filing.pdf | dir] ... [--json out.json]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF  # noqa: E402
+from PIL import Image  # noqa: E402
+from io import BytesIO  # noqa: E402
+from page_render import render_dpi, table_clip, _render  # noqa: E402
+from benchmarks.filings import MIN_PAGES, corpus, generate_filing  # noqa: E402
+from benchmarks.mock_openai import vision_tokens  # noqa: E402
+
+def measure(doc, n, clip):
+    dpi = render_dpi(clip or doc[n].rect)
+    start = time.perf_counter()
+    data = _render(doc, n, dpi, tuple(clip) if clip else None)
+    elapsed = time.perf_counter() - start
+    width, height = Image.open(BytesIO(data)).size
+    return {'bytes': len(data), 'base64_bytes': 4 * math.ceil(len(data) / 3),
+            'tokens': vision_tokens(width, height), 'pixels': f"{width}x{height}", 'ms': round(elapsed * 1000, 1)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='*', help="Filings or directories (default: generate one)")
+    parser.add_argument('--json', help="Write per-page results to this file")
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = corpus(args.pdfs)
+        if not files:
+            files = [os.path.join(tmp, 'filing.pdf')]
+            generate_filing(files[0], MIN_PAGES, layout='standalone')
+
+        results = []
+        for path in files:
+            with fitz.open(path) as doc:
+                for n in range(len(doc)):
+                    start = time.perf_counter()
+                    clip = table_clip(doc[n])
+                    detect_ms = round((time.perf_counter() - start) * 1000, 1)
+                    full = measure(doc, n, None)
+                    cropped = measure(doc, n, clip) if clip else full
+                    results.append({'file': os.path.basename(path), 'page': n + 1, 'cropped': bool(clip),
+                                    'detect_ms': detect_ms, 'full': full, 'crop': cropped})
+
+    print(f"{'file':<24} {'page':>4} {'crop':>5} {'full KB':>8} {'crop KB':>8} {'full tok':>9} {'crop tok':>9} {'detect ms':>9}")
+    for r in results:
+        print(f"{r['file'][:24]:<24} {r['page']:>4} {'yes' if r['cropped'] else 'no':>5} "
+              f"{r['full']['bytes'] / 1024:>8.1f} {r['crop']['bytes'] / 1024:>8.1f} "
+              f"{r['full']['tokens']:>9} {r['crop']['tokens']:>9} {r['detect_ms']:>9}")
+
+    cropped = [r for r in results if r['cropped']]
+    for label, rows in (("Cropped pages", cropped), ("All pages", results)):
+        if not rows: continue
+        full_b, crop_b = sum(r['full']['base64_bytes'] for r in rows), sum(r['crop']['base64_bytes'] for r in rows)
+        full_t, crop_t = sum(r['full']['tokens'] for r in rows), sum(r['crop']['tokens'] for r in rows)
+        print(f"{label:<14}: {len(rows)} pages, upload {full_b / 1024:.0f} -> {crop_b / 1024:.0f} KB "
+              f"({100 * (1 - crop_b / full_b):.0f}% less), image tokens {full_t} -> {crop_t} "
+              f"({100 * (1 - crop_t / full_t):.0f}% less)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
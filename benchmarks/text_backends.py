@@ -0,0 +1,105 @@
+"""
+Text backend comparison: runs local extraction over a corpus of filings with every text backend.
+
+Accuracy is agreement with pdfplumber (the reference backend) on identifiers and every
+table_data metric; latency is the wall time of extract_financial_data per filing.
+
+Usage:
+    python -m benchmarks.text_backends <dir | file.pdf> ... [--backends pdfplumber,fitz] [--json out.json]
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import extract_financial_data  # noqa: E402
+from page_cache import TEXT_BACKENDS, PdfplumberBackend  # noqa: E402
+from benchmarks.filings import corpus  # noqa: E402
+
+ID_FIELDS = ('company_id', 'company_code', 'quarter', 'year')
+
+def run_one(path, backend):
+    start = time.perf_counter()
+    try:
+        data = extract_financial_data(path, text_backend=backend)
+    except Exception as e:
+        data = {'error': str(e)}
+    return data, time.perf_counter() - start
+
+def compare(ref, other):
+    """Returns (matching fields, total fields, list of differing field names)."""
+    if 'error' in ref or 'error' in other:
+        same = ('error' in ref) == ('error' in other)
+        return int(same), 1, [] if same else ['error']
+    diffs = [f for f in ID_FIELDS if ref.get(f) != other.get(f)]
+    total = len(ID_FIELDS)
+    for i, (r, o) in enumerate(zip(ref.get('table_data', []), other.get('table_data', []))):
+        for k, v in r.items():
+            total += 1
+            if o.get(k) != v: diffs.append(f"table_data[{i}].{k}")
+    if len(ref.get('table_data', [])) != len(other.get('table_data', [])):
+        total += 1
+        diffs.append('table_data length')
+    return total - len(diffs), total, diffs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sources', nargs='+', help="Directories or PDF files")
+    parser.add_argument('--backends', default=','.join(TEXT_BACKENDS), help="Comma-separated backends to compare")
+    parser.add_argument('--json', help="Write per-file results to this path")
+    args = parser.parse_args(argv)
+    logging.disable(logging.CRITICAL)
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    unknown = [b for b in backends if b not in TEXT_BACKENDS]
+    if unknown:
+        parser.error(f"Unknown backends: {', '.join(unknown)}")
+    ref_name = PdfplumberBackend.name
+    if ref_name not in backends: backends.insert(0, ref_name)
+
+    files = corpus(args.sources)
+    if not files:
+        parser.error("No PDFs found")
+
+    timings = {b: [] for b in backends}
+    agreement = {b: [0, 0] for b in backends}
+    report = []
+    for path in files:
+        results = {}
+        for b in backends:
+            results[b], elapsed = run_one(path, b)
+            timings[b].append(elapsed)
+        entry = {'file': path, 'seconds': {b: round(timings[b][-1], 3) for b in backends}, 'diffs': {}}
+        for b in backends:
+            if b == ref_name: continue
+            same, total, diffs = compare(results[ref_name], results[b])
+            agreement[b][0] += same
+            agreement[b][1] += total
+            if diffs: entry['diffs'][b] = diffs
+        report.append(entry)
+        flag = "" if not entry['diffs'] else "  DIFF " + "; ".join(f"{b}: {', '.join(d[:5])}" for b, d in entry['diffs'].items())
+        print(f"{Path(path).name:40s} " + "  ".join(f"{b}={entry['seconds'][b]:.2f}s" for b in backends) + flag)
+
+    print(f"\n{len(files)} filings")
+    print(f"{'backend':12s} {'mean':>8s} {'p50':>8s} {'max':>8s} {'speedup':>8s} {'agreement':>10s}")
+    ref_mean = statistics.mean(timings[ref_name])
+    for b in backends:
+        t = timings[b]
+        mean = statistics.mean(t)
+        agree = "reference" if b == ref_name else f"{agreement[b][0] / max(agreement[b][1], 1):.1%}"
+        print(f"{b:12s} {mean:8.3f} {statistics.median(t):8.3f} {max(t):8.3f} {ref_mean / mean:7.1f}x {agree:>10s}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'files': report, 'agreement': {b: a[0] / max(a[1], 1) for b, a in agreement.items() if b != ref_name}}, f, indent=2)
+        print(f"Results written to {args.json}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,76 +1,283 @@
+import atexit
+import itertools
 import logging
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
 from playwright.sync_api import sync_playwright
 import time
 import os
+from config import config
+from pdf_store import PdfTooLarge, incoming_path, max_pdf_bytes, store_chunks, store_file
+from timings import count, span, timed
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def download_pdf_from_url(url, save_dir="downloads"):
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+HTTP_HEADERS = {
+    "User-Agent": USER_AGENT,
+    "Accept": "application/pdf,text/html;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+CHUNK_SIZE = 64 * 1024
+
+# Which tier served each download ('http', 'browser', 'failed') - exposes the fast-path hit rate.
+# /metrics exports them (all processes) as result_analyser_events_total{event="download.<tier>"}
+_tier_counts = Counter()
+_tier_lock = threading.Lock()
+
+def _record_tier(tier):
+    with _tier_lock:
+        _tier_counts[tier] += 1
+    count(f'download.{tier}')
+
+def get_download_stats():
+    """Returns this process's per-tier download counts and HTTP fast-path hit rate."""
+    with _tier_lock:
+        counts = dict(_tier_counts)
+    served = counts.get('http', 0) + counts.get('browser', 0)
+    counts['http_hit_rate'] = round(counts.get('http', 0) / served, 3) if served else 0.0
+    return counts
+
+class BrowserPool:
     """
-    Uses Playwright to navigate to a URL and download the PDF.
-    Handles 403 Forbidden by mimicking a real browser.
-    Supports both direct PDF rendering and attachment downloads.
+    Long-lived pool of warm headless Chromium contexts for URL downloads.
+    Playwright's sync API is bound to the thread that started it, so each worker thread owns
+    its own browser and context; callers hand tasks to the pool and block on the result.
+    Contexts are recycled after `max_uses` leases or when the browser crashes.
     """
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-        
-    filename = url.split('/')[-1]
-    if not filename.endswith('.pdf'):
-        filename = "downloaded_file.pdf"
-    
-    save_path = os.path.join(save_dir, filename)
-    
-    logger.info(f"Attempting to download from: {url}")
-    
-    with sync_playwright() as p:
-        # Launch browser (headless=True for production)
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            accept_downloads=True
-        )
-        page = context.new_page()
-        
+    def __init__(self, size=2, max_uses=50):
+        self.size = size
+        self.max_uses = max_uses
+        self._tasks = queue.Queue()
+        self._threads = []
+        self._closed = False
+        for i in range(size):
+            t = threading.Thread(target=self._worker, name=f"browser-pool-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"🌐 Browser pool started ({size} workers, recycle after {max_uses} uses)")
+
+    def run(self, fn, *args, timeout=None):
+        """Runs fn(context, *args) on a leased browser context and returns its result."""
+        if self._closed:
+            raise RuntimeError("Browser pool is shut down")
+        fut = Future()
+        self._tasks.put((fn, args, fut))
+        return fut.result(timeout=timeout)
+
+    def _worker(self):
         try:
-            # Setup download listener
-            with page.expect_download(timeout=10000) as download_info:
-                try:
-                    # Navigate to the URL
-                    response = page.goto(url, wait_until="networkidle", timeout=15000)
-                    
-                    if response.status == 403:
-                        logger.warning("Error: 403 Forbidden. Trying to wait...")
-                        time.sleep(2)
-                    
-                    # Check if it's a direct PDF content type
-                    content_type = response.headers.get('content-type', '')
-                    if 'application/pdf' in content_type:
-                        logger.info("Direct PDF content detected. Saving...")
-                        body = response.body()
-                        with open(save_path, 'wb') as f:
-                            f.write(body)
-                        logger.info(f"Saved to {save_path}")
-                        return save_path
-                        
-                except Exception as nav_err:
-                    # Navigation might fail if it triggers a download immediately, which is fine
-                    logger.info(f"Navigation finished (possibly triggered download): {nav_err}")
-
-            # If we are here, a download event might have been triggered
-            download = download_info.value
-            logger.info(f"Download event detected. Saving to {save_path}")
-            download.save_as(save_path)
-            return save_path
-                
+            with sync_playwright() as p:
+                self._serve(p)
+        except Exception as e:
+            logger.error(f"Browser pool worker could not start Playwright: {e}")
+            # Keep draining so callers get the error instead of blocking forever
+            while (task := self._tasks.get()) is not None:
+                if task[2].set_running_or_notify_cancel():
+                    task[2].set_exception(e)
+
+    def _serve(self, p):
+        browser, context, uses = None, None, 0
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            fn, args, fut = task
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                # (Re)launch after a crash, recycle the context once it has served max_uses downloads
+                if browser is None or not browser.is_connected():
+                    browser, context, uses = p.chromium.launch(headless=True), None, 0
+                if context is not None and uses >= self.max_uses:
+                    self._close_quietly(context)
+                    context, uses = None, 0
+                if context is None:
+                    context = browser.new_context(user_agent=USER_AGENT, accept_downloads=True)
+                uses += 1
+                fut.set_result(fn(context, *args))
+            except Exception as e:
+                fut.set_exception(e)
+                # Drop the context so the next lease starts clean
+                if context is not None:
+                    self._close_quietly(context)
+                    context = None
+        if context is not None: self._close_quietly(context)
+        if browser is not None: self._close_quietly(browser)
+
+    @staticmethod
+    def _close_quietly(obj):
+        try:
+            obj.close()
         except Exception as e:
-            logger.error(f"Error downloading PDF: {e}")
-            # Fallback: Check if file exists anyway (sometimes race conditions)
-            if os.path.exists(save_path):
-                return save_path
-            return None
-        finally:
-            browser.close()
-
-    return None
+            logger.debug(f"Ignoring error while closing browser resource: {e}")
+
+    def shutdown(self):
+        if self._closed: return
+        self._closed = True
+        for _ in self._threads:
+            self._tasks.put(None)
+        for t in self._threads:
+            t.join(timeout=10)
+        logger.info("🌐 Browser pool stopped")
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """Returns the process-wide browser pool, starting it on first use (and again after a fork)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = BrowserPool(size=config.BROWSER_POOL_SIZE, max_uses=config.BROWSER_CONTEXT_MAX_USES)
+            _pool_pid = os.getpid()
+        return _pool
+
+def shutdown_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
+
+atexit.register(shutdown_browser_pool)
+
+def _download_with_context(context, url):
+    """Downloads `url` into the PDF store using a leased browser context. Returns (path, sha256) or None."""
+    page = context.new_page()
+    # Collect download events instead of wrapping navigation in expect_download, which waits for a
+    # download on exit even when the PDF came back as the page response
+    downloads = []
+    page.on("download", downloads.append)
+    try:
+        try:
+            # Navigate to the URL
+            response = page.goto(url, wait_until="networkidle", timeout=15000)
+
+            if response.status == 403:
+                logger.warning("Error: 403 Forbidden. Trying to wait...")
+                time.sleep(2)
+
+            # Check if it's a direct PDF content type
+            content_type = response.headers.get('content-type', '')
+            if 'application/pdf' in content_type:
+                # Re-fetch with the cookies the browser earned so the body streams to disk instead of
+                # coming back from Playwright as one bytes object
+                logger.info("Direct PDF content detected. Streaming it with the browser's cookies...")
+                cookies = {c['name']: c['value'] for c in context.cookies(response.url)}
+                stored = _download_with_http(response.url, cookies=cookies)
+                if stored is None:
+                    logger.info("Cookie re-fetch was refused; taking the body from the browser")
+                    length = int(response.headers.get('content-length') or 0)
+                    if length > max_pdf_bytes():
+                        raise PdfTooLarge(max_pdf_bytes())
+                    stored = store_chunks([response.body()])
+                return stored
+
+        except PdfTooLarge:
+            raise
+        except Exception as nav_err:
+            # Navigation might fail if it triggers a download immediately, which is fine
+            logger.info(f"Navigation finished (possibly triggered download): {nav_err}")
+
+        # If we are here, a download event might have been triggered; the browser writes it to disk itself
+        download = downloads[0] if downloads else page.wait_for_event("download", timeout=10000)
+        save_path = incoming_path()
+        logger.info("Download event detected. Saving to the PDF store")
+        try:
+            download.save_as(save_path)
+        except Exception:
+            os.remove(save_path)
+            raise
+        return store_file(save_path)
+    finally:
+        page.close()
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_http_session():
+    """Returns the process-wide keep-alive HTTP session used by the fast path."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_SIZE, pool_maxsize=config.HTTP_POOL_SIZE, max_retries=1)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers.update(HTTP_HEADERS)
+            _session_pid = os.getpid()
+        return _session
+
+def _download_with_http(url, cookies=None):
+    """
+    Fast path: plain keep-alive GET, streamed in chunks into the PDF store (hashed on the way).
+    Returns (path, sha256) when the server hands back a PDF, or None when the browser is needed
+    (403, HTML interstitial, or anything that is not a PDF). Raises PdfTooLarge past MAX_PDF_MB.
+    """
+    try:
+        with get_http_session().get(url, stream=True, timeout=(5, 30), allow_redirects=True, cookies=cookies) as resp:
+            if resp.status_code != 200:
+                logger.info(f"HTTP fast path got {resp.status_code}; falling back to browser")
+                return None
+            # Refuse oversized files before reading any of the body
+            if int(resp.headers.get('content-length') or 0) > max_pdf_bytes():
+                raise PdfTooLarge(max_pdf_bytes())
+            chunks = resp.iter_content(chunk_size=CHUNK_SIZE)
+            first = next(chunks, b"")
+            content_type = resp.headers.get('content-type', '')
+            # Some exchanges label PDFs as octet-stream, so trust the magic bytes too
+            if 'application/pdf' not in content_type and not first.lstrip().startswith(b"%PDF"):
+                logger.info(f"HTTP fast path got non-PDF content ({content_type or 'unknown'}); falling back to browser")
+                return None
+            stored = store_chunks(itertools.chain([first], chunks))
+            logger.info(f"Saved {url} via HTTP fast path")
+            return stored
+    except requests.RequestException as e:
+        logger.info(f"HTTP fast path failed ({e}); falling back to browser")
+        return None
+
+@timed('download')
+def fetch_pdf(url):
+    """
+    Tiered download into the PDF store: keep-alive HTTP first, pooled Playwright browser as fallback.
+    Returns (path, tier) where tier is 'http', 'browser' or 'failed' (path None); the stored file is
+    named by its content hash (see pdf_store.stored_hash). Raises PdfTooLarge past MAX_PDF_MB.
+    """
+    logger.info(f"Attempting to download from: {url}")
+
+    with span('download.http'):
+        stored = _download_with_http(url)
+    if stored:
+        _record_tier('http')
+        return stored[0], 'http'
+
+    try:
+        with span('download.browser'):
+            stored = get_browser_pool().run(_download_with_context, url)
+    except PdfTooLarge:
+        _record_tier('failed')
+        raise
+    except Exception as e:
+        logger.error(f"Error downloading PDF: {e}")
+        stored = None
+    tier = 'browser' if stored else 'failed'
+    _record_tier(tier)
+    return (stored[0] if stored else None), tier
+
+def download_pdf_from_url(url):
+    """
+    Downloads the PDF at `url` into the PDF store and returns its local path (None on failure).
+    Handles 403 Forbidden and attachment downloads by falling back to a real browser.
+    """
+    path, tier = fetch_pdf(url)
+    logger.info(f"Download tier for {url}: {tier}")
+    return path
@@ -0,0 +1,20 @@
+import hashlib
+import json
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+def sha256_file(path):
+    """Returns the hex SHA-256 of a file, read in chunks so large PDFs are not loaded at once."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def content_cache_key(content_hash, options):
+    """
+    Builds the result cache key for a file hash plus the analyzer options that shape the output.
+    Options are serialised with sorted keys so the key does not depend on argument order.
+    """
+    opts = json.dumps(options, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f"{content_hash}:{opts}".encode()).hexdigest()
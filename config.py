@@ -11,4 +11,90 @@ class Config:
     DB_NAME = os.getenv('DB_NAME')
     DB_TABLE = os.getenv('DB_TABLE', 'TB_QUARTERLY_ANALYSIS_GPT_TST')
 
+    # Connection pool (one per process); connections are pinged on checkout
+    DB_POOL_NAME = os.getenv('DB_POOL_NAME', 'result_analyser')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECONNECT_ATTEMPTS = int(os.getenv('DB_POOL_RECONNECT_ATTEMPTS', 3))
+
+    # Content-hash index: SHA-256 of the PDF bytes + analyzer options -> the stored DB_TABLE row
+    # (by company_id/quarter/year; filings without those keep a raw_json copy in the index)
+    DB_HASH_TABLE = os.getenv('DB_HASH_TABLE', 'TB_ANALYSIS_CONTENT_CACHE')
+
+    # Background /jobs queue (local SQLite store, no external broker)
+    JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'jobs.db')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+
+    # Warm Playwright contexts for URL downloads
+    BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))
+    BROWSER_CONTEXT_MAX_USES = int(os.getenv('BROWSER_CONTEXT_MAX_USES', 50))
+
+    # Keep-alive connections for the HTTP fast-path downloader
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 10))
+
+    # Uploaded and downloaded PDFs: streamed to disk and hashed in chunks, kept by content hash, least recently used
+    # evicted past the size cap (files used within the minimum age are never evicted)
+    MAX_PDF_MB = int(os.getenv('MAX_PDF_MB', 200))         # per PDF, uploads and URL downloads
+    MAX_UPLOAD_MB = int(os.getenv('MAX_UPLOAD_MB', 500))   # whole request body (several files on /batch)
+    PDF_STORE_DIR = os.getenv('PDF_STORE_DIR', 'pdf_store')
+    PDF_STORE_MAX_MB = int(os.getenv('PDF_STORE_MAX_MB', 2048))
+    PDF_STORE_MIN_AGE_SECONDS = int(os.getenv('PDF_STORE_MIN_AGE_SECONDS', 3600))
+    # Zip files in a batch: PDFs taken per zip and total bytes extracted per zip (each PDF also within MAX_PDF_MB)
+    BATCH_ZIP_MAX_FILES = int(os.getenv('BATCH_ZIP_MAX_FILES', 1000))
+    BATCH_ZIP_MAX_MB = int(os.getenv('BATCH_ZIP_MAX_MB', 4096))
+
+    # Page text/word extraction library for local analysis: 'pdfplumber' or 'fitz' (PyMuPDF)
+    TEXT_BACKEND = os.getenv('TEXT_BACKEND', 'pdfplumber')
+
+    # OpenAI calls: shared per-key rate limits, concurrency cap and retry backoff (seconds)
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+    OPENAI_RPM = int(os.getenv('OPENAI_RPM', 500))
+    OPENAI_TPM = int(os.getenv('OPENAI_TPM', 30000))
+    OPENAI_BURST_SECONDS = float(os.getenv('OPENAI_BURST_SECONDS', 10))
+    OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', 8))
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 5))
+    OPENAI_BACKOFF_BASE = float(os.getenv('OPENAI_BACKOFF_BASE', 1))
+    OPENAI_BACKOFF_MAX = float(os.getenv('OPENAI_BACKOFF_MAX', 30))
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 120))
+    # Fraction of the RPM/TPM limits kept for analyses run in the web process (/analyze, /analyze/stream);
+    # the /jobs worker processes split the rest equally, and a batch job splits its worker's share again.
+    # Per gunicorn worker: with several, keep OPENAI_WEB_SHARE plus the job pools' shares within 1
+    OPENAI_WEB_SHARE = float(os.getenv('OPENAI_WEB_SHARE', 0.25))
+
+    # Page images for the AI path: render processes and an on-disk cache keyed by file hash, page and DPI
+    RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))
+    RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR', 'render_cache')
+    RENDER_CACHE_MAX_MB = int(os.getenv('RENDER_CACHE_MAX_MB', 500))
+    # What the AI path sends: 'auto' (table text from the text layer, page images for scanned pages) or 'vision'
+    AI_INPUT = os.getenv('AI_INPUT', 'auto').lower()
+    # Clip each AI page image to the detected results table ('false' sends full pages)
+    AI_CROP_TABLES = os.getenv('AI_CROP_TABLES', 'true').lower() == 'true'
+
+    # AI response cache (local SQLite store): entries expire after the TTL, least recently used evicted past the size cap
+    AI_CACHE_PATH = os.getenv('AI_CACHE_PATH', 'ai_cache.db')
+    AI_CACHE_TTL_HOURS = float(os.getenv('AI_CACHE_TTL_HOURS', 24 * 30))
+    AI_CACHE_MAX_MB = int(os.getenv('AI_CACHE_MAX_MB', 50))
+
+    # Span timers: a `timings` block on each result and histograms at /metrics ('false' turns both off)
+    TIMINGS_ENABLED = os.getenv('TIMINGS_ENABLED', 'true').lower() == 'true'
+    # SQLite store every process (web, job and batch workers) adds its histograms and counters to ('' = per process)
+    METRICS_DB_PATH = os.getenv('METRICS_DB_PATH', JOB_DB_PATH)
+
+    # Profiles of slow or flagged analyses (cProfile + tracemalloc on request, sampled stacks past the threshold)
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_MAX_COUNT = int(os.getenv('PROFILE_MAX_COUNT', 20))
+    PROFILE_MAX_MB = int(os.getenv('PROFILE_MAX_MB', 100))
+    PROFILE_SLOW_SECONDS = float(os.getenv('PROFILE_SLOW_SECONDS', 0))  # 0 = only profile on request
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.01))
+    # Required (X-Admin-Token header) for /admin endpoints and per-request profiling; unset disables both
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') or None
+
+    # Columnar snapshot of the analysis table (snapshot.py, /api/snapshot): 'parquet' or 'arrow' (Arrow IPC)
+    SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+    SNAPSHOT_FORMAT = os.getenv('SNAPSHOT_FORMAT', 'parquet').lower()
+
+    # Parallel page reading inside one large filing (1 = off)
+    PAGE_WORKERS = int(os.getenv('PAGE_WORKERS', 1))
+    PAGE_PARALLEL_MIN_PAGES = int(os.getenv('PAGE_PARALLEL_MIN_PAGES', 40))
+
 config = Config()
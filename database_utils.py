@@ -1,30 +1,87 @@
-import mysql.connector
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
+import base64
 import json
 import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
 from config import config
+from timings import timed
 
 logger = logging.getLogger(__name__)
 
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """Creates the process-wide connection pool on first use (and again in a forked child)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = pooling.MySQLConnectionPool(
+                pool_name=f"{config.DB_POOL_NAME}_{os.getpid()}",
+                pool_size=config.DB_POOL_SIZE,
+                pool_reset_session=True,
+                host=config.DB_HOST,
+                user=config.DB_USER,
+                password=config.DB_PASSWORD,
+                database=config.DB_NAME
+            )
+            _pool_pid = os.getpid()
+            logger.info(f"Database pool ready ({config.DB_POOL_SIZE} connections)")
+        return _pool
+
+@timed('db.connect')
 def get_db_connection():
-    """Establishes and returns a connection to the MySQL database."""
+    """
+    Checks a connection out of the pool and returns it (None on failure).
+    The connection is pinged first so stale ones reconnect; close() returns it to the pool.
+    """
     try:
-        conn = mysql.connector.connect(
-            host=config.DB_HOST,
-            user=config.DB_USER,
-            password=config.DB_PASSWORD,
-            database=config.DB_NAME
-        )
+        pool = _get_pool()
+        deadline = time.time() + config.DB_POOL_TIMEOUT
+        while True:
+            try:
+                conn = pool.get_connection()
+                break
+            except PoolError:
+                # Pool exhausted - wait briefly for a connection to come back
+                if time.time() >= deadline: raise
+                time.sleep(0.05)
+        try:
+            conn.ping(reconnect=True, attempts=config.DB_POOL_RECONNECT_ATTEMPTS, delay=1)
+        except Exception:
+            conn.close()
+            raise
         return conn
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         return None
 
+def _release(conn, cursor=None):
+    """Closes the cursor and hands the connection back to the pool, even if it has dropped."""
+    try:
+        if cursor is not None: cursor.close()
+    except Exception:
+        pass
+    try:
+        conn.close()
+    except Exception as e:
+        # A dropped connection fails its session reset but is still handed back; checkout pings and reconnects it
+        logger.warning(f"Failed to return database connection to the pool: {e}")
+
+@timed('db.get_analysis_data')
 def get_analysis_data(company_id, quarter, year):
     """Retrieves analysis data from the database if it exists."""
     if not company_id: return None
     conn = get_db_connection()
     if not conn: return None
 
+    cursor = None
     try:
         cursor = conn.cursor(dictionary=True)
         sql = f"SELECT raw_json FROM {config.DB_TABLE} WHERE company_id = %s AND quarter = %s AND year = %s"
@@ -37,10 +94,116 @@ def get_analysis_data(company_id, quarter, year):
         logger.error(f"Failed to fetch data: {e}")
         return None
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+        _release(conn, cursor)
+
+# Result keys describing one request rather than the filing; never stored in raw_json
+REQUEST_FIELDS = ('download_tier', 'saved_to_db', 'timings', 'profile', 'ai_cache_hit', 'ai_tokens_saved')
+
+def _stored_json(data):
+    return json.dumps({k: v for k, v in data.items() if k not in REQUEST_FIELDS})
+
+def _analysis_params(data):
+    """Builds the upsert parameter tuple for one analysis result."""
+    # Scaling helper (Data is already normalized to Crores by engines)
+    def scale(val):
+        try:
+            return float(val) 
+        except (ValueError, TypeError):
+            return 0.0
+
+    # Extract current record from table_data (usually the first entry)
+    current = data.get('table_data', [{}])[0]
+    growth = data.get('growth', {})
+    corp_actions = data.get('corporate_actions', {})
+    rec = data.get('recommendation', {})
+
+    # Prepare field values
+    company_id = data.get('company_id')
+    company_code = data.get('company_code')
+    quarter = data.get('quarter', 'Q1')
+    year = data.get('year', 2025)
+    result_type = data.get('result_type', 'Standalone')
+    
+    sales = scale(current.get('revenue'))
+    other_income = scale(current.get('other_income'))
+    total_expenses = scale(current.get('total_expenses'))
+    operating_profit = scale(current.get('operating_profit'))
+    pbt = scale(current.get('pbt'))
+    net_profit = scale(current.get('net_profit'))
+    
+    margin = current.get('opm', 0.0)
+    eps = current.get('eps', 0.0)
+    
+    revenue_qoq = growth.get('revenue_qoq', 0.0)
+    revenue_yoy = growth.get('revenue_yoy', 0.0)
+    net_profit_qoq = growth.get('net_profit_qoq', 0.0)
+    net_profit_yoy = growth.get('net_profit_yoy', 0.0)
+    
+    dividend = corp_actions.get('dividend', 0.0)
+    if isinstance(dividend, str):
+        import re
+        m = re.search(r'\d+(?:\.\d+)?', dividend)
+        dividend = float(m.group(0)) if m else 0.0
+        
+    capex = scale(corp_actions.get('capex'))
+    mgmt_change = corp_actions.get('management_change', 'No')
+    spec_ann = corp_actions.get('special_announcement', '')
+    
+    observations = "\n".join(data.get('observations', []))
+    rec_verdict = rec.get('verdict', 'HOLD / NEUTRAL')
+    raw_json = _stored_json(data)
+
+    return (
+        company_id, company_code, quarter, year, result_type,
+        sales, other_income, total_expenses, operating_profit, pbt, net_profit,
+        margin, eps, revenue_qoq, revenue_yoy,
+        net_profit_qoq, net_profit_yoy,
+        dividend, capex, mgmt_change, spec_ann,
+        observations, rec_verdict, raw_json
+    )
+
+def _upsert_sql():
+    return f"""
+        INSERT INTO {config.DB_TABLE} (
+            company_id, company_code, quarter, year, result_type,
+            sales, other_income, total_expenses, operating_profit, pbt, net_profit,
+            margin, eps, revenue_growth_qoq, revenue_growth_yoy,
+            net_profit_growth_qoq, net_profit_growth_yoy,
+            dividend, capex, management_change, special_announcement,
+            observations, recommendation_verdict, raw_json
+        ) VALUES (
+            %s, %s, %s, %s, %s,
+            %s, %s, %s, %s, %s, %s,
+            %s, %s, %s, %s,
+            %s, %s,
+            %s, %s, %s, %s,
+            %s, %s, %s
+        )
+        ON DUPLICATE KEY UPDATE
+            company_code = VALUES(company_code),
+            result_type = VALUES(result_type),
+            sales = VALUES(sales),
+            other_income = VALUES(other_income),
+            total_expenses = VALUES(total_expenses),
+            operating_profit = VALUES(operating_profit),
+            pbt = VALUES(pbt),
+            net_profit = VALUES(net_profit),
+            margin = VALUES(margin),
+            eps = VALUES(eps),
+            revenue_growth_qoq = VALUES(revenue_growth_qoq),
+            revenue_growth_yoy = VALUES(revenue_growth_yoy),
+            net_profit_growth_qoq = VALUES(net_profit_growth_qoq),
+            net_profit_growth_yoy = VALUES(net_profit_growth_yoy),
+            dividend = VALUES(dividend),
+            capex = VALUES(capex),
+            management_change = VALUES(management_change),
+            special_announcement = VALUES(special_announcement),
+            observations = VALUES(observations),
+            recommendation_verdict = VALUES(recommendation_verdict),
+            raw_json = VALUES(raw_json)
+    """
 
+@timed('db.upsert_analysis_data')
 def upsert_analysis_data(data):
     """
     Saves or updates extracted financial data in the MySQL table.
@@ -50,126 +213,58 @@ def upsert_analysis_data(data):
     if not conn:
         return False
 
+    cursor = None
     try:
         cursor = conn.cursor()
-        
-        # Scaling helper (Data is already normalized to Crores by engines)
-        def scale(val):
-            try:
-                return float(val) 
-            except (ValueError, TypeError):
-                return 0.0
-
-        # Extract current record from table_data (usually the first entry)
-        current = data.get('table_data', [{}])[0]
-        growth = data.get('growth', {})
-        corp_actions = data.get('corporate_actions', {})
-        rec = data.get('recommendation', {})
-
-        # Prepare field values
-        company_id = data.get('company_id')
-        company_code = data.get('company_code')
-        quarter = data.get('quarter', 'Q1')
-        year = data.get('year', 2025)
-        result_type = data.get('result_type', 'Standalone')
-        
-        sales = scale(current.get('revenue'))
-        other_income = scale(current.get('other_income'))
-        total_expenses = scale(current.get('total_expenses'))
-        operating_profit = scale(current.get('operating_profit'))
-        pbt = scale(current.get('pbt'))
-        net_profit = scale(current.get('net_profit'))
-        
-        margin = current.get('opm', 0.0)
-        eps = current.get('eps', 0.0)
-        
-        revenue_qoq = growth.get('revenue_qoq', 0.0)
-        revenue_yoy = growth.get('revenue_yoy', 0.0)
-        net_profit_qoq = growth.get('net_profit_qoq', 0.0)
-        net_profit_yoy = growth.get('net_profit_yoy', 0.0)
-        
-        dividend = corp_actions.get('dividend', 0.0)
-        if isinstance(dividend, str):
-            import re
-            m = re.search(r'\d+(?:\.\d+)?', dividend)
-            dividend = float(m.group(0)) if m else 0.0
-            
-        capex = scale(corp_actions.get('capex'))
-        mgmt_change = corp_actions.get('management_change', 'No')
-        spec_ann = corp_actions.get('special_announcement', '')
-        
-        observations = "\n".join(data.get('observations', []))
-        rec_verdict = rec.get('verdict', 'HOLD / NEUTRAL')
-        raw_json = json.dumps(data)
-
-        sql = f"""
-            INSERT INTO {config.DB_TABLE} (
-                company_id, company_code, quarter, year, result_type,
-                sales, other_income, total_expenses, operating_profit, pbt, net_profit,
-                margin, eps, revenue_growth_qoq, revenue_growth_yoy,
-                net_profit_growth_qoq, net_profit_growth_yoy,
-                dividend, capex, management_change, special_announcement,
-                observations, recommendation_verdict, raw_json
-            ) VALUES (
-                %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s,
-                %s, %s,
-                %s, %s, %s, %s,
-                %s, %s, %s
-            )
-            ON DUPLICATE KEY UPDATE
-                company_code = VALUES(company_code),
-                result_type = VALUES(result_type),
-                sales = VALUES(sales),
-                other_income = VALUES(other_income),
-                total_expenses = VALUES(total_expenses),
-                operating_profit = VALUES(operating_profit),
-                pbt = VALUES(pbt),
-                net_profit = VALUES(net_profit),
-                margin = VALUES(margin),
-                eps = VALUES(eps),
-                revenue_growth_qoq = VALUES(revenue_growth_qoq),
-                revenue_growth_yoy = VALUES(revenue_growth_yoy),
-                net_profit_growth_qoq = VALUES(net_profit_growth_qoq),
-                net_profit_growth_yoy = VALUES(net_profit_growth_yoy),
-                dividend = VALUES(dividend),
-                capex = VALUES(capex),
-                management_change = VALUES(management_change),
-                special_announcement = VALUES(special_announcement),
-                observations = VALUES(observations),
-                recommendation_verdict = VALUES(recommendation_verdict),
-                raw_json = VALUES(raw_json)
-        """
-
-        params = (
-            company_id, company_code, quarter, year, result_type,
-            sales, other_income, total_expenses, operating_profit, pbt, net_profit,
-            margin, eps, revenue_qoq, revenue_yoy,
-            net_profit_qoq, net_profit_yoy,
-            dividend, capex, mgmt_change, spec_ann,
-            observations, rec_verdict, raw_json
-        )
-
-        cursor.execute(sql, params)
+        cursor.execute(_upsert_sql(), _analysis_params(data))
         conn.commit()
-        logger.info(f"Successfully saved analysis for {company_id or company_code} ({quarter} {year})")
+        logger.info(f"Successfully saved analysis for {data.get('company_id') or data.get('company_code')} ({data.get('quarter', 'Q1')} {data.get('year', 2025)})")
         return True
 
     except Exception as e:
         logger.error(f"Failed to upsert data: {e}", exc_info=True)
         return False
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+        _release(conn, cursor)
+
+@timed('db.bulk_upsert_analysis_data')
+def bulk_upsert_analysis_data(records, chunk_size=200):
+    """
+    Saves many analysis results with multi-row upserts, one commit per chunk.
+    Returns the number of records written.
+    """
+    if not records: return 0
+    conn = get_db_connection()
+    if not conn:
+        return 0
+
+    saved = 0
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        sql = _upsert_sql()
+        for i in range(0, len(records), chunk_size):
+            chunk = records[i:i + chunk_size]
+            cursor.executemany(sql, [_analysis_params(d) for d in chunk])
+            conn.commit()
+            saved += len(chunk)
+        logger.info(f"Bulk saved {saved} analyses")
+        return saved
+
+    except Exception as e:
+        logger.error(f"Failed to bulk upsert data: {e}", exc_info=True)
+        return saved
+    finally:
+        _release(conn, cursor)
 
+@timed('db.get_all_analysis_data')
 def get_all_analysis_data():
     """Retrieves all analysis records from the database."""
     conn = get_db_connection()
     if not conn:
         return []
 
+    cursor = None
     try:
         cursor = conn.cursor(dictionary=True)
         # Select all columns except raw_json to save bandwidth
@@ -192,6 +287,430 @@ def get_all_analysis_data():
         logger.error(f"Failed to fetch all data: {e}")
         return []
     finally:
-        if conn.is_connected():
-            cursor.close()
-            conn.close()
+        _release(conn, cursor)
+
+_hash_table_ready = False
+
+def ensure_content_cache_table(conn):
+    """
+    Creates the content-hash index table on first use. Rows point at the stored analysis by
+    (company_id, quarter, year); raw_json holds a copy only for filings without those identifiers.
+    """
+    global _hash_table_ready
+    if _hash_table_ready: return
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {config.DB_HASH_TABLE} (
+                cache_key CHAR(64) NOT NULL PRIMARY KEY,
+                content_hash CHAR(64) NOT NULL,
+                company_id VARCHAR(20) NULL,
+                quarter VARCHAR(4) NULL,
+                year INT NULL,
+                raw_json LONGTEXT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_content_hash (content_hash)
+            )
+        """)
+        conn.commit()
+        _hash_table_ready = True
+    finally:
+        cursor.close()
+
+def upgrade_content_cache_table(conn):
+    """
+    Turns a content-hash table that stored a full raw_json per entry into pointers: makes raw_json
+    nullable and drops the copies of identified filings (read from DB_TABLE instead). Run by `python -m migrate`.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT is_nullable FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = 'raw_json'",
+            (config.DB_HASH_TABLE,)
+        )
+        row = cursor.fetchone()
+        if row and row[0] == 'NO':
+            logger.info(f"Making {config.DB_HASH_TABLE}.raw_json nullable")
+            cursor.execute(f"ALTER TABLE {config.DB_HASH_TABLE} MODIFY raw_json LONGTEXT NULL")
+        cursor.execute(
+            f"UPDATE {config.DB_HASH_TABLE} SET raw_json = NULL "
+            f"WHERE raw_json IS NOT NULL AND company_id IS NOT NULL AND quarter IS NOT NULL AND year IS NOT NULL"
+        )
+        dropped = cursor.rowcount
+        conn.commit()
+        return dropped
+    finally:
+        cursor.close()
+
+def _hash_params(cache_key, content_hash, data):
+    """Content-hash index row: a pointer by identifiers, or a copy of the result for filings without them."""
+    keyed = data.get('company_id') and data.get('quarter') and data.get('year')
+    return (cache_key, content_hash, data.get('company_id'), data.get('quarter'), data.get('year'),
+            None if keyed else _stored_json(data))
+
+def _hash_upsert_sql():
+    return f"""
+        INSERT INTO {config.DB_HASH_TABLE} (cache_key, content_hash, company_id, quarter, year, raw_json)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            company_id = VALUES(company_id),
+            quarter = VALUES(quarter),
+            year = VALUES(year),
+            raw_json = VALUES(raw_json)
+    """
+
+@timed('db.get_analysis_by_hash')
+def get_analysis_by_hash(cache_key):
+    """
+    Retrieves a stored analysis by its content cache key (see cache_utils.content_cache_key): the current
+    DB_TABLE row it points at (so recomputed fields show), or the entry's own copy for unidentified filings.
+    """
+    conn = get_db_connection()
+    if not conn: return None
+
+    cursor = None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        ensure_content_cache_table(conn)
+        sql = f"""
+            SELECT COALESCE(t.raw_json, h.raw_json) AS raw_json
+            FROM {config.DB_HASH_TABLE} h
+            LEFT JOIN {config.DB_TABLE} t ON t.company_id = h.company_id AND t.quarter = h.quarter AND t.year = h.year
+            WHERE h.cache_key = %s
+        """
+        cursor.execute(sql, (cache_key,))
+        result = cursor.fetchone()
+        if result and result['raw_json']:
+            return json.loads(result['raw_json'])
+        return None
+    except Exception as e:
+        logger.error(f"Failed to fetch cached analysis by hash: {e}")
+        return None
+    finally:
+        _release(conn, cursor)
+
+@timed('db.save_analysis_hash')
+def save_analysis_hash(cache_key, content_hash, data):
+    """Indexes an analysis result under its content cache key. Works for filings without a scrip code."""
+    conn = get_db_connection()
+    if not conn: return False
+
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        ensure_content_cache_table(conn)
+        cursor.execute(_hash_upsert_sql(), _hash_params(cache_key, content_hash, data))
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Failed to index analysis by hash: {e}")
+        return False
+    finally:
+        _release(conn, cursor)
+
+@timed('db.bulk_save_analysis_hashes')
+def bulk_save_analysis_hashes(entries, chunk_size=200):
+    """Indexes many (cache_key, content_hash, data) entries in the content-hash table."""
+    if not entries: return 0
+    conn = get_db_connection()
+    if not conn: return 0
+
+    saved = 0
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        ensure_content_cache_table(conn)
+        sql = _hash_upsert_sql()
+        for i in range(0, len(entries), chunk_size):
+            chunk = entries[i:i + chunk_size]
+            cursor.executemany(sql, [_hash_params(key, h, d) for key, h, d in chunk])
+            conn.commit()
+            saved += len(chunk)
+        return saved
+    except Exception as e:
+        logger.error(f"Failed to bulk index analyses by hash: {e}")
+        return saved
+    finally:
+        _release(conn, cursor)
+
+# Sort key floors: nullable columns sort on COALESCE(column, floor), so NULLs come first ascending and the
+# keyset seek (a row comparison, which is never true against NULL) does not skip them
+TEXT_FLOOR, NUMBER_FLOOR, YEAR_FLOOR = "''", "-1e18", "0"
+CREATED_FLOOR = datetime(1970, 1, 1)
+TIME_FLOOR = f"TIMESTAMP '{CREATED_FLOOR:%Y-%m-%d %H:%M:%S}'"
+
+def sort_key(column, floor):
+    return f"COALESCE({column}, {floor})"
+
+# Sortable columns exposed by /api/analysis (keys match the data-col ids in database.html): (column, NULL floor)
+SORT_COLUMNS = {
+    'code': ('company_code', TEXT_FLOOR), 'quarter': ('quarter', TEXT_FLOOR), 'year': ('year', YEAR_FLOOR),
+    'type': ('result_type', TEXT_FLOOR), 'sales': ('sales', NUMBER_FLOOR),
+    'sales_qoq': ('revenue_growth_qoq', NUMBER_FLOOR), 'sales_yoy': ('revenue_growth_yoy', NUMBER_FLOOR),
+    'np': ('net_profit', NUMBER_FLOOR), 'np_qoq': ('net_profit_growth_qoq', NUMBER_FLOOR),
+    'np_yoy': ('net_profit_growth_yoy', NUMBER_FLOOR), 'eps': ('eps', NUMBER_FLOOR), 'margin': ('margin', NUMBER_FLOOR),
+    'dividend': ('dividend', NUMBER_FLOOR), 'capex': ('capex', NUMBER_FLOOR),
+    'verdict': ('recommendation_verdict', TEXT_FLOOR), 'date': ('created_at', TIME_FLOOR)
+}
+
+# (name, sort keys) - functional indexes on the same COALESCE expressions the queries use (MySQL 8.0.13+),
+# each ending in id so keyset pagination stays an index range scan. Created by `python -m migrate`.
+ANALYSIS_INDEXES = [
+    ('idx_qa_key_period', ['year', 'quarter']),
+    ('idx_qa_key_company_code', ['code']),
+    ('idx_qa_key_verdict', ['verdict']),
+    ('idx_qa_key_created', ['date']),
+    ('idx_qa_key_sales', ['sales']),
+    ('idx_qa_key_net_profit', ['np']),
+]
+# Earlier plain-column indexes, superseded by the ones above
+RETIRED_INDEXES = ['idx_qa_period', 'idx_qa_company_code', 'idx_qa_verdict', 'idx_qa_created', 'idx_qa_sales',
+                   'idx_qa_net_profit']
+
+LIST_COLUMNS = """
+    id, company_id, company_code, quarter, year, result_type,
+    sales, other_income, total_expenses, operating_profit, pbt, net_profit,
+    margin, eps,
+    revenue_growth_qoq, revenue_growth_yoy,
+    net_profit_growth_qoq, net_profit_growth_yoy,
+    dividend, capex, management_change, special_announcement,
+    recommendation_verdict, created_at
+"""
+
+def _sort_keys(sort):
+    """COALESCE expressions for a /api/analysis sort id (the period sort is year, quarter)."""
+    keys = ['year', 'quarter'] if sort == 'year' else [sort if sort in SORT_COLUMNS else 'year']
+    return [sort_key(*SORT_COLUMNS[k]) for k in keys]
+
+def ensure_analysis_indexes(conn):
+    """
+    Creates the filter/sort indexes used by query_analysis_page and iter_analysis_rows if they are missing
+    and drops retired ones. A schema change: run it from `python -m migrate`, not from a request.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT DISTINCT index_name FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s",
+            (config.DB_TABLE,)
+        )
+        existing = {r[0] for r in cursor.fetchall()}
+        created = []
+        for name, keys in ANALYSIS_INDEXES:
+            if name not in existing:
+                parts = ", ".join(f"({sort_key(*SORT_COLUMNS[k])})" for k in keys)
+                logger.info(f"Creating index {name} on {config.DB_TABLE} ({parts}, id)")
+                cursor.execute(f"CREATE INDEX {name} ON {config.DB_TABLE} ({parts}, id)")
+                created.append(name)
+        for name in RETIRED_INDEXES:
+            if name in existing:
+                logger.info(f"Dropping retired index {name} on {config.DB_TABLE}")
+                cursor.execute(f"DROP INDEX {name} ON {config.DB_TABLE}")
+        conn.commit()
+        return created
+    finally:
+        cursor.close()
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def _decode_cursor(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        return None
+
+def _jsonable(row):
+    out = {}
+    for k, v in row.items():
+        if isinstance(v, Decimal): v = float(v)
+        elif isinstance(v, (datetime, date)): v = v.isoformat(sep=' ') if isinstance(v, datetime) else v.isoformat()
+        out[k] = v
+    return out
+
+@timed('db.query_analysis_page')
+def query_analysis_page(company=None, quarter=None, year=None, verdict=None,
+                        sort='year', direction='desc', limit=50, cursor=None):
+    """
+    Returns one page of analysis rows with filtering, ordering and keyset pagination done in SQL.
+    `cursor` is the opaque `next_cursor` from the previous page. The default sort is the period
+    (year, quarter). Returns {'rows', 'next_cursor', 'total'}; total is only counted on the first page.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {'rows': [], 'next_cursor': None, 'total': 0, 'error': 'Database unavailable'}
+
+    # Sort keys are whitelisted COALESCE expressions, always followed by id as the unique tie-breaker
+    sort_keys = _sort_keys(sort) + ['id']
+    desc = direction.lower() != 'asc'
+    limit = max(1, min(int(limit), 500))
+
+    where, params = [], []
+    if company:
+        where.append("(company_code LIKE %s OR company_id LIKE %s)")
+        params += [f"{company}%", f"{company}%"]
+    # Filters use the indexed key expressions too (same rows as the bare columns for non-NULL values)
+    if quarter:
+        where.append(f"{sort_key(*SORT_COLUMNS['quarter'])} = %s"); params.append(quarter)
+    if year:
+        where.append(f"{sort_key(*SORT_COLUMNS['year'])} = %s"); params.append(int(year))
+    if verdict:
+        where.append(f"{sort_key(*SORT_COLUMNS['verdict'])} LIKE %s"); params.append(f"{verdict}%")
+    filter_sql = " AND ".join(where)
+    filter_params = list(params)
+
+    after = _decode_cursor(cursor) if cursor else None
+    if after and len(after) == len(sort_keys):
+        # Row-constructor comparison lets MySQL seek straight to the first row of the next page
+        where.append(f"({', '.join(sort_keys)}) {'<' if desc else '>'} ({', '.join(['%s'] * len(sort_keys))})")
+        params += after
+
+    db_cursor = None
+    try:
+        db_cursor = conn.cursor(dictionary=True)
+        order = ", ".join(f"{k} {'DESC' if desc else 'ASC'}" for k in sort_keys)
+        # The cursor carries the key values as sorted (floors, not NULLs), selected alongside the row
+        key_cols = ", ".join(f"{k} AS _key{i}" for i, k in enumerate(sort_keys))
+        sql = f"SELECT {LIST_COLUMNS}, {key_cols} FROM {config.DB_TABLE}"
+        if where: sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT %s"
+        db_cursor.execute(sql, (*params, limit + 1))
+        rows = [_jsonable(r) for r in db_cursor.fetchall()]
+        keys = [[r.pop(f"_key{i}") for i in range(len(sort_keys))] for r in rows]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(keys[limit - 1])
+
+        total = None
+        if not cursor:
+            count_sql = f"SELECT COUNT(*) AS n FROM {config.DB_TABLE}" + (f" WHERE {filter_sql}" if filter_sql else "")
+            db_cursor.execute(count_sql, filter_params)
+            total = db_cursor.fetchone()['n']
+
+        return {'rows': rows, 'next_cursor': next_cursor, 'total': total}
+    except Exception as e:
+        logger.error(f"Failed to fetch analysis page: {e}")
+        return {'rows': [], 'next_cursor': None, 'total': 0, 'error': str(e)}
+    finally:
+        _release(conn, db_cursor)
+
+# Columns rewritten by recompute.py; everything else in a row is left untouched
+DERIVED_COLUMNS = [
+    'revenue_growth_qoq', 'revenue_growth_yoy', 'net_profit_growth_qoq', 'net_profit_growth_yoy',
+    'observations', 'recommendation_verdict'
+]
+
+def iter_stored_analyses(batch_size=5000):
+    """
+    Yields batches of stored analyses as dicts (id, company_id, company_code, quarter, year, raw_json),
+    reading the table in id order with keyset pagination so no batch holds a long-running cursor.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    cursor = None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        last_id = 0
+        while True:
+            cursor.execute(
+                f"SELECT id, company_id, company_code, quarter, year, raw_json FROM {config.DB_TABLE} "
+                f"WHERE id > %s AND raw_json IS NOT NULL ORDER BY id LIMIT %s",
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            if not rows: break
+            last_id = rows[-1]['id']
+            yield rows
+    finally:
+        _release(conn, cursor)
+
+@timed('db.bulk_update_derived')
+def bulk_update_derived(rows, chunk_size=500):
+    """
+    Writes recomputed derived fields without touching the extracted figures.
+    Each row is (id, *DERIVED_COLUMNS values, growth_json, observations_json, recommendation_json); the three
+    JSON strings replace those keys inside raw_json. One UPDATE ... JOIN per chunk, one commit per chunk,
+    which also drops stale content-hash copies. Returns the number of rows written.
+    """
+    if not rows: return 0
+    conn = get_db_connection()
+    if not conn:
+        return 0
+
+    cols = ['id', *DERIVED_COLUMNS, 'growth_json', 'observations_json', 'recommendation_json']
+    assignments = ", ".join(f"t.{c} = v.{c}" for c in DERIVED_COLUMNS)
+
+    def update_sql(n):
+        # Derived table of literal rows: portable across MySQL versions (no VALUES ROW(...) needed)
+        first = "SELECT " + ", ".join(f"%s AS {c}" for c in cols)
+        rest = " UNION ALL SELECT " + ", ".join(["%s"] * len(cols))
+        return f"""
+            UPDATE {config.DB_TABLE} t JOIN ({first}{rest * (n - 1)}) v ON t.id = v.id
+            SET {assignments},
+                t.raw_json = JSON_SET(t.raw_json,
+                    '$.growth', CAST(v.growth_json AS JSON),
+                    '$.observations', CAST(v.observations_json AS JSON),
+                    '$.recommendation', CAST(v.recommendation_json AS JSON))
+        """
+
+    # Content-hash copies (unidentified filings) cannot be matched to the rows they came from, so they are
+    # dropped in the same transaction as each rewrite (re-analysis reuses cached AI responses); identified
+    # entries point at the updated rows already
+    drop_copies_sql = f"DELETE FROM {config.DB_HASH_TABLE} WHERE raw_json IS NOT NULL"
+
+    written = 0
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        ensure_content_cache_table(conn)
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            cursor.execute(update_sql(len(chunk)), [v for row in chunk for v in row])
+            cursor.execute(drop_copies_sql)
+            conn.commit()
+            written += len(chunk)
+        return written
+    except Exception as e:
+        logger.error(f"Failed to write recomputed fields: {e}", exc_info=True)
+        return written
+    finally:
+        _release(conn, cursor)
+
+# Table columns exported by snapshot.py, in select order (raw_json last, flattened by the exporter)
+EXPORT_COLUMNS = [c.strip() for c in LIST_COLUMNS.split(',')] + ['raw_json']
+
+def iter_analysis_rows(since=None, settle_seconds=0, chunk_size=5000):
+    """
+    Yields chunks of analysis rows as tuples in EXPORT_COLUMNS order, by (created_at, id), created after the
+    `since` (created_at, id) watermark and at least `settle_seconds` ago by the server clock. Rows stream from an unbuffered (server-side)
+    cursor with fetchmany, so memory holds one chunk however large the table is; the connection is held
+    until the last chunk has been read.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database unavailable")
+
+    # Rows without created_at read as CREATED_FLOOR, so they export first instead of never
+    created = sort_key(*SORT_COLUMNS['date'])
+    where, params = [], []
+    if since:
+        where.append(f"({created}, id) > (%s, %s)"); params += list(since)
+    if settle_seconds:
+        where.append(f"{created} < NOW() - INTERVAL %s SECOND"); params.append(int(settle_seconds))
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM {config.DB_TABLE}"
+    if where: sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {created}, id"
+
+    cursor = None
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows: break
+            yield rows
+    finally:
+        _release(conn, cursor)
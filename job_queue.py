@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from config import config
+from pools import SpawnPool
+
+logger = logging.getLogger(__name__)
+
+# Rough completion percentage reported for each pipeline stage
+STAGE_PROGRESS = {
+    'queued': 0, 'download': 10, 'cache': 20, 'identify': 30,
+    'local': 35, 'scoring': 40, 'parse': 50, 'ai': 65, 'db_save': 90, 'done': 100, 'failed': 100
+}
+
+
+def _connect():
+    conn = sqlite3.connect(config.JOB_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_job_db():
+    """
+    Creates the SQLite job table. WAL mode lets the web workers read while pool workers write.
+    Unfinished jobs of web processes that have exited are marked failed, since their pool died with them.
+    """
+    with _connect() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                http_status INTEGER,
+                owner_pid INTEGER,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # Job tables created before owner_pid existed
+        if 'owner_pid' not in {r['name'] for r in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+    fail_orphaned_jobs()
+
+def _process_alive(pid):
+    """Whether a process with this pid exists (signal 0 on POSIX; elsewhere only this process counts)."""
+    if pid == os.getpid(): return True
+    if os.name != 'posix': return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def fail_orphaned_jobs():
+    """Marks queued/running jobs failed whose owning web process (the one holding their worker pool) is gone."""
+    with _connect() as conn:
+        rows = conn.execute("SELECT id, owner_pid FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+    orphans = [r['id'] for r in rows if r['owner_pid'] is None or not _process_alive(r['owner_pid'])]
+    for job_id in orphans:
+        _fail_unfinished(job_id, "Worker pool exited before the job finished")
+    if orphans:
+        logger.warning(f"⚠️ Marked {len(orphans)} orphaned jobs as failed")
+    return len(orphans)
+
+def _fail_unfinished(job_id, message):
+    """Fails a job that is still queued or running; finished jobs keep their result."""
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', stage = 'failed', progress = 100, message = ?, result = ?, http_status = 503, "
+            "updated_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+            (message, json.dumps({'error': message}), time.time(), job_id)
+        )
+
+def create_job():
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, stage, progress, message, owner_pid, created_at, updated_at) "
+            "VALUES (?, 'queued', 'queued', 0, 'Waiting for a worker', ?, ?, ?)",
+            (job_id, os.getpid(), now, now)
+        )
+    return job_id
+
+def update_job(job_id, **fields):
+    fields['updated_at'] = time.time()
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+def get_job(job_id):
+    """Returns the job as a dict (result decoded from JSON), or None if unknown."""
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if not row:
+        return None
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def _run_job(job_id, kwargs):
+    """Worker-process entry point: runs the analysis pipeline and records progress in SQLite."""
+    from pipeline import run_analysis
+
+    def progress(stage, message):
+        update_job(job_id, status='running', stage=stage, progress=STAGE_PROGRESS.get(stage, 0), message=message)
+
+    progress('cache', "Job picked up by worker")
+    try:
+        data, status = run_analysis(progress=progress, **kwargs)
+    except Exception as e:
+        logger.error(f"Job {job_id} crashed: {e}", exc_info=True)
+        data, status = {'error': f'Analysis failed: {e}'}, 500
+
+    ok = status == 200
+    update_job(
+        job_id,
+        status='done' if ok else 'failed',
+        stage='done' if ok else 'failed',
+        progress=100,
+        message='Analysis completed' if ok else data.get('error'),
+        result=json.dumps(data),
+        http_status=status
+    )
+
+def _run_batch_job(job_id, sources, options, workers, cleanup_dir=None):
+    """
+    Worker-process entry point for /batch: runs batch.run_batch and stores the manifest as the result.
+    `cleanup_dir` (the request's uploaded zip files) is removed once the batch is over.
+    """
+    from batch import run_batch
+
+    def progress(done, total, entry):
+        update_job(job_id, status='running', stage='batch', progress=int(done * 100 / max(total, 1)),
+                   message=f"{done}/{total} filings processed (last: {entry.get('source')})")
+
+    update_job(job_id, status='running', stage='batch', message="Batch picked up by worker")
+    try:
+        manifest = run_batch(sources, options, workers=workers, progress=progress)
+        update_job(job_id, status='done', stage='done', progress=100,
+                   message=f"{manifest['succeeded']} ok, {manifest['failed']} failed",
+                   result=json.dumps(manifest), http_status=200)
+    except Exception as e:
+        logger.error(f"Batch job {job_id} crashed: {e}", exc_info=True)
+        update_job(job_id, status='failed', stage='failed', progress=100, message=str(e),
+                   result=json.dumps({'error': f'Batch failed: {e}'}), http_status=500)
+    finally:
+        if cleanup_dir: shutil.rmtree(cleanup_dir, ignore_errors=True)
+
+def _run_snapshot_job(job_id, full):
+    """Worker-process entry point for /admin/snapshot: runs snapshot.export_snapshot and stores its summary."""
+    from snapshot import export_snapshot
+
+    update_job(job_id, status='running', stage='snapshot', progress=10, message="Snapshot export picked up by worker")
+    try:
+        summary = export_snapshot(full=full)
+        update_job(job_id, status='done', stage='done', progress=100,
+                   message=f"{summary['rows']} rows exported to {summary['files']} files",
+                   result=json.dumps(summary), http_status=200)
+    except Exception as e:
+        # RuntimeError: database unavailable or another export holds the lock
+        logger.error(f"Snapshot job {job_id} failed: {e}", exc_info=not isinstance(e, RuntimeError))
+        update_job(job_id, status='failed', stage='failed', progress=100, message=str(e),
+                   result=json.dumps({'error': f'Snapshot failed: {e}'}),
+                   http_status=503 if isinstance(e, RuntimeError) else 500)
+
+def _init_worker(share):
+    from ai_client import set_rate_share
+    # Each job process runs its own AI executor, with an equal part of the limits the web process leaves
+    set_rate_share(share)
+
+_executor = SpawnPool('analysis worker', initializer=_init_worker, on_start=init_job_db)
+
+def _get_executor(broken=None):
+    """Returns the worker pool; pass `broken` to replace it (its unfinished jobs are failed by _watch)."""
+    share = max(1.0 - config.OPENAI_WEB_SHARE, 0.0) / config.JOB_WORKERS
+    return _executor.get(config.JOB_WORKERS, initargs=(share,), broken=broken)
+
+def _watch(job_id, future, cleanup_dir=None):
+    """Fails the job if its task never reports back: worker process died (broken pool) or pool shut down first."""
+    def done(fut):
+        if fut.cancelled():
+            message = "Worker pool shut down before the job ran"
+        elif fut.exception() is not None:
+            message = f"Worker process failed: {fut.exception()!r}"
+        else:
+            return
+        _fail_unfinished(job_id, message)
+        if cleanup_dir: shutil.rmtree(cleanup_dir, ignore_errors=True)
+    future.add_done_callback(done)
+
+def _task(fn, *args):
+    """Pool task wrapper: runs fn, then hands the worker's span histograms to the shared metrics store."""
+    from timings import flush_metrics
+    try:
+        return fn(*args)
+    finally:
+        flush_metrics()
+
+def _submit(fn, *args, cleanup_dir=None):
+    """
+    Creates a job and queues fn(job_id, *args) on the worker pool, replacing the pool and retrying once
+    if it turns out to be broken. Returns the job id; `cleanup_dir` is removed if the task is lost.
+    """
+    executor = _get_executor()
+    job_id = create_job()
+    try:
+        try:
+            future = executor.submit(_task, fn, job_id, *args)
+        except BrokenProcessPool:
+            future = _get_executor(broken=executor).submit(_task, fn, job_id, *args)
+    except Exception as e:
+        if cleanup_dir: shutil.rmtree(cleanup_dir, ignore_errors=True)
+        update_job(job_id, status='failed', stage='failed', progress=100, message=f"Could not queue job: {e}", http_status=503)
+        raise
+    _watch(job_id, future, cleanup_dir)
+    return job_id
+
+def submit_analysis(**kwargs):
+    """
+    Queues a pipeline.run_analysis call on the worker pool and returns its job id.
+    The API key travels with the task only; it is never written to the job table.
+    """
+    job_id = _submit(_run_job, kwargs)
+    logger.info(f"Queued analysis job {job_id}")
+    return job_id
+
+def submit_batch(sources, options, workers=None, cleanup_dir=None):
+    """
+    Queues a batch run; the batch itself fans out over its own process pool inside the job.
+    `cleanup_dir` is deleted when the job finishes (or cannot be queued).
+    """
+    job_id = _submit(_run_batch_job, sources, options, workers, cleanup_dir, cleanup_dir=cleanup_dir)
+    logger.info(f"Queued batch job {job_id} ({len(sources)} inputs)")
+    return job_id
+
+def submit_snapshot(full=False):
+    """Queues a snapshot export (full=True rebuilds it) and returns its job id."""
+    job_id = _submit(_run_snapshot_job, full)
+    logger.info(f"Queued snapshot job {job_id} ({'full' if full else 'incremental'})")
+    return job_id
+
+def shutdown():
+    _executor.shutdown()
@@ -0,0 +1,39 @@
+"""
+One-off schema setup for the analysis tables, run on deploy (the Procfile release phase) rather than from requests.
+
+Creates the functional sort/filter indexes used by /api/analysis and the snapshot export (MySQL 8.0.13+),
+drops the plain-column indexes they replace, and creates the content-hash table (or turns an older one that
+kept a full raw_json copy per entry into pointers at DB_TABLE rows). Safe to run repeatedly.
+
+Usage:
+    python -m migrate
+"""
+import logging
+from config import config
+from database_utils import ensure_analysis_indexes, ensure_content_cache_table, get_db_connection, upgrade_content_cache_table
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    conn = get_db_connection()
+    if not conn:
+        logger.error("❌ Database unavailable, nothing migrated")
+        return 1
+    try:
+        ensure_content_cache_table(conn)
+        dropped = upgrade_content_cache_table(conn)
+        if dropped:
+            logger.info(f"🧹 Dropped {dropped} duplicated raw_json copies from {config.DB_HASH_TABLE}")
+        created = ensure_analysis_indexes(conn)
+        logger.info(f"✅ {config.DB_TABLE} indexes ready ({len(created)} created)")
+        return 0
+    except Exception as e:
+        logger.error(f"❌ Migration failed: {e}")
+        return 1
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,36 +1,74 @@
 import logging
-import base64
 import json
-from io import BytesIO
-from openai import OpenAI
 import fitz  # PyMuPDF
-import logging
-import base64
-import json
-from io import BytesIO
-from openai import OpenAI
-import fitz  # PyMuPDF
-from PIL import Image
+from ai_client import get_ai_executor
+from page_render import render_pages
+from ai_cache import response_key, get_response, save_response
+from analyzer import LocalAnalyzer, LABEL_MATCHER, IDENTIFIER_LINE_RE, normalize
+from page_cache import PageTextCache
+from config import config
+from timings import span, timed
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def analyze_with_openai(pdf_path, api_key, max_pages=10, include_corp_actions=False, include_observations=False, include_recommendations=False):
+# 'auto' sends the rebuilt table text when the text layer holds the table, page images otherwise
+AI_INPUTS = ('auto', 'vision')
+
+# The text layer is trusted once the selected pages yield this many metric rows with figures
+MIN_TEXT_METRIC_ROWS = 3
+
+def table_grid_text(pdf_path, page_nums, pages):
+    """
+    Serializes the rows LocalAnalyzer.get_rows rebuilds on `page_nums` as compact grid text: a
+    '## Page N' header, then one line per row with its cells joined by ' | '. When page 1 is not
+    among them, its first row and scrip code / symbol rows are sent as a header block.
+    Returns (text, metric_rows) where metric_rows counts labelled rows that carry figures.
+    """
+    analyzer = LocalAnalyzer(pdf_path, pages=pages)
+    blocks, metric_rows = [], 0
+    if page_nums and page_nums[0] != 0:
+        rows = [" | ".join(t for t, _ in r) for r in analyzer.get_rows(pages.words(0), sep=" ")]
+        header = rows[:1] + [r for r in rows[1:] if IDENTIFIER_LINE_RE.search(r)]
+        blocks.append("## Page 1 (header)\n" + "\n".join(header))
+    for n in page_nums:
+        lines = []
+        for r in analyzer.get_rows(pages.words(n), sep=" "):
+            cells = [t for t, _ in r]
+            lines.append(" | ".join(cells))
+            if analyzer.parse_val(cells[0]) is None and any(analyzer.parse_val(c) is not None for c in cells[1:]):
+                if LABEL_MATCHER.match(normalize(cells[0]))[0]: metric_rows += 1
+        blocks.append(f"## Page {n + 1}\n" + "\n".join(lines))
+    return "\n\n".join(blocks), metric_rows
+
+@timed('ai')
+def analyze_with_openai(pdf_path, api_key, max_pages=10, include_corp_actions=False, include_observations=False, include_recommendations=False, pages=None, progress=None, log_callback=None, use_cache=True, ai_input=None):
     """
-    Analyzes a financial PDF using OpenAI GPT-4 Vision API.
+    Analyzes a financial PDF using OpenAI GPT-4o.
+    With ai_input 'auto' (default: config.AI_INPUT) the selected pages go to the model as grid text rebuilt
+    from the text layer, and as page images only when that text does not hold the table (scanned or
+    image-only pages); 'vision' always sends images. The result's `ai_input` says which was used.
+    If a PageTextCache is passed as `pages`, page scoring reuses the text it already holds and reads the
+    other pages with fitz.
+    `progress(stage, message)` and `log_callback(message)` receive stage changes and log lines as they happen.
+    Responses are cached by model, prompt text and page image hashes; use_cache=False skips the lookup (the fresh
+    response still replaces the cached one). A cache hit sets `ai_cache_hit` and `ai_tokens_saved`.
     """
     debug_logs = []
     def log(msg):
         logger.info(msg)
         debug_logs.append(msg)
+        if log_callback: log_callback(msg)
+
+    def report(stage, message):
+        if progress: progress(stage, message)
 
     log(f"🚀 Starting OpenAI analysis for: {pdf_path}")
+    ai_input = ai_input or config.AI_INPUT
+    owns_pages = False
     
     try:
-        # Initialize OpenAI client
-        client = OpenAI(api_key=api_key)
-        
         # Open PDF
         log(f"📂 Opening PDF for smart page selection: {pdf_path}")
         doc = fitz.open(pdf_path)
@@ -38,7 +76,11 @@ def analyze_with_openai(pdf_path, api_key, max_pages=10, include_corp_actions=Fa
         # 1. Smart Page Selection Logic
         page_scores = []
         for i, page in enumerate(doc):
-            text = page.get_text().lower()
+            # Reuse text the local pass already extracted; the rest is read with fitz, which is far cheaper
+            # than extracting every page through the cache's (possibly pdfplumber) backend
+            text = pages.cached_text(i) if pages is not None else None
+            if text is None: text = page.get_text()
+            text = text.lower()
             score = 0
             
             # Keywords that indicate a financial results table
@@ -76,25 +118,27 @@ def analyze_with_openai(pdf_path, api_key, max_pages=10, include_corp_actions=Fa
             selected_pages.sort()
             log(f"✅ Smart selection picked {len(selected_pages)} pages for AI: {[p+1 for p in selected_pages]}")
 
-        # 2. Convert selected pages to images
-        image_data_urls = []
-        for page_num in selected_pages:
-            page = doc[page_num]
-            mat = fitz.Matrix(150/72, 150/72) # Higher DPI for better table reading
-            pix = page.get_pixmap(matrix=mat)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            if img.width > 2000 or img.height > 2000:
-                img.thumbnail((2000, 2000), Image.Resampling.LANCZOS)
-            buffered = BytesIO()
-            img.save(buffered, format="JPEG", quality=85)
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            image_data_urls.append(f"data:image/jpeg;base64,{img_str}")
-            log(f"📸 Encoded Page {page_num + 1} for AI analysis")
-            del pix
-            del img
-        
         doc.close()
         
+        # 2. Prefer the text layer: rebuilt table rows are a fraction of the tokens of page images
+        table_text = None
+        if ai_input != 'vision':
+            if pages is None:
+                pages, owns_pages = PageTextCache(pdf_path, backend='fitz'), True
+            with span('ai.table_text'):
+                table_text, metric_rows = table_grid_text(pdf_path, selected_pages, pages)
+            if metric_rows >= MIN_TEXT_METRIC_ROWS:
+                log(f"📝 Text layer holds {metric_rows} metric rows; sending table text ({len(table_text)} chars) instead of images")
+            else:
+                log(f"🖼️ Text layer has only {metric_rows} metric rows (scanned or image-only pages); sending page images")
+                table_text = None
+        
+        # 3. Otherwise convert selected pages to images (cached on disk; misses rendered on the render pool)
+        image_data_urls = []
+        if table_text is None:
+            with span('ai.render'):
+                image_data_urls = render_pages(pdf_path, selected_pages, log=log)
+        
         # Construct the prompt
         # ... (prompt construction same as before)
         optional_instructions = ""
@@ -108,7 +152,13 @@ def analyze_with_openai(pdf_path, api_key, max_pages=10, include_corp_actions=Fa
         if include_recommendations:
             optional_instructions += "\n- Provide a Recommendation (verdict, color, reasons) based on the results."
 
-        prompt = f"""You are a professional financial data extractor. Analyze the attached quarterly results PDF.
+        if table_text is not None:
+            source = ("Analyze the quarterly results PDF below, rebuilt from its text layer: one line per table row, "
+                      "cells separated by \" | \", figures in the order of the column headers.")
+        else:
+            source = "Analyze the attached quarterly results PDF."
+
+        prompt = f"""You are a professional financial data extractor. {source}
 
 CRITICAL INSTRUCTIONS:
 1. If both "Consolidated" and "Standalone" results are present, ONLY extract the CONSOLIDATED results.
@@ -152,6 +202,9 @@ IMPORTANT: Return ONLY valid JSON in this exact format:
 }}
 """
         
+        if table_text is not None:
+            prompt += f"\nPDF TEXT:\n{table_text}\n"
+        
         # Prepare messages with images
         content = [{"type": "text", "text": prompt}]
         for img_url in image_data_urls:
@@ -160,24 +213,46 @@ IMPORTANT: Return ONLY valid JSON in this exact format:
                 "image_url": {"url": img_url, "detail": "high"}
             })
         
-        log("📡 Sending request to OpenAI GPT-4 Vision API...")
+        request = {
+            "model": "gpt-4o",
+            "messages": [{"role": "user", "content": content}],
+            "response_format": {"type": "json_object"},  # Force JSON output
+            "max_tokens": 2000,
+            "temperature": 0
+        }
+        cache_key = response_key(request)
+        with span('ai.cache'):
+            cached = get_response(cache_key) if use_cache else None
         
-        # Call OpenAI API with JSON mode
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": content}],
-            response_format={"type": "json_object"},  # Force JSON output
-            max_tokens=2000,
-            temperature=0
-        )
-        
-        # Extract response
-        result_text = response.choices[0].message.content.strip()
-        log(f"📥 Received response from OpenAI (length: {len(result_text)} chars)")
+        if cached:
+            result_text = cached['content']
+            log(f"♻️ Reusing cached OpenAI response ({cached['total_tokens']} tokens saved)")
+        else:
+            if table_text is not None:
+                log("📡 Sending request to OpenAI GPT-4o (text only)...")
+                report('ai', f"Waiting for OpenAI ({len(selected_pages)} pages as text)")
+            else:
+                log("📡 Sending request to OpenAI GPT-4 Vision API...")
+                report('ai', f"Waiting for OpenAI ({len(image_data_urls)} page images)")
+            
+            # Call OpenAI API with JSON mode (rate-limited and retried by the shared AI executor)
+            with span('ai.request'):
+                response = get_ai_executor().chat(api_key, log=log, **request)
+            
+            # Extract response
+            result_text = response.choices[0].message.content.strip()
+            log(f"📥 Received response from OpenAI (length: {len(result_text)} chars)")
         
         # Parse JSON
         try:
             analysis = json.loads(result_text)
+            analysis['ai_input'] = 'text' if table_text is not None else 'vision'
+            if cached:
+                analysis['ai_cache_hit'] = True
+                analysis['ai_tokens_saved'] = cached['total_tokens']
+            else:
+                # Only responses that parse are cached, so a retry after a parse error asks the model again
+                save_response(cache_key, request['model'], result_text, response.usage)
             analysis['debug_logs'] = debug_logs
             log("✨ Successfully parsed AI response")
             return analysis
@@ -191,4 +266,6 @@ IMPORTANT: Return ONLY valid JSON in this exact format:
     except Exception as e:
         log(f"❌ Error during OpenAI analysis: {e}")
         return {"error": str(e), "debug_logs": debug_logs}
-
+    finally:
+        if owns_pages:
+            pages.close()
@@ -0,0 +1,130 @@
+import logging
+import pdfplumber
+from config import config
+from timings import span
+
+logger = logging.getLogger(__name__)
+
+class PdfplumberBackend:
+    """Reference text/word backend: pdfplumber's layout-aware extraction (pure Python, slower)."""
+    name = 'pdfplumber'
+
+    def __init__(self, pdf_path):
+        self._pdf = pdfplumber.open(pdf_path)
+
+    def page_count(self):
+        return len(self._pdf.pages)
+
+    def text(self, idx):
+        return self._pdf.pages[idx].extract_text() or ""
+
+    def words(self, idx):
+        words = self._pdf.pages[idx].extract_words(x_tolerance=2, y_tolerance=2)
+        return [{'text': w['text'], 'x0': w['x0'], 'x1': w['x1'], 'top': w['top']} for w in words]
+
+    def close(self):
+        self._pdf.close()
+
+class FitzBackend:
+    """
+    PyMuPDF backend. Produces the same word dicts (text, x0, x1, top) as pdfplumber;
+    both libraries measure `top` from the top edge of the page.
+    """
+    name = 'fitz'
+
+    def __init__(self, pdf_path):
+        import fitz  # PyMuPDF
+        self._doc = fitz.open(pdf_path)
+
+    def page_count(self):
+        return self._doc.page_count
+
+    def text(self, idx):
+        # sort=True orders blocks top-to-bottom, left-to-right like pdfplumber's line output
+        return self._doc[idx].get_text("text", sort=True) or ""
+
+    def words(self, idx):
+        # Tuples are (x0, y0, x1, y1, word, block_no, line_no, word_no)
+        return [{'text': w[4], 'x0': w[0], 'x1': w[2], 'top': w[1]}
+                for w in self._doc[idx].get_text("words", sort=True)]
+
+    def close(self):
+        self._doc.close()
+
+TEXT_BACKENDS = {b.name: b for b in (PdfplumberBackend, FitzBackend)}
+
+def get_text_backend(name=None):
+    """Returns the backend class for `name` (default: config.TEXT_BACKEND)."""
+    name = (name or config.TEXT_BACKEND).lower()
+    if name not in TEXT_BACKENDS:
+        raise ValueError(f"Unknown text backend '{name}' (choose from {', '.join(TEXT_BACKENDS)})")
+    return TEXT_BACKENDS[name]
+
+class PageTextCache:
+    """
+    Per-document cache of page text and words.
+    Opens the PDF once and extracts each page's text/words lazily, at most once,
+    so the identifier scan, LocalAnalyzer and the AI page scoring share the same work.
+    `backend` picks the extraction library ('pdfplumber' or 'fitz', default from config).
+    """
+    def __init__(self, pdf_path, backend=None):
+        self.path = pdf_path
+        self.backend_cls = get_text_backend(backend)
+        self._doc = None
+        self._len = None
+        self._text = {}
+        self._words = {}
+
+    @property
+    def backend(self):
+        return self.backend_cls.name
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            self._doc = self.backend_cls(self.path)
+        return self._doc
+
+    def __len__(self):
+        if self._len is None:
+            self._len = self.doc.page_count()
+        return self._len
+
+    def text(self, idx):
+        """Returns the extracted text of page `idx` ('' when the page has no text layer)."""
+        if idx not in self._text:
+            with span('pdf.text'):
+                self._text[idx] = self.doc.text(idx)
+        return self._text[idx]
+
+    def cached_text(self, idx):
+        """Returns the text of page `idx` if it was already extracted, else None (never extracts)."""
+        return self._text.get(idx)
+
+    def words(self, idx):
+        """Returns the positioned words of page `idx` as dicts with text, x0, x1 and top."""
+        if idx not in self._words:
+            with span('pdf.words'):
+                self._words[idx] = self.doc.words(idx)
+        return self._words[idx]
+
+    def prime(self, idx, text=None, words=None):
+        """Stores text/words for page `idx` that were extracted elsewhere (e.g. in a worker process)."""
+        if text is not None: self._text.setdefault(idx, text)
+        if words is not None: self._words.setdefault(idx, words)
+
+    def joined_text(self, start=0, stop=None, sep=""):
+        """Concatenates the text of pages [start, stop)."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        return sep.join(self.text(i) for i in range(start, stop))
+
+    def close(self):
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
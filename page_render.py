@@ -0,0 +1,204 @@
+import base64
+import logging
+import os
+import re
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import fitz  # PyMuPDF
+from PIL import Image
+from config import config
+from pdf_store import file_hash
+from pools import SpawnPool
+
+logger = logging.getLogger(__name__)
+
+BASE_DPI = 150
+MAX_PX = 2000
+JPEG_QUALITY = 85
+
+# Table region detection: header lines above the first metric row, identifier lines anywhere on the page
+_TABLE_HEADER_RE = re.compile(
+    r"particulars|quarter ended|year ended|months ended|half year|\b(?:un)?audited\b|statement of|financial results"
+    r"|lakh|crore|\b\d{1,2}[./-]\d{1,2}[./-]\d{2,4}\b|\b(?:jun|sep|dec|mar)[a-z]*[ ,.-]+\d{1,2}[ ,.-]+20\d{2}\b", re.I)
+_DIGIT_RE = re.compile(r"\d")
+MIN_METRIC_ROWS = 3
+MAX_LABEL_CHARS = 80     # longer lines are prose (notes, letterhead), not row labels
+MAX_ROW_GAP = 120        # points between metric rows of the same table
+MAX_HEADER_GAP = 120     # points between stacked header lines (further up is letterhead)
+CLIP_PADDING = 12        # points kept around the detected region
+MAX_CLIP_AREA = 0.85     # crops that keep more of the page than this are not worth it
+
+def render_dpi(page_rect, base_dpi=BASE_DPI, max_px=MAX_PX):
+    """Highest DPI up to `base_dpi` at which the page's longer side stays within `max_px` pixels."""
+    longest_pt = max(page_rect.width, page_rect.height)
+    return max(1, min(base_dpi, int(max_px * 72 / longest_pt)))
+
+def _text_lines(page):
+    """Text lines of a page as (Rect, text), top to bottom, from PyMuPDF's word list."""
+    lines = {}
+    for x0, y0, x1, y1, word, block, line, _ in page.get_text("words"):
+        rect, words = lines.setdefault((block, line), (fitz.Rect(x0, y0, x1, y1), []))
+        rect |= (x0, y0, x1, y1)
+        words.append(word)
+    return sorted(((rect, " ".join(words)) for rect, words in lines.values()), key=lambda l: (l[0].y0, l[0].x0))
+
+def table_clip(page):
+    """
+    Bounding box of the financial results table: from the statement title / "Particulars" / period
+    headers down to the last metric row (plus any scrip code or symbol lines, which the model reads too).
+    Returns None when no table is found (e.g. scanned pages) or the crop would keep most of the page.
+    """
+    from analyzer import LABEL_MATCHER, IDENTIFIER_LINE_RE, normalize
+    lines = _text_lines(page)
+    figures = [rect for rect, text in lines if _DIGIT_RE.search(text)]
+
+    def has_figures(label):
+        mid = (label.y0 + label.y1) / 2
+        return any(r.y0 <= mid <= r.y1 and r.x0 >= label.x0 for r in figures)
+
+    # Metric rows are short labels with figures on the same row; the table is the largest run of them
+    rows = [rect for rect, text in lines if len(text) <= MAX_LABEL_CHARS
+            and LABEL_MATCHER.match(normalize(text))[0] and has_figures(rect)]
+    runs = []
+    for rect in rows:
+        if runs and rect.y0 - runs[-1][-1].y1 <= MAX_ROW_GAP:
+            runs[-1].append(rect)
+        else:
+            runs.append([rect])
+    metric_rows = max(runs, key=len, default=[])
+    if len(metric_rows) < MIN_METRIC_ROWS:
+        return None
+    top, bottom = metric_rows[0].y0, max(r.y1 for r in metric_rows)
+    # Walk up from the first metric row through stacked header lines
+    for rect, text in reversed([l for l in lines if l[0].y1 <= top]):
+        if top - rect.y1 > MAX_HEADER_GAP: break
+        if _TABLE_HEADER_RE.search(text): top = rect.y0
+    region = fitz.Rect(page.rect.x0, top, page.rect.x1, bottom)
+    for rect, text in lines:
+        if IDENTIFIER_LINE_RE.search(text): region |= rect
+    band = [rect for rect, _ in lines if region.y0 <= (rect.y0 + rect.y1) / 2 <= region.y1]
+    region.x0, region.x1 = min(r.x0 for r in band), max(r.x1 for r in band)
+    clip = (region + (-CLIP_PADDING, -CLIP_PADDING, CLIP_PADDING, CLIP_PADDING)) & page.rect
+    if clip.get_area() > MAX_CLIP_AREA * page.rect.get_area():
+        return None
+    return clip
+
+def _render(doc, page_num, dpi, clip=None):
+    zoom = dpi / 72
+    pix = doc[page_num].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False,
+                                   clip=fitz.Rect(clip) if clip else None)
+    # Wrap the pixmap memory without copying and encode with Pillow's libjpeg-turbo
+    # (several times faster than MuPDF's own JPEG writer); no resize pass since the DPI already fits
+    img = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=JPEG_QUALITY)
+    return buf.getvalue()
+
+def _render_pages(pdf_path, jobs):
+    """Pool task: opens the PDF once and renders [(page_num, dpi, clip)] to JPEG bytes in order."""
+    with fitz.open(pdf_path) as doc:
+        return [_render(doc, page_num, dpi, clip) for page_num, dpi, clip in jobs]
+
+def _cache_path(content_hash, page_num, dpi, clip=None):
+    region = "_clip" + "-".join(str(round(v)) for v in clip) if clip else ""
+    return os.path.join(config.RENDER_CACHE_DIR, f"{content_hash}_p{page_num}_{dpi}dpi{region}.jpg")
+
+def _read_cached(path):
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)  # mtime doubles as last-used time for pruning
+        return data
+    except OSError:
+        return None
+
+def _write_cached(path, data):
+    tmp = f"{path}.{os.getpid()}.part"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Could not write render cache entry {path}: {e}")
+
+def prune_render_cache(max_bytes=None):
+    """Deletes the least recently used cached renders until the cache fits in `max_bytes`."""
+    max_bytes = max_bytes if max_bytes is not None else config.RENDER_CACHE_MAX_MB * 1024 * 1024
+    try:
+        entries = [e for e in os.scandir(config.RENDER_CACHE_DIR) if e.is_file() and e.name.endswith('.jpg')]
+    except FileNotFoundError:
+        return 0
+    stats = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+    total = sum(size for _, size, _ in stats)
+    removed = 0
+    for _, size, path in sorted(stats):
+        if total <= max_bytes: break
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+def render_pages(pdf_path, page_nums, content_hash=None, log=None, crop=None):
+    """
+    Renders pages to base64 JPEG data URLs (in `page_nums` order) at the DPI that fits MAX_PX.
+    With crop (default AI_CROP_TABLES) each page is clipped to its results table when one is detected.
+    Renders are cached on disk by file hash, page, DPI and clip; misses are rendered on the render pool.
+    """
+    content_hash = content_hash or file_hash(pdf_path)
+    crop = config.AI_CROP_TABLES if crop is None else crop
+    with fitz.open(pdf_path) as doc:
+        clips = [table_clip(doc[n]) if crop else None for n in page_nums]
+        dpis = [render_dpi(clip or doc[n].rect) for n, clip in zip(page_nums, clips)]
+    clips = [tuple(clip) if clip else None for clip in clips]
+    jobs = list(zip(page_nums, dpis, clips))
+
+    images = {}
+    if config.RENDER_CACHE_DIR:
+        os.makedirs(config.RENDER_CACHE_DIR, exist_ok=True)
+        for n, dpi, clip in jobs:
+            data = _read_cached(_cache_path(content_hash, n, dpi, clip))
+            if data is not None: images[n] = data
+    missing = [job for job in jobs if job[0] not in images]
+    if images and log: log(f"♻️ Reusing {len(images)} cached page renders")
+
+    if missing:
+        workers = min(config.RENDER_WORKERS, len(missing))
+        if workers > 1:
+            # One task per worker; each opens the PDF itself and renders its share of the pages
+            shares = [missing[i::workers] for i in range(workers)]
+            pool = get_render_pool()
+            try:
+                rendered = [fut.result() for fut in [pool.submit(_render_pages, pdf_path, share) for share in shares]]
+            except BrokenProcessPool:
+                # A render process died (e.g. killed for memory): start a fresh pool and try once more
+                pool = get_render_pool(broken=pool)
+                rendered = [fut.result() for fut in [pool.submit(_render_pages, pdf_path, share) for share in shares]]
+            for share, results in zip(shares, rendered):
+                for (n, _, _), data in zip(share, results):
+                    images[n] = data
+        else:
+            for (n, _, _), data in zip(missing, _render_pages(pdf_path, missing)):
+                images[n] = data
+        if config.RENDER_CACHE_DIR:
+            for n, dpi, clip in missing:
+                _write_cached(_cache_path(content_hash, n, dpi, clip), images[n])
+            prune_render_cache()
+
+    urls = []
+    for n, dpi, clip in jobs:
+        urls.append(f"data:image/jpeg;base64,{base64.b64encode(images[n]).decode()}")
+        region = " cropped to results table" if clip else ""
+        if log: log(f"📸 Encoded Page {n + 1} for AI analysis ({dpi} DPI{region})")
+    return urls
+
+_pool = SpawnPool('page render')
+
+def get_render_pool(broken=None):
+    """Returns the process-wide render pool with RENDER_WORKERS processes (see pools.SpawnPool)."""
+    return _pool.get(config.RENDER_WORKERS, broken=broken)
+
+def shutdown_render_pool():
+    _pool.shutdown()
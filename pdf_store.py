@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from cache_utils import CHUNK_SIZE, sha256_file
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Stored PDFs are named by the SHA-256 of their bytes
+STORE_FILE_RE = re.compile(r"^([0-9a-f]{64})\.pdf$")
+
+class PdfTooLarge(ValueError):
+    """An upload or download went past MAX_PDF_MB; the partial file has been removed."""
+    def __init__(self, max_bytes):
+        super().__init__(f"PDF exceeds the {max_bytes // (1024 * 1024)} MB size limit")
+        self.max_bytes = max_bytes
+
+def max_pdf_bytes():
+    return config.MAX_PDF_MB * 1024 * 1024
+
+def store_chunks(chunks, max_bytes=None):
+    """
+    Writes an iterable of byte chunks to a temp file of its own in PDF_STORE_DIR, hashing as it goes,
+    then moves it to <sha256>.pdf. Returns (path, sha256). Raises PdfTooLarge once more than `max_bytes`
+    (default MAX_PDF_MB) have arrived, so oversized inputs are never fully written or held in memory.
+    """
+    max_bytes = max_bytes if max_bytes is not None else max_pdf_bytes()
+    os.makedirs(config.PDF_STORE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='incoming_', suffix='.part', dir=config.PDF_STORE_DIR)
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PdfTooLarge(max_bytes)
+                h.update(chunk)
+                f.write(chunk)
+        content_hash = h.hexdigest()
+        path = _commit(tmp_path, content_hash)
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+    logger.info(f"📥 Stored {size / 1024 / 1024:.1f} MB PDF as {content_hash[:12]}")
+    prune_store(keep=path)
+    return path, content_hash
+
+def store_stream(stream, max_bytes=None):
+    """store_chunks() over a binary file-like object (e.g. an upload's stream), read CHUNK_SIZE at a time."""
+    return store_chunks(iter(lambda: stream.read(CHUNK_SIZE), b''), max_bytes)
+
+def store_file(path, max_bytes=None):
+    """
+    Moves a finished file from incoming_path() (e.g. a browser download) into the store: one hashing pass,
+    then a rename. Returns (path, sha256); the file is removed when it is over `max_bytes`.
+    """
+    max_bytes = max_bytes if max_bytes is not None else max_pdf_bytes()
+    try:
+        if os.path.getsize(path) > max_bytes:
+            raise PdfTooLarge(max_bytes)
+        content_hash = sha256_file(path)
+        stored = _commit(path, content_hash)
+    except BaseException:
+        _remove_quietly(path)
+        raise
+    prune_store(keep=stored)
+    return stored, content_hash
+
+def incoming_path():
+    """A fresh path in PDF_STORE_DIR for writers that need a file name rather than chunks; pass it to store_file()."""
+    os.makedirs(config.PDF_STORE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix='incoming_', suffix='.part', dir=config.PDF_STORE_DIR)
+    os.close(fd)
+    return path
+
+def _commit(tmp_path, content_hash):
+    path = os.path.join(config.PDF_STORE_DIR, f"{content_hash}.pdf")
+    try:
+        # Same bytes already stored: keep that copy and mark it used
+        os.utime(path)
+        _remove_quietly(tmp_path)
+    except FileNotFoundError:
+        os.replace(tmp_path, path)
+    return path
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def stored_hash(path):
+    """The content hash of a file inside the store (from its name), or None for any other path."""
+    match = STORE_FILE_RE.match(os.path.basename(path))
+    if match and os.path.dirname(os.path.realpath(path)) == os.path.realpath(config.PDF_STORE_DIR):
+        return match.group(1)
+    return None
+
+def file_hash(path):
+    """SHA-256 of a PDF, free for stored files (hashed while they were written), else read from disk."""
+    return stored_hash(path) or sha256_file(path)
+
+def prune_store(max_bytes=None, keep=None):
+    """
+    Deletes the least recently used stored PDFs until the store fits in `max_bytes` (default PDF_STORE_MAX_MB).
+    Files stored or reused within PDF_STORE_MIN_AGE_SECONDS are kept, so queued and running analyses keep their
+    input, and so is `keep` (the file just stored).
+    Leftover temp files of writers that died are removed once they are that old too.
+    """
+    max_bytes = max_bytes if max_bytes is not None else config.PDF_STORE_MAX_MB * 1024 * 1024
+    cutoff = time.time() - config.PDF_STORE_MIN_AGE_SECONDS
+    try:
+        entries = list(os.scandir(config.PDF_STORE_DIR))
+    except FileNotFoundError:
+        return 0
+    stats = []
+    for e in entries:
+        try:
+            st = e.stat()
+        except OSError:
+            continue
+        if e.name.endswith('.part'):
+            if st.st_mtime < cutoff: _remove_quietly(e.path)
+        elif STORE_FILE_RE.match(e.name):
+            stats.append((st.st_mtime, st.st_size, e.path))
+    total = sum(size for _, size, _ in stats)
+    removed = 0
+    for mtime, size, path in sorted(stats):
+        if total <= max_bytes or mtime >= cutoff: break
+        if path == keep: continue
+        try:
+            os.remove(path)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"🧹 Evicted {removed} PDFs from the store ({total / 1024 / 1024:.0f} MB kept)")
+    return removed
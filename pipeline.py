@@ -0,0 +1,248 @@
+import logging
+from analyzer import extract_financial_data, extract_identifiers_and_period
+from page_cache import PageTextCache, PdfplumberBackend, get_text_backend
+from browser_utils import fetch_pdf
+from database_utils import upsert_analysis_data, get_analysis_data, get_analysis_by_hash, save_analysis_hash
+from cache_utils import content_cache_key
+from pdf_store import PdfTooLarge, file_hash
+from config import config
+from timings import span, timed_result
+from profiling import profiled
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def is_high_confidence(data):
+    """
+    Evaluates if local extraction results are reliable enough.
+    Returns True if confident, False if AI fallback is recommended.
+    """
+    if not data or 'error' in data:
+        logger.info("❌ Confidence Check: Data has errors")
+        return False
+
+    table_data = data.get('table_data', [])
+    if not table_data:
+        logger.info("❌ Confidence Check: No table data found")
+        return False
+
+    current = table_data[0]
+
+    # Check 1: Revenue must be positive
+    if current.get('revenue', 0) <= 0:
+        logger.info("❌ Confidence Check: Revenue is zero or negative")
+        return False
+
+    # Check 2: At least one profit metric should exist
+    if current.get('net_profit') == 0 and current.get('pbt') == 0:
+        logger.info("❌ Confidence Check: No profit data found")
+        return False
+
+    # Check 3: Should have multi-period data for comparison
+    if len(table_data) < 2:
+        logger.info("⚠️ Confidence Check: Only single period found (acceptable but not ideal)")
+        # Don't fail on this - single period is still useful
+
+    # Check 4: Operating profit should be calculated
+    if current.get('operating_profit') == 0 and current.get('revenue', 0) > 0:
+        logger.info("⚠️ Confidence Check: Operating profit calculation seems off")
+        # Don't fail - might be legitimate zero
+
+    logger.info("✅ Confidence Check: All critical metrics present - HIGH CONFIDENCE")
+    return True
+
+def friendly_error(e):
+    """Maps an exception raised during analysis to a user-facing (message, status) pair."""
+    error_msg = str(e)
+    if 'invalid_api_key' in error_msg.lower() or 'incorrect api key' in error_msg.lower():
+        return 'Invalid OpenAI API key. Please check your key and try again.', 401
+    elif 'rate_limit' in error_msg.lower():
+        return 'OpenAI rate limit exceeded. Please wait a moment and try again.', 429
+    elif 'insufficient_quota' in error_msg.lower():
+        return 'Insufficient OpenAI credits. Please add credits to your account.', 402
+    return f'Analysis failed: {error_msg}', 500
+
+def analysis_cache_key(file_path, processing_mode='smart', ai_page_limit=10,
+                       include_corp_actions=False, include_observations=False, include_recommendations=False,
+                       text_backend=None, ai_input=None):
+    """Returns (content_hash, cache_key) for a file and the options that shape its result."""
+    with span('hash'):
+        # Free for files in the PDF store, which were hashed while being written
+        content_hash = file_hash(file_path)
+    options = {
+        'processing_mode': processing_mode,
+        'ai_page_limit': ai_page_limit if processing_mode != 'local' else None,
+        'include_corp_actions': include_corp_actions,
+        'include_observations': include_observations,
+        'include_recommendations': include_recommendations
+    }
+    # Only non-default backends join the key, so results cached before backends existed stay valid
+    backend = get_text_backend(text_backend).name
+    if backend != PdfplumberBackend.name:
+        options['text_backend'] = backend
+    if processing_mode != 'local' and (ai_input or config.AI_INPUT) != 'auto':
+        options['ai_input'] = ai_input or config.AI_INPUT
+    return content_hash, content_cache_key(content_hash, options)
+
+@timed_result('analysis')
+@profiled
+def run_analysis(file_path=None, url=None, processing_mode='smart', api_key=None, ai_page_limit=10,
+                 include_corp_actions=False, include_observations=False, include_recommendations=False,
+                 progress=None, save=True, text_backend=None,
+                 log_callback=None, partial=None, bypass_ai_cache=False, ai_input=None, profile=False):
+    """
+    Runs the full /analyze pipeline: download, cache lookups, local/AI extraction and DB save.
+    `progress(stage, message)` is called at each stage transition when given, including the analyzers'
+    page scoring/parsing and AI call; `log_callback(message)` receives analyzer log lines as they are written.
+    `partial(data)` gets the local extraction result as soon as it exists, before any AI fallback or DB save.
+    With save=False the result is not written to the database (batch runs bulk-upsert instead).
+    `text_backend` selects the page text library ('pdfplumber' or 'fitz'; default from config).
+    `ai_input` picks what the AI step sends ('auto': table text when the text layer has it, else images;
+    'vision': always page images; default from config).
+    bypass_ai_cache=True sends AI requests to OpenAI even when a cached response for the same pages exists.
+    profile=True saves a cProfile + tracemalloc capture of the run (see profiling.py) and adds data['profile'].
+    Returns a (data, http_status) tuple; on failure data is {'error': ...}. Unless the caller is already
+    collecting timings, data carries a `timings` block (per-span milliseconds, see timings.py).
+    """
+    def report(stage, message):
+        if progress: progress(stage, message)
+
+    # Handle URL Input
+    download_tier = None
+    if not file_path and url:
+        report('download', f"Downloading PDF from {url}")
+        try:
+            file_path, download_tier = fetch_pdf(url)
+        except PdfTooLarge as e:
+            return {'error': str(e)}, 413
+        if not file_path:
+            return {'error': 'Failed to download PDF from URL'}, 400
+    if not file_path:
+        return {'error': 'No file or URL provided'}, 400
+
+    # 0. Content-hash cache: same bytes + same options -> stored result, before any PDF library runs
+    report('cache', "Checking content-hash cache")
+    content_hash, cache_key = analysis_cache_key(
+        file_path, processing_mode, ai_page_limit,
+        include_corp_actions, include_observations, include_recommendations, text_backend, ai_input
+    )
+    cached_data = get_analysis_by_hash(cache_key)
+    if cached_data:
+        logger.info(f"♻️ Found cached results for content hash {content_hash[:12]}")
+        cached_data['processing_method'] = 'Database (Cached)'
+        cached_data['cost_saved'] = True
+        if download_tier: cached_data['download_tier'] = download_tier
+        return cached_data, 200
+
+    # Process the PDF (page text is extracted once and shared by every stage below)
+    pages = PageTextCache(file_path, backend=text_backend)
+    try:
+        # 1. Pre-extraction to get identifiers (Fast)
+        report('identify', "Reading company identifiers")
+        ids = extract_identifiers_and_period(pages=pages)
+
+        # 2. Check Database Cache
+        if ids.get('company_id') and ids.get('quarter') and ids.get('year'):
+            cached_data = get_analysis_data(ids['company_id'], ids['quarter'], ids['year'])
+            if cached_data:
+                logger.info(f"♻️ Found cached results for {ids['company_id']} ({ids['quarter']} {ids['year']})")
+                if save: save_analysis_hash(cache_key, content_hash, cached_data)
+                cached_data['processing_method'] = 'Database (Cached)'
+                cached_data['cost_saved'] = True
+                if download_tier: cached_data['download_tier'] = download_tier
+                return cached_data, 200
+
+        # 3. Proceed with Analysis if not cached
+        analyzer_options = {
+            'include_corp_actions': include_corp_actions,
+            'include_observations': include_observations,
+            'include_recommendations': include_recommendations,
+            'pages': pages,
+            'progress': progress,
+            'log_callback': log_callback
+        }
+
+        def emit_partial(local_data):
+            if partial and local_data and 'error' not in local_data:
+                preview = {k: v for k, v in local_data.items() if k != 'debug_logs'}
+                preview['processing_method'] = 'Local (preliminary)'
+                partial(preview)
+
+        if processing_mode == 'smart':
+            logger.info("🧠 Starting SMART mode - trying local extraction first...")
+            report('local', "Running local extraction")
+            data = extract_financial_data(file_path, **analyzer_options)
+            emit_partial(data)
+
+            if is_high_confidence(data):
+                logger.info("✅ Local extraction successful")
+                data['processing_method'] = 'Local'
+                data['cost_saved'] = True
+            else:
+                logger.warning("⚠️ Low confidence - falling back to AI...")
+                report('ai', "Low confidence - falling back to AI")
+                from openai_analyzer import analyze_with_openai
+                ai_data = analyze_with_openai(file_path, api_key, max_pages=ai_page_limit,
+                                              use_cache=not bypass_ai_cache, ai_input=ai_input, **analyzer_options)
+                ai_data['processing_method'] = 'AI (Fallback)'
+                ai_data['cost_saved'] = bool(ai_data.get('ai_cache_hit'))
+                if 'debug_logs' in data:
+                    ai_data['debug_logs'] = data['debug_logs'] + ai_data.get('debug_logs', [])
+                data = ai_data
+
+        elif processing_mode == 'ai':
+            report('ai', "Running AI analysis")
+            from openai_analyzer import analyze_with_openai
+            data = analyze_with_openai(file_path, api_key, max_pages=ai_page_limit,
+                                       use_cache=not bypass_ai_cache, ai_input=ai_input, **analyzer_options)
+            data['processing_method'] = 'AI'
+            data['cost_saved'] = bool(data.get('ai_cache_hit'))
+
+        else:  # local mode
+            report('local', "Running local extraction")
+            data = extract_financial_data(file_path, **analyzer_options)
+            emit_partial(data)
+            data['processing_method'] = 'Local'
+            data['cost_saved'] = True
+
+        # Check for errors in the response
+        if not data or 'error' in data:
+            error_msg = data.get('error', 'Unknown error during extraction')
+            logger.error(f"Analysis error: {error_msg}")
+            return {'error': error_msg}, 400
+
+        if download_tier: data['download_tier'] = download_tier
+
+        if not save:
+            logger.info("Analysis completed (database save deferred to caller)")
+            return data, 200
+
+        # --- Save to Database ---
+        report('db_save', "Saving results to database")
+        try:
+            db_success = upsert_analysis_data(data)
+            data['saved_to_db'] = db_success
+            if db_success:
+                logger.info("Data successfully stored in database")
+            else:
+                logger.warning("Data extraction worked, but database storage failed")
+        except Exception as db_err:
+            logger.error(f"Database trigger error: {db_err}")
+            data['saved_to_db'] = False
+
+        save_analysis_hash(cache_key, content_hash, data)
+
+        if data.get('debug_logs'):
+            logger.info(f"Captured {len(data['debug_logs'])} debug logs from analyzer")
+
+        logger.info("Analysis completed successfully")
+        return data, 200
+
+    except Exception as e:
+        logger.error(f"Error during analysis: {e}", exc_info=True)
+        # Provide user-friendly error messages
+        error_msg, status = friendly_error(e)
+        return {'error': error_msg}, status
+    finally:
+        pages.close()
@@ -0,0 +1,51 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class SpawnPool:
+    """
+    A process-wide ProcessPoolExecutor, started on first use with the 'spawn' context (forking a threaded
+    web worker is unsafe) and started again after a fork, on a change of size, or when replacing a pool
+    that raised BrokenProcessPool (a worker process died). Shut down at exit.
+    """
+    def __init__(self, name, initializer=None, on_start=None):
+        self.name = name
+        self.initializer = initializer
+        self.on_start = on_start  # called before each (re)start, e.g. to prepare shared state
+        self._pool = None
+        self._pid = None
+        self._workers = 0
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def get(self, workers, initargs=(), broken=None):
+        """Returns the pool with `workers` processes. Pass `broken` (a pool that raised BrokenProcessPool) to replace it."""
+        with self._lock:
+            if broken is not None and self._pool is broken:
+                logger.warning(f"⚠️ {self.name.capitalize()} pool broke (a worker process died); starting a new one")
+                self._discard()
+            if self._pool is not None and self._pid == os.getpid() and self._workers != workers:
+                self._discard()
+            if self._pool is None or self._pid != os.getpid():
+                if self.on_start: self.on_start()
+                self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=self.initializer, initargs=initargs)
+                self._pid = os.getpid()
+                self._workers = workers
+                logger.info(f"Started {self.name} pool ({workers} processes)")
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            self._discard()
+
+    def _discard(self):
+        # A pool inherited through a fork belongs to the parent; only drop the reference
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
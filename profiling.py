@@ -0,0 +1,233 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Capture ids and file names served by the admin endpoint
+PROFILE_FILE_RE = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9a-f]{6}(?:\.[a-z]+)?$")
+REPORT_STATS_LINES = 40
+TRACEMALLOC_TOP = 25
+SAMPLED_TOP = 30
+
+# tracemalloc traces the whole process, so only one request at a time gets an allocation report
+_tracemalloc_lock = threading.Lock()
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack every `interval` seconds into folded-stack counts."""
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                path = frame.f_code.co_filename
+                # package/module.py:function, so same-named modules of different packages stay apart
+                stack.append(f"{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack: self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+class Capture:
+    """
+    One profiled call. mode 'profile' runs cProfile on the calling thread plus tracemalloc and is always
+    saved; mode 'sample' runs the stack sampler and is saved only when the call took PROFILE_SLOW_SECONDS.
+    `saved` is the capture summary once written.
+    """
+    def __init__(self, label, mode):
+        self.label = label
+        self.mode = mode
+        self.saved = None
+        self.profiler = None
+        self.sampler = None
+        self.tracing = False
+
+    def start(self):
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        if self.mode == 'profile':
+            if _tracemalloc_lock.acquire(blocking=False):
+                self.tracing = not tracemalloc.is_tracing()
+                if self.tracing: tracemalloc.start()
+                else: _tracemalloc_lock.release()  # someone else is tracing; leave it to them
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one cProfile per process; report allocations and sampled stacks instead
+                self.profiler = None
+        if self.profiler is None:
+            self.sampler = StackSampler(threading.get_ident(), config.PROFILE_SAMPLE_INTERVAL)
+            self.sampler.start()
+
+    def stop(self):
+        if self.profiler: self.profiler.disable()
+        if self.sampler: self.sampler.stop()
+        self.seconds = time.perf_counter() - self.started
+        snapshot = None
+        if self.tracing:
+            snapshot = tracemalloc.take_snapshot()
+            self.peak_traced = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _tracemalloc_lock.release()
+        if self.mode == 'sample' and self.seconds < config.PROFILE_SLOW_SECONDS:
+            return
+        try:
+            self.saved = self._save(snapshot)
+            logger.info(f"🩺 Saved profile {self.saved['id']} for {self.label} ({self.seconds:.1f}s, {self.mode})")
+            prune_profiles()
+        except OSError as e:
+            logger.warning(f"Could not save profile for {self.label}: {e}")
+
+    def _report(self, snapshot):
+        lines = [f"Profile of {self.label}", f"Mode: {self.mode} | {self.seconds:.3f}s | started "
+                 f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at))}", ""]
+        if self.profiler:
+            for sort in ('cumulative', 'tottime'):
+                buf = io.StringIO()
+                pstats.Stats(self.profiler, stream=buf).strip_dirs().sort_stats(sort).print_stats(REPORT_STATS_LINES)
+                lines += [f"== cProfile, top {REPORT_STATS_LINES} by {sort} ==", buf.getvalue()]
+        if snapshot is not None:
+            lines.append(f"== tracemalloc: top {TRACEMALLOC_TOP} allocation sites still held at the end "
+                         f"(peak traced {self.peak_traced / 1024 / 1024:.1f} MB, whole process) ==")
+            for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                lines.append(str(stat))
+            lines.append("")
+        elif self.mode == 'profile':
+            lines += ["(tracemalloc skipped: another capture was already tracing)", ""]
+        if self.sampler:
+            total = sum(self.sampler.counts.values()) or 1
+            leaves = Counter()
+            for stack, n in self.sampler.counts.items():
+                leaves[stack.rsplit(";", 1)[-1]] += n
+            lines.append(f"== Sampled stacks: {total} samples every {config.PROFILE_SAMPLE_INTERVAL * 1000:.0f} ms, "
+                         f"top {SAMPLED_TOP} leaf functions ==")
+            for fn, n in leaves.most_common(SAMPLED_TOP):
+                lines.append(f"{100 * n / total:6.1f}%  {n:6d}  {fn}")
+            lines.append("")
+        return "\n".join(lines)
+
+    def _save(self, snapshot):
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        # Start time to the millisecond, then random hex: ids sort in capture order
+        millis = int(self.started_at % 1 * 1000)
+        capture_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))}-{millis:03d}{uuid.uuid4().hex[:3]}"
+        base = os.path.join(config.PROFILE_DIR, capture_id)
+        files = []
+        if self.profiler:
+            self.profiler.dump_stats(base + '.prof')
+            files.append(capture_id + '.prof')
+        if self.sampler:
+            # Folded stacks ("a;b;c count"), the input format of flamegraph.pl and speedscope
+            with open(base + '.folded', 'w') as f:
+                f.writelines(f"{stack} {n}\n" for stack, n in self.sampler.counts.most_common())
+            files.append(capture_id + '.folded')
+        with open(base + '.txt', 'w', encoding='utf-8') as f:
+            f.write(self._report(snapshot))
+        files.append(capture_id + '.txt')
+        meta = {'id': capture_id, 'label': self.label, 'mode': self.mode, 'seconds': round(self.seconds, 3),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)), 'files': files}
+        with open(base + '.json', 'w') as f:
+            json.dump(meta, f)
+        return meta
+
+@contextmanager
+def capture(label, requested=False):
+    """
+    Profiles the enclosed block: fully (cProfile + tracemalloc) when `requested`, else with the stack
+    sampler when PROFILE_SLOW_SECONDS is set. Yields the Capture, or None when nothing runs.
+    """
+    mode = 'profile' if requested else ('sample' if config.PROFILE_SLOW_SECONDS > 0 else None)
+    if mode is None:
+        yield None
+        return
+    cap = Capture(label, mode)
+    cap.start()
+    try:
+        yield cap
+    finally:
+        cap.stop()
+
+def profiled(fn):
+    """
+    Decorator for functions returning (data, status) that take a `profile` flag: runs them under capture()
+    and adds data['profile'] (capture id and files) when a profile was saved.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        label = os.path.basename(str(kwargs.get('file_path') or kwargs.get('url') or fn.__name__))
+        with capture(label, requested=bool(kwargs.get('profile'))) as cap:
+            data, status = fn(*args, **kwargs)
+        if cap is not None and cap.saved and isinstance(data, dict):
+            data['profile'] = {'id': cap.saved['id'], 'files': cap.saved['files']}
+        return data, status
+    return wrapper
+
+def list_profiles():
+    """Saved captures, newest first, from their .json metadata."""
+    try:
+        names = [n for n in os.listdir(config.PROFILE_DIR) if n.endswith('.json') and PROFILE_FILE_RE.match(n)]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        try:
+            with open(os.path.join(config.PROFILE_DIR, name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta['files'] = [{'name': n, 'bytes': _size(n)} for n in meta.get('files', [])]
+        profiles.append(meta)
+    return profiles
+
+def _size(name):
+    try:
+        return os.path.getsize(os.path.join(config.PROFILE_DIR, name))
+    except OSError:
+        return None
+
+def prune_profiles():
+    """Deletes the oldest captures beyond PROFILE_MAX_COUNT or until the directory fits in PROFILE_MAX_MB."""
+    try:
+        entries = [e for e in os.scandir(config.PROFILE_DIR) if e.is_file() and PROFILE_FILE_RE.match(e.name)]
+    except FileNotFoundError:
+        return 0
+    captures = {}
+    for e in entries:
+        captures.setdefault(e.name.split('.', 1)[0], []).append((e.path, e.stat().st_size))
+    total = sum(size for files in captures.values() for _, size in files)
+    max_bytes = config.PROFILE_MAX_MB * 1024 * 1024
+    removed = 0
+    # Ids start with the capture time, so sorted order is oldest first
+    for i, capture_id in enumerate(sorted(captures)):
+        if len(captures) - i <= config.PROFILE_MAX_COUNT and total <= max_bytes: break
+        for path, size in captures[capture_id]:
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        removed += 1
+    return removed
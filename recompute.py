@@ -0,0 +1,234 @@
+"""
+Recomputes derived analysis fields from stored results, without re-reading any PDF.
+
+Reads table_data from every stored raw_json, re-derives growth for all rows at once with pandas/NumPy
+(same rules as analyzer.analyze_results), and writes back only the derived columns of rows that changed.
+With --rewrite-verdicts, observations and verdicts are re-derived too, for rows whose stored ones came
+from the rules (rows saved without them, or with AI free-text observations, keep theirs).
+
+Growth basis:
+    filing  QoQ/YoY against the previous-quarter and year-ago columns of each filing (as at analysis time)
+    db      against the current-quarter figures of that company's earlier filings in the table, where
+            they exist (falling back to the filing's own columns)
+
+Usage:
+    python -m recompute [--basis filing|db] [--rewrite-verdicts] [--dry-run] [--batch-size 5000]
+"""
+import argparse
+import json
+import logging
+import time
+import numpy as np
+import pandas as pd
+from analyzer import GROWTH_METRICS, OBSERVATION_RULES, VERDICT_BANDS, observation_score
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# table_data positions read by analyze_results
+PERIODS = ('cur', 'prev', 'yoy')
+
+# Stored observations/verdicts the analyzer rules can produce (anything else is kept as stored)
+RULE_MESSAGES = {msg for msg, _ in OBSERVATION_RULES}
+RULE_VERDICTS = {verdict for _, verdict, _ in VERDICT_BANDS}
+
+# Calendar order of quarters within a result year: Q4 is the March quarter, so it comes first
+QUARTER_ORDER = {'Q4': 0, 'Q1': 1, 'Q2': 2, 'Q3': 3}
+
+def frame_from_records(records):
+    """
+    Flattens stored analyses into one row per filing: identifiers, the 3 x len(GROWTH_METRICS) period
+    figures and the stored derived fields (for change detection).
+    Records whose table_data has fewer than three periods cannot be recomputed and are skipped.
+    Returns (frame, skipped).
+    """
+    figures = [(i, m, f"{p}_{m}") for i, p in enumerate(PERIODS) for m in GROWTH_METRICS]
+    cols = {c: [] for c in ('id', 'company', 'quarter', 'year', 'old_growth', 'old_observations', 'old_recommendation')}
+    cols.update({name: [] for _, _, name in figures})
+    skipped = 0
+    for r in records:
+        try:
+            data = json.loads(r['raw_json'])
+            table = data.get('table_data') or []
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        if len(table) < 3 or not all(isinstance(p, dict) for p in table[:3]):
+            skipped += 1
+            continue
+        cols['id'].append(r.get('id'))
+        cols['company'].append(r.get('company_id') or r.get('company_code') or data.get('company_id') or data.get('company_code'))
+        cols['quarter'].append(r.get('quarter', data.get('quarter')))
+        cols['year'].append(r.get('year', data.get('year')))
+        cols['old_growth'].append(data.get('growth') or {})
+        cols['old_observations'].append(data.get('observations') or [])
+        cols['old_recommendation'].append(data.get('recommendation') or {})
+        for i, m, name in figures:
+            cols[name].append(table[i].get(m))
+
+    df = pd.DataFrame(cols)
+    for _, _, name in figures:
+        # AI results can carry numbers as strings or nulls; same 0 fallback as the DB writer
+        df[name] = pd.to_numeric(df[name], errors='coerce').fillna(0.0)
+    return df, skipped
+
+def pct_change(cur, base):
+    """analyze_results growth over whole columns: rounded % change, 0 where the base is 0."""
+    cur, base = np.asarray(cur, dtype=float), np.asarray(base, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(base != 0, (cur - base) / base * 100, 0.0)
+    rounded = np.round(change, 2)
+    # np.round scales by 100 first, so it can disagree with Python's correctly rounded round() on values
+    # that sit on a half-cent boundary; redo just those so stored values are reproduced exactly
+    frac = np.abs(change * 100) % 1
+    for i in np.flatnonzero(np.abs(frac - 0.5) < 1e-6):
+        rounded[i] = round(float(change[i]), 2)
+    return rounded
+
+def db_bases(df):
+    """
+    Previous-quarter and year-ago figures taken from the same company's other rows in the table.
+    Returns (prev, yoy) frames aligned with df, with NaN where no such filing is stored. Rows without a
+    company never match (pandas would join their null keys to each other).
+    """
+    period = df['year'].astype(int) * 4 + df['quarter'].map(QUARTER_ORDER).fillna(0).astype(int)
+    known = df['company'].notna() & (df['company'] != '')
+    current = df.loc[known, ['company'] + [f"cur_{m}" for m in GROWTH_METRICS]].assign(period=period[known])
+    current = current.drop_duplicates(['company', 'period'], keep='last')
+    keys = pd.DataFrame({'company': df['company'], 'period': period})[known]
+
+    def shifted(offset):
+        # A stored filing for period P is the base for the filing at P + offset
+        lookup = current.assign(period=current['period'] + offset)
+        merged = keys.merge(lookup, on=['company', 'period'], how='left')
+        bases = merged[[f"cur_{m}" for m in GROWTH_METRICS]].set_axis(GROWTH_METRICS, axis=1).set_index(keys.index)
+        return bases.reindex(df.index)
+
+    return shifted(1), shifted(4)
+
+def rule_generated(observations, recommendation):
+    """
+    True when stored observations and verdict came from the analyzer rules: a known verdict and only rule
+    messages. Rows saved without them, or with AI free-text observations, are not rewritten.
+    """
+    return (isinstance(recommendation, dict) and recommendation.get('verdict') in RULE_VERDICTS
+            and isinstance(observations, list) and all(o in RULE_MESSAGES for o in observations))
+
+def recompute_frame(df, basis='filing', observations=True, recommendations=True):
+    """
+    Re-derives growth, observations and recommendation for every row of a frame_from_records frame.
+    Adds growth_<metric>_<qoq|yoy> columns plus 'observations' (lists) and 'recommendation' (dicts);
+    with observations/recommendations off those columns hold None and the stored values are kept, as they
+    are for rows whose stored fields are not rule_generated.
+    """
+    cur = pd.DataFrame({m: df[f"cur_{m}"] for m in GROWTH_METRICS})
+    prev = pd.DataFrame({m: df[f"prev_{m}"] for m in GROWTH_METRICS})
+    yoy = pd.DataFrame({m: df[f"yoy_{m}"] for m in GROWTH_METRICS})
+    if basis == 'db':
+        db_prev, db_yoy = db_bases(df)
+        prev, yoy = db_prev.fillna(prev), db_yoy.fillna(yoy)
+
+    growth = pd.DataFrame(index=df.index)
+    for m in GROWTH_METRICS:
+        growth[f"{m}_qoq"] = pct_change(cur[m], prev[m])
+        growth[f"{m}_yoy"] = pct_change(cur[m], yoy[m])
+
+    out = df.copy()
+    for col in growth.columns:
+        out[f"growth_{col}"] = growth[col]
+
+    obs = [[] for _ in range(len(df))]
+    score = np.zeros(len(df), dtype=int)
+    if observations:
+        for msg, test in OBSERVATION_RULES:
+            mask = np.asarray(test(cur, growth), dtype=bool)
+            for i in np.flatnonzero(mask): obs[i].append(msg)
+            score += mask * observation_score(msg)
+    rewrite = [rule_generated(o, r) for o, r in zip(df['old_observations'], df['old_recommendation'])]
+    out['observations'] = [o if ok else None for o, ok in zip(obs, rewrite)] if observations else None
+
+    if recommendations:
+        score += (cur['net_profit'].to_numpy() > 0) * 2
+        # First band whose minimum the score reaches, as an index into VERDICT_BANDS
+        conditions = [np.full(len(df), True) if min_score is None else score >= min_score for min_score, _, _ in VERDICT_BANDS]
+        bands = np.select(conditions, np.arange(len(VERDICT_BANDS)))
+        out['recommendation'] = [
+            {"verdict": VERDICT_BANDS[b][1], "color": VERDICT_BANDS[b][2], "reasons": o} if ok else None
+            for b, o, ok in zip(bands, obs, rewrite)
+        ]
+    else:
+        out['recommendation'] = None
+    return out
+
+def _same_growth(old, new):
+    # Stored growth may hold int 0 or Python-rounded floats; equal to 1e-9 counts as unchanged
+    try:
+        return old.keys() == new.keys() and all(abs((old[k] or 0) - new[k]) < 1e-9 for k in new)
+    except (TypeError, AttributeError):
+        return False
+
+def changed_updates(out):
+    """bulk_update_derived rows for the recomputed rows whose derived fields differ from what is stored."""
+    growth_cols = [c for c in out.columns if c.startswith('growth_')]
+    growth_records = out[growth_cols].rename(columns=lambda c: c[len('growth_'):]).to_dict('records')
+    updates = []
+    for row, growth, obs, rec in zip(out.itertuples(index=False), growth_records, out['observations'], out['recommendation']):
+        obs = row.old_observations if obs is None else obs
+        rec = row.old_recommendation if rec is None else rec
+        if _same_growth(row.old_growth, growth) and obs == row.old_observations and rec == row.old_recommendation:
+            continue
+        updates.append((
+            row.id, growth['revenue_qoq'], growth['revenue_yoy'], growth['net_profit_qoq'], growth['net_profit_yoy'],
+            "\n".join(obs), rec.get('verdict', 'HOLD / NEUTRAL'),
+            json.dumps(growth), json.dumps(obs), json.dumps(rec)
+        ))
+    return updates
+
+def run_recompute(basis='filing', observations=False, recommendations=False, dry_run=False, batch_size=5000):
+    """
+    Recomputes the whole analysis table in one pass and writes back the rows that changed.
+    Growth is always re-derived; observations/recommendations=True also rewrites rule-generated verdicts.
+    Returns a summary dict (rows read, skipped, changed, written, seconds).
+    """
+    from database_utils import iter_stored_analyses, bulk_update_derived
+    started = time.time()
+
+    frames, skipped = [], 0
+    for batch in iter_stored_analyses(batch_size):
+        df, n = frame_from_records(batch)
+        skipped += n
+        if not df.empty: frames.append(df)
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    loaded = time.time()
+    logger.info(f"📥 Loaded {len(df)} stored analyses ({skipped} skipped) in {loaded - started:.2f}s")
+
+    updates = []
+    if not df.empty:
+        out = recompute_frame(df, basis, observations, recommendations)
+        updates = changed_updates(out)
+    logger.info(f"🧮 Recomputed {len(df)} rows in {time.time() - loaded:.2f}s; {len(updates)} changed")
+
+    written = 0 if dry_run else bulk_update_derived(updates)
+    summary = {
+        'rows': len(df), 'skipped': skipped, 'changed': len(updates), 'written': written,
+        'basis': basis, 'dry_run': dry_run, 'seconds': round(time.time() - started, 2)
+    }
+    logger.info(f"✅ Recompute finished: {json.dumps(summary)}")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-derive growth, observations and verdicts from stored results.")
+    parser.add_argument('--basis', choices=['filing', 'db'], default='filing',
+                        help="Growth against each filing's own prior columns, or against earlier filings in the table")
+    parser.add_argument('--rewrite-verdicts', action='store_true',
+                        help="Also rewrite observations and verdicts (only rows whose stored ones came from the rules)")
+    parser.add_argument('--dry-run', action='store_true', help="Report how many rows would change without writing")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Rows read per query")
+    args = parser.parse_args(argv)
+    summary = run_recompute(args.basis, args.rewrite_verdicts, args.rewrite_verdicts, args.dry_run, args.batch_size)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,249 @@
+"""
+Columnar snapshot of the analysis table for screening notebooks.
+
+Streams the table from a server-side cursor in chunks, flattens the four table_data periods of each
+raw_json into typed columns (cur_/prev_/yoy_/fy_ + metric, e.g. prev_net_profit) and writes Parquet or
+Arrow IPC files partitioned as year=YYYY/quarter=QN/ under SNAPSHOT_DIR.
+
+Runs are incremental on created_at: only rows created after the watermark in _snapshot.json are read,
+into new part files. Rows upserted again keep their created_at, so rebuild with --full after re-analyses
+or recompute.py. A full run builds a new directory and swaps it in; changing the format forces one.
+
+Reading (memory-mapped, columnar):
+    import pyarrow.dataset as ds
+    from snapshot import read_snapshot
+    table = read_snapshot(columns=['company_code', 'cur_revenue', 'yoy_revenue'], filter=ds.field('year') == 2025)
+
+Usage:
+    python -m snapshot [--full] [--format parquet|arrow] [--out DIR] [--chunk-size 5000]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+from analyzer import GROWTH_METRICS
+from config import config
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# table_data positions: current quarter, previous quarter, year-ago quarter, year ended
+PERIODS = ('cur', 'prev', 'yoy', 'fy')
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+STATE_FILE = '_snapshot.json'
+# Data files served by /api/snapshot/<name>
+SNAPSHOT_FILE_RE = re.compile(r"^year=[0-9]+/quarter=[A-Za-z0-9]+/part-[0-9]{14}-[0-9a-f]{6}-[0-9]+\.(?:parquet|arrow)$")
+# Rows younger than this are left for the next run, so transactions still committing are not skipped
+SETTLE_SECONDS = 60
+# A lock older than this belongs to a run that died
+STALE_LOCK_SECONDS = 6 * 3600
+
+PARTITIONING = ds.partitioning(pa.schema([('year', pa.int16()), ('quarter', pa.string())]), flavor='hive')
+
+# Table columns (database_utils.EXPORT_COLUMNS minus raw_json) and their Arrow types
+TABLE_FIELDS = [
+    ('id', pa.int64()), ('company_id', pa.string()), ('company_code', pa.string()),
+    ('quarter', pa.string()), ('year', pa.int16()), ('result_type', pa.string()),
+    ('sales', pa.float64()), ('other_income', pa.float64()), ('total_expenses', pa.float64()),
+    ('operating_profit', pa.float64()), ('pbt', pa.float64()), ('net_profit', pa.float64()),
+    ('margin', pa.float64()), ('eps', pa.float64()),
+    ('revenue_growth_qoq', pa.float64()), ('revenue_growth_yoy', pa.float64()),
+    ('net_profit_growth_qoq', pa.float64()), ('net_profit_growth_yoy', pa.float64()),
+    ('dividend', pa.float64()), ('capex', pa.float64()),
+    ('management_change', pa.string()), ('special_announcement', pa.string()),
+    ('recommendation_verdict', pa.string()), ('created_at', pa.timestamp('s')),
+]
+PERIOD_FIELDS = [(f"{p}_{m}", pa.float64()) for p in PERIODS for m in GROWTH_METRICS]
+SCHEMA = pa.schema(TABLE_FIELDS + PERIOD_FIELDS)
+
+def _number(value):
+    if value is None: return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def record_batch(rows):
+    """One fetched chunk (tuples in EXPORT_COLUMNS order) as a RecordBatch of SCHEMA, table_data flattened."""
+    cols = {name: [] for name in SCHEMA.names}
+    table_names = [name for name, _ in TABLE_FIELDS]
+    for row in rows:
+        for name, value in zip(table_names, row):
+            cols[name].append(float(value) if isinstance(value, Decimal) else value)
+        try:
+            table = json.loads(row[-1]).get('table_data') or []
+        except (TypeError, ValueError, AttributeError):
+            table = []
+        for i, p in enumerate(PERIODS):
+            period = table[i] if i < len(table) and isinstance(table[i], dict) else {}
+            for m in GROWTH_METRICS:
+                cols[f"{p}_{m}"].append(_number(period.get(m)))
+    return pa.RecordBatch.from_pydict(cols, schema=SCHEMA)
+
+def load_state(out_dir=None):
+    """The snapshot's _snapshot.json (format, watermark, rows, runs), or None before the first export."""
+    try:
+        with open(os.path.join(out_dir or config.SNAPSHOT_DIR, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_state(out_dir, state):
+    tmp = os.path.join(out_dir, f".{STATE_FILE}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, STATE_FILE))
+
+def _acquire_lock(out_dir):
+    lock = os.path.abspath(out_dir).rstrip(os.sep) + '.lock'
+    os.makedirs(os.path.dirname(lock), exist_ok=True)
+    try:
+        if time.time() - os.path.getmtime(lock) > STALE_LOCK_SECONDS:
+            os.remove(lock)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise RuntimeError(f"Another snapshot export is running ({lock})")
+    return lock
+
+def _write(batches, target_dir, fmt, run_id):
+    """Writes the batches as hive-partitioned files under target_dir; returns the relative paths written."""
+    written = []
+    file_format = ds.ParquetFileFormat() if fmt == 'parquet' else ds.IpcFileFormat()
+    # zstd keeps Parquet small; Arrow IPC stays uncompressed so readers can memory-map it without copying
+    options = file_format.make_write_options(compression='zstd' if fmt == 'parquet' else None)
+    ds.write_dataset(
+        batches, target_dir, schema=SCHEMA, format=file_format, file_options=options,
+        partitioning=PARTITIONING, basename_template=f"part-{run_id}-{{i}}{FORMATS[fmt]}",
+        existing_data_behavior='overwrite_or_ignore',
+        file_visitor=lambda f: written.append(os.path.relpath(f.path, target_dir))
+    )
+    return written
+
+def _rebuild(out_dir, fmt, run_id, batches, progress):
+    """Full run: writes a sibling directory, then swaps it in for the old snapshot."""
+    base = os.path.abspath(out_dir).rstrip(os.sep)
+    target, old = f"{base}.new-{run_id}", f"{base}.old-{run_id}"
+    try:
+        os.makedirs(target)
+        files = _write(batches, target, fmt, run_id)
+        _save_state(target, {'format': fmt, 'watermark': progress['watermark'], 'rows': progress['rows'],
+                             'runs': [{'id': run_id, 'rows': progress['rows'], 'full': True}]})
+        if os.path.exists(out_dir): os.replace(out_dir, old)
+        os.replace(target, out_dir)
+    except BaseException:
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    shutil.rmtree(old, ignore_errors=True)
+    return files
+
+def _append(out_dir, fmt, run_id, batches, progress, state):
+    """Incremental run: stages new part files inside the snapshot, moves them into their partitions, then advances the watermark."""
+    target = os.path.join(out_dir, f".staging-{run_id}")
+    try:
+        os.makedirs(target)
+        files = _write(batches, target, fmt, run_id)
+        for rel in files:
+            dest = os.path.join(out_dir, rel)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(os.path.join(target, rel), dest)
+        if files:
+            state['watermark'] = progress['watermark']
+            state['rows'] = state.get('rows', 0) + progress['rows']
+            state['runs'] = (state.get('runs', []) + [{'id': run_id, 'rows': progress['rows'], 'full': False}])[-50:]
+            _save_state(out_dir, state)
+    finally:
+        shutil.rmtree(target, ignore_errors=True)
+    return files
+
+def export_snapshot(full=False, out_dir=None, fmt=None, chunk_size=5000):
+    """
+    Exports rows created since the last run (everything with full=True) to `out_dir` (default SNAPSHOT_DIR)
+    in `fmt` ('parquet' or 'arrow', default SNAPSHOT_FORMAT). Returns a summary dict
+    {rows, files, full, format, watermark, seconds}.
+    """
+    from database_utils import CREATED_FLOOR, iter_analysis_rows
+    out_dir = out_dir or config.SNAPSHOT_DIR
+    fmt = fmt or config.SNAPSHOT_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown snapshot format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+    started = time.time()
+    lock = _acquire_lock(out_dir)
+    try:
+        state = load_state(out_dir)
+        if state is None or state.get('format') != fmt:
+            full = True
+        run_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+        since = None if full else state.get('watermark')
+        progress = {'rows': 0, 'watermark': since}
+
+        def batches():
+            for rows in iter_analysis_rows(since=since, settle_seconds=SETTLE_SECONDS, chunk_size=chunk_size):
+                progress['rows'] += len(rows)
+                progress['watermark'] = [(rows[-1][-2] or CREATED_FLOOR).isoformat(sep=' '), rows[-1][0]]
+                yield record_batch(rows)
+
+        if full:
+            files = _rebuild(out_dir, fmt, run_id, batches(), progress)
+        else:
+            files = _append(out_dir, fmt, run_id, batches(), progress, state)
+    finally:
+        os.remove(lock)
+
+    summary = {'rows': progress['rows'], 'files': len(files), 'full': full, 'format': fmt,
+               'watermark': progress['watermark'], 'seconds': round(time.time() - started, 2)}
+    logger.info(f"🗃️ Snapshot {'rebuilt' if full else 'updated'}: {summary['rows']} rows in {summary['files']} files ({fmt})")
+    return summary
+
+def list_snapshot_files(out_dir=None):
+    """Data files of the snapshot as {name, bytes} (name relative to the snapshot, e.g. year=2025/quarter=Q1/...)."""
+    out_dir = out_dir or config.SNAPSHOT_DIR
+    files = []
+    for root, dirs, names in os.walk(out_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('.', '_')))
+        for name in sorted(names):
+            if name.endswith(tuple(FORMATS.values())):
+                path = os.path.join(root, name)
+                files.append({'name': os.path.relpath(path, out_dir).replace(os.sep, '/'), 'bytes': os.path.getsize(path)})
+    return files
+
+def read_snapshot(columns=None, filter=None, out_dir=None):
+    """
+    Reads the snapshot as a pyarrow Table through memory-mapped files, loading only `columns` and the
+    partitions and row groups `filter` (a pyarrow.dataset expression) can match. year and quarter come
+    from the partition paths. `.to_pandas()` gives a DataFrame.
+    """
+    out_dir = out_dir or config.SNAPSHOT_DIR
+    state = load_state(out_dir)
+    if state is None:
+        raise FileNotFoundError(f"No snapshot in {out_dir}; run `python -m snapshot` first")
+    file_format = 'parquet' if state['format'] == 'parquet' else 'ipc'
+    dataset = ds.dataset(out_dir, schema=SCHEMA, format=file_format, partitioning=PARTITIONING,
+                         filesystem=fs.LocalFileSystem(use_mmap=True))
+    return dataset.to_table(columns=columns, filter=filter)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--full', action='store_true', help="Rebuild the whole snapshot instead of appending new rows")
+    parser.add_argument('--format', choices=list(FORMATS), default=None, help="File format (default SNAPSHOT_FORMAT)")
+    parser.add_argument('--out', default=None, help="Snapshot directory (default SNAPSHOT_DIR)")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="Rows fetched from the cursor per chunk")
+    args = parser.parse_args(argv)
+    summary = export_snapshot(full=args.full, out_dir=args.out, fmt=args.format, chunk_size=args.chunk_size)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
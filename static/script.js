@@ -151,15 +151,35 @@ async function analyzeStock() {
 
     try {
         addLogEntry(`Mode: ${mode.toUpperCase()} | Page Limit: ${pageLimit}`);
-        const response = await fetch('/analyze', { method: 'POST', body: formData });
-        const data = await response.json();
+        const response = await fetch('/analyze/stream', { method: 'POST', body: formData });
 
-        if (response.ok) {
-            displayResult(data);
-        } else {
+        // Validation errors come back as plain JSON before any streaming starts
+        if (!response.ok || !response.body) {
+            const data = await response.json();
             addLogEntry(`Error: ${data.error}`, 'error');
             alert(data.error);
+            return;
         }
+
+        // Cached results arrive without log events; their debug_logs are replayed instead
+        let loggedLive = false;
+        await readEventStream(response, (event, payload) => {
+            if (event === 'stage') {
+                document.getElementById('loading-text').textContent = payload.message;
+            } else if (event === 'log') {
+                loggedLive = true;
+                addLogEntry(payload.message, logType(payload.message));
+            } else if (event === 'partial') {
+                displayResult(payload, { partial: true });
+            } else if (event === 'result') {
+                if (payload.status === 200) {
+                    displayResult(payload.data, { streamed: loggedLive });
+                } else {
+                    addLogEntry(`Error: ${payload.data.error}`, 'error');
+                    alert(payload.data.error);
+                }
+            }
+        });
     } catch (error) {
         addLogEntry(`Fatal: ${error.message}`, 'error');
         alert("An error occurred: " + error.message);
@@ -168,7 +188,37 @@ async function analyzeStock() {
     }
 }
 
-function displayResult(data) {
+// Parses a text/event-stream response body, calling onEvent(event, data) for each event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = 'message';
+            const dataLines = [];
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            });
+            if (dataLines.length) onEvent(event, JSON.parse(dataLines.join('\n')));
+        }
+    }
+}
+
+function logType(log) {
+    return (log.includes('AI') || log.includes('🚀') || log.includes('📡') || log.includes('📥')) ? 'ai' : 'local';
+}
+
+// options.partial: preliminary local data shown while the analysis continues
+// options.streamed: log lines of this run already arrived live, so debug_logs are not replayed
+function displayResult(data, options = {}) {
     const resultSection = document.getElementById('result-section');
     resultSection.classList.remove('hidden');
 
@@ -208,14 +258,13 @@ function displayResult(data) {
     }
 
     // Handle Debug Logs
-    if (data.debug_logs) {
-        data.debug_logs.forEach(log => {
-            const type = (log.includes('AI') || log.includes('🚀') || log.includes('📡') || log.includes('📥')) ? 'ai' : 'local';
-            addLogEntry(log, type);
-        });
+    if (data.debug_logs && !options.streamed) {
+        data.debug_logs.forEach(log => addLogEntry(log, logType(log)));
     }
 
-    if (data.processing_method.includes('AI')) {
+    if (options.partial) {
+        addLogEntry('Preliminary local results shown; analysis still running...', 'local');
+    } else if (data.processing_method.includes('AI')) {
         addLogEntry('AI analysis performed successfully.', 'ai');
         const pages = document.getElementById('page-limit-slider').value;
         const estCost = (pages * 0.015).toFixed(3);
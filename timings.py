@@ -0,0 +1,288 @@
+import functools
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import closing, contextmanager, nullcontext
+from contextvars import ContextVar
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (Prometheus `le` labels); +Inf is implied
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_NOOP = nullcontext()
+_current = ContextVar('timings', default=None)
+# Observations not yet added to the shared store (METRICS_DB_PATH), or all of them when it is off
+_histograms = {}
+_events = Counter()
+_histograms_lock = threading.Lock()
+_owner_pid = os.getpid()
+_last_flush = time.monotonic()
+# Longest a process holds observations before adding them to the shared store
+FLUSH_SECONDS = 10
+
+def peak_rss_bytes():
+    """High-water resident set size of this process (None where the resource module is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Timings:
+    """Span totals of one request: seconds and call count per span name, plus the process RSS high-water mark."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ended = None
+        self.rss_start = peak_rss_bytes()
+        self.spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            total = self.spans.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def as_dict(self):
+        """The `timings` block attached to results: total and per-span milliseconds, call counts, memory."""
+        total = (self.ended or time.perf_counter()) - self.started
+        with self._lock:
+            spans = {name: {'ms': round(s * 1000, 1), 'calls': n} for name, (s, n) in self.spans.items()}
+        rss = peak_rss_bytes()
+        memory = {}
+        if rss is not None:
+            mb = 1024 * 1024
+            # Process-wide: growth is how far this request pushed the high-water mark (shared with concurrent requests)
+            memory = {'peak_rss_mb': round(rss / mb, 1), 'peak_rss_growth_mb': round((rss - self.rss_start) / mb, 1)}
+        return {'total_ms': round(total * 1000, 1), 'spans': spans, 'memory': memory}
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]: i += 1
+        self.counts[i] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+def _own_pending():
+    """Drops the pending observations a forked child inherited; its parent flushes those. Call under the lock."""
+    global _owner_pid, _histograms, _events
+    if _owner_pid != os.getpid():
+        _owner_pid = os.getpid()
+        _histograms, _events = {}, Counter()
+
+def observe(name, seconds):
+    """Records one span duration in the request's Timings (if collecting) and the histograms."""
+    timings = _current.get()
+    if timings is not None: timings.add(name, seconds)
+    with _histograms_lock:
+        _own_pending()
+        hist = _histograms.get(name)
+        if hist is None: hist = _histograms[name] = Histogram()
+        hist.observe(seconds)
+    if config.METRICS_DB_PATH and time.monotonic() - _last_flush >= FLUSH_SECONDS:
+        flush_metrics(force=False)
+
+def count(event, n=1):
+    """Adds n to the counter of `event` (e.g. 'download.http'), exported as result_analyser_events_total."""
+    if not config.TIMINGS_ENABLED:
+        return
+    with _histograms_lock:
+        _own_pending()
+        _events[event] += n
+
+def _connect_store():
+    conn = sqlite3.connect(config.METRICS_DB_PATH, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_span_buckets (
+            span TEXT NOT NULL, le TEXT NOT NULL, n INTEGER NOT NULL, PRIMARY KEY (span, le)
+        )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS metrics_span_totals (span TEXT PRIMARY KEY, seconds REAL NOT NULL, n INTEGER NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS metrics_events (event TEXT PRIMARY KEY, n INTEGER NOT NULL)")
+    return conn
+
+def flush_metrics(force=True):
+    """
+    Adds this process's pending observations to the shared SQLite store, which /metrics reads, so web,
+    job and batch worker processes all report there. Without `force`, at most every FLUSH_SECONDS.
+    If the write fails the observations stay pending for the next flush.
+    """
+    global _histograms, _events, _last_flush
+    if not config.METRICS_DB_PATH:
+        return
+    with _histograms_lock:
+        _own_pending()
+        now = time.monotonic()
+        if not force and now - _last_flush < FLUSH_SECONDS:
+            return
+        _last_flush = now
+        if not _histograms and not _events:
+            return
+        histograms, events = _histograms, _events
+        _histograms, _events = {}, Counter()
+    bounds = [str(b) for b in BUCKETS] + ['+Inf']
+    try:
+        with closing(_connect_store()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO metrics_span_buckets (span, le, n) VALUES (?, ?, ?) "
+                "ON CONFLICT (span, le) DO UPDATE SET n = n + excluded.n",
+                [(name, le, n) for name, h in histograms.items() for le, n in zip(bounds, h.counts) if n]
+            )
+            conn.executemany(
+                "INSERT INTO metrics_span_totals (span, seconds, n) VALUES (?, ?, ?) "
+                "ON CONFLICT (span) DO UPDATE SET seconds = seconds + excluded.seconds, n = n + excluded.n",
+                [(name, h.sum, h.count) for name, h in histograms.items()]
+            )
+            conn.executemany(
+                "INSERT INTO metrics_events (event, n) VALUES (?, ?) ON CONFLICT (event) DO UPDATE SET n = n + excluded.n",
+                list(events.items())
+            )
+    except sqlite3.Error as e:
+        logger.warning(f"Metrics flush failed, keeping the observations for the next one: {e}")
+        with _histograms_lock:
+            _own_pending()
+            for name, h in histograms.items():
+                _histograms.setdefault(name, Histogram()).merge(h)
+            _events.update(events)
+
+def _read_store():
+    """Totals of every process from the shared store: ({span: (counts, sum, count)}, {event: n})."""
+    index = {str(b): i for i, b in enumerate(BUCKETS)}
+    index['+Inf'] = len(BUCKETS)
+    histograms = {}
+    with closing(_connect_store()) as conn:
+        for name, total, n in conn.execute("SELECT span, seconds, n FROM metrics_span_totals"):
+            histograms[name] = ([0] * (len(BUCKETS) + 1), total, n)
+        for name, le, n in conn.execute("SELECT span, le, n FROM metrics_span_buckets"):
+            # Bounds dropped from BUCKETS since the store was written are left out
+            if name in histograms and le in index:
+                histograms[name][0][index[le]] += n
+        events = dict(conn.execute("SELECT event, n FROM metrics_events"))
+    return histograms, events
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+def span(name):
+    """Context manager timing a block as span `name`; a shared no-op when TIMINGS_ENABLED is off."""
+    if not config.TIMINGS_ENABLED:
+        return _NOOP
+    return _Span(name)
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not config.TIMINGS_ENABLED:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextmanager
+def request_timings():
+    """
+    Collects the spans of one request in this context. Yields the new Timings, or None when timings are
+    disabled or an outer caller is already collecting (that caller attaches the block instead).
+    """
+    if not config.TIMINGS_ENABLED or _current.get() is not None:
+        yield None
+        return
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        timings.ended = time.perf_counter()
+        _current.reset(token)
+
+def timed_result(name):
+    """
+    Decorator for functions returning (data, status): times the call as span `name` and, when the call
+    started the request's collection, sets data['timings'].
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with request_timings() as timings:
+                with span(name):
+                    data, status = fn(*args, **kwargs)
+            # Worker processes may idle after this, so hand the spans to the shared store now
+            flush_metrics()
+            if timings is not None and isinstance(data, dict):
+                data['timings'] = timings.as_dict()
+            return data, status
+        return wrapper
+    return decorate
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+def render_metrics():
+    """
+    Span histograms, event counters and peak RSS in the Prometheus text exposition format. Histograms and
+    counters are the totals of all processes sharing METRICS_DB_PATH (this process only when it is unset).
+    """
+    lines = [
+        "# HELP result_analyser_span_seconds Time spent in instrumented analysis spans.",
+        "# TYPE result_analyser_span_seconds histogram",
+    ]
+    if config.METRICS_DB_PATH:
+        flush_metrics()
+        snapshot, events = _read_store()
+    else:
+        with _histograms_lock:
+            snapshot = {name: (list(h.counts), h.sum, h.count) for name, h in _histograms.items()}
+            events = dict(_events)
+    for name in sorted(snapshot):
+        counts, total, count = snapshot[name]
+        label = _label(name)
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ('+Inf',), counts):
+            cumulative += n
+            lines.append(f'result_analyser_span_seconds_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'result_analyser_span_seconds_sum{{span="{label}"}} {total:.6f}')
+        lines.append(f'result_analyser_span_seconds_count{{span="{label}"}} {count}')
+    lines += ["# HELP result_analyser_events_total Pipeline events, e.g. which tier served each URL download.",
+              "# TYPE result_analyser_events_total counter"]
+    for event in sorted(events):
+        lines.append(f'result_analyser_events_total{{event="{_label(event)}"}} {events[event]}')
+    rss = peak_rss_bytes()
+    if rss is not None:
+        lines += ["# HELP result_analyser_peak_rss_bytes Peak resident set size of this process.",
+                  "# TYPE result_analyser_peak_rss_bytes gauge",
+                  f"result_analyser_peak_rss_bytes {rss}"]
+    return "\n".join(lines) + "\n"